@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import UserProfile, Exercise, WorkoutSession, ExerciseSet
+from .models import (
+    UserProfile, Exercise, WorkoutSession, ExerciseSet, DailyActivity, ImportJob, PersonalRecord, Leaderboard,
+    GeneratedPlan,
+)
 
 
 @admin.register(UserProfile)
@@ -11,7 +14,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Exercise)
 class ExerciseAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category']
+    list_display = ['name', 'category', 'met']
     list_filter = ['category']
     search_fields = ['name', 'description']
 
@@ -23,7 +26,7 @@ class ExerciseSetInline(admin.TabularInline):
 
 @admin.register(WorkoutSession)
 class WorkoutSessionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'date', 'duration_minutes']
+    list_display = ['user', 'date', 'duration_minutes', 'set_count', 'total_volume_kg', 'kcal']
     list_filter = ['date', 'user']
     search_fields = ['user__username', 'notes']
     inlines = [ExerciseSetInline]
@@ -34,3 +37,37 @@ class ExerciseSetAdmin(admin.ModelAdmin):
     list_display = ['workout', 'exercise', 'sets', 'reps', 'weight_kg']
     list_filter = ['exercise', 'workout__date']
     search_fields = ['exercise__name', 'workout__user__username']
+
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ['user', 'day', 'minutes', 'set_count', 'volume_kg', 'workout_count']
+    list_filter = ['day']
+    search_fields = ['user__username']
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['user', 'status', 'processed_rows', 'imported_count', 'failed_rows', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['user__username']
+
+
+@admin.register(PersonalRecord)
+class PersonalRecordAdmin(admin.ModelAdmin):
+    list_display = ['user', 'exercise', 'kind', 'value', 'achieved_at']
+    list_filter = ['kind']
+    search_fields = ['user__username', 'exercise__name']
+
+
+@admin.register(Leaderboard)
+class LeaderboardAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'metric', 'week_start', 'entry_count', 'refreshed_at']
+    list_filter = ['metric']
+    search_fields = ['exercise__name']
+
+
+@admin.register(GeneratedPlan)
+class GeneratedPlanAdmin(admin.ModelAdmin):
+    list_display = ['user', 'fingerprint', 'created_at', 'expires_at']
+    search_fields = ['user__username', 'fingerprint']
@@ -1,73 +1,78 @@
 """
 AI Planner module for generating personalized fitness plans.
-This module uses Google Gemini API for fitness plan generation.
+The model is called through the backend picked in settings (see core.llm),
+Google Gemini by default.
 """
-import google.generativeai as genai
-import os
 import json
 import re
 from dotenv import load_dotenv
 
+from .llm import CircuitOpen, TooManyCalls, get_client
+from .plan_stream import PlanStreamParser
+
 # Load environment variables from .env file
 load_dotenv()
 
 
-def generate_fitness_plan_from_profile(user_profile, training_history_summary=""):
+def prompt_inputs(user_profile, training_history_summary=""):
     """
-    Generates a personalized fitness plan based on user profile using Gemini API.
-    
+    Collect the profile values and training history the prompt is built from.
+
     Args:
         user_profile: UserProfile model instance
         training_history_summary: Optional string containing training history
-    
+
     Returns:
-        str: Generated fitness plan text
+        dict: The values substituted into the prompt, defaults filled in
     """
-    try:
-        # 1. Configure API Key
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in .env file. Please set your Gemini API key.")
-        
-        genai.configure(api_key=api_key)
-        
-        # 2. Extract user information from profile
-        user_gender = user_profile.get_gender_display() if user_profile.gender else "Not specified"
-        user_age = user_profile.age if user_profile.age else 25
-        user_height = user_profile.height_cm if user_profile.height_cm else 170
-        user_weight = user_profile.weight_kg if user_profile.weight_kg else 70
-        user_fitness_level = user_profile.get_fitness_level_display() if user_profile.fitness_level else "Beginner"
-        user_primary_goal_choice = user_profile.get_primary_goal_choice_display() if user_profile.primary_goal_choice else "General Fitness"
-        
-        # 3. Map goal choice to detailed goal
-        if "Muscle" in user_primary_goal_choice or "Gain" in user_primary_goal_choice:
-            detailed_goal = "Build lean muscle mass with a focus on hypertrophy, aiming to gain 1-2 kg of muscle."
-        elif "Fat" in user_primary_goal_choice or "Loss" in user_primary_goal_choice:
-            detailed_goal = "Lose body fat while preserving as much muscle as possible, aiming to lose 2-3 kg of fat."
-        else:
-            detailed_goal = "Improve overall fitness and health."
-        
-        # 4. Default training history if not provided
-        if not training_history_summary:
-            training_history_summary = """
+    # Extract user information from profile
+    user_primary_goal_choice = user_profile.get_primary_goal_choice_display() if user_profile.primary_goal_choice else "General Fitness"
+
+    # Map goal choice to detailed goal
+    if "Muscle" in user_primary_goal_choice or "Gain" in user_primary_goal_choice:
+        detailed_goal = "Build lean muscle mass with a focus on hypertrophy, aiming to gain 1-2 kg of muscle."
+    elif "Fat" in user_primary_goal_choice or "Loss" in user_primary_goal_choice:
+        detailed_goal = "Lose body fat while preserving as much muscle as possible, aiming to lose 2-3 kg of fat."
+    else:
+        detailed_goal = "Improve overall fitness and health."
+
+    # Default training history if not provided
+    if not training_history_summary:
+        training_history_summary = """
 * **Workout Frequency:** Based on your fitness level, we recommend starting with 3-4 times per week.
 * **Workout Types:** A balanced mix of strength training and cardio.
 """
-        
-        # 5. Construct the prompt
-        prompt = f"""
-You are an expert AI personal trainer and nutritionist named FitTrack AI. Your task is to create a comprehensive, personalized, and actionable 4-week training and diet plan based on the user's detailed profile.
 
-### User Profile
-* **Gender:** {user_gender}
-* **Age:** {user_age}
-* **Height:** {user_height} cm
-* **Weight:** {user_weight} kg
-* **Fitness Level:** {user_fitness_level}
-* **Primary Goal:** {detailed_goal}
+    return {
+        'gender': user_profile.get_gender_display() if user_profile.gender else "Not specified",
+        'age': user_profile.age if user_profile.age else 25,
+        'height': user_profile.height_cm if user_profile.height_cm else 170,
+        'weight': user_profile.weight_kg if user_profile.weight_kg else 70,
+        'fitness_level': user_profile.get_fitness_level_display() if user_profile.fitness_level else "Beginner",
+        'goal': detailed_goal,
+        'training_history': training_history_summary,
+    }
+
+
+def _profile_block(inputs):
+    return f"""### User Profile
+* **Gender:** {inputs['gender']}
+* **Age:** {inputs['age']}
+* **Height:** {inputs['height']} cm
+* **Weight:** {inputs['weight']} kg
+* **Fitness Level:** {inputs['fitness_level']}
+* **Primary Goal:** {inputs['goal']}
 
 ### Recent Training History
-{training_history_summary}
+{inputs['training_history']}"""
+
+
+def build_prompt(inputs):
+    """Render the planner prompt from prompt_inputs() output."""
+    return f"""
+You are an expert AI personal trainer and nutritionist named FitTrack AI. Your task is to create a comprehensive, personalized, and actionable 4-week training and diet plan based on the user's detailed profile.
+
+{_profile_block(inputs)}
 
 ### Your Task
 Generate a detailed 4-week plan in strict JSON format. Do not include any markdown formatting (like ```json) or explanatory text outside the JSON object. The JSON structure must be exactly as follows:
@@ -132,15 +137,140 @@ Generate a detailed 4-week plan in strict JSON format. Do not include any markdo
   }}
 }}
 """
+
+
+# Section name of the diet in a plan; weeks are named by their week number
+DIET_SECTION = 'diet'
+
+# Longest user request passed on to the model when adjusting a section
+MAX_INSTRUCTIONS = 300
+
+
+def plan_outline(plan, skip=None):
+    """
+    One line per week (focus, then each day's type and exercise names) and
+    one for the diet targets, leaving out the section `skip`.
+    """
+    lines = []
+    for week in plan.get('training_plan', {}).get('weeks', []):
+        if str(week.get('week_number')) == str(skip):
+            continue
+        days = '; '.join(
+            f"{day.get('type')}" + (f" ({', '.join(e.get('name', '') for e in day['exercises'])})"
+                                    if day.get('exercises') else '')
+            for day in week.get('schedule', [])
+        )
+        lines.append(f"* Week {week.get('week_number')} - {week.get('focus')}: {days}")
+    diet = plan.get('diet_plan') or {}
+    if diet and skip != DIET_SECTION:
+        macros = diet.get('macros') or {}
+        lines.append(f"* Diet: {diet.get('calories')}; protein {macros.get('protein')}, "
+                     f"carbs {macros.get('carbs')}, fats {macros.get('fats')}")
+    return '\n'.join(lines)
+
+
+def build_section_prompt(inputs, plan, section, instructions=""):
+    """
+    Prompt for rewriting one section of a plan: a week (by its number) or
+    the diet. Only that section is sent in full; the rest of the plan is
+    summarized by plan_outline(), so both the prompt and the answer stay a
+    fraction of a whole plan.
+    """
+    if section == DIET_SECTION:
+        name = "the diet plan"
+        current = plan.get('diet_plan') or {}
+        shape = ('one JSON object with "calories", "macros" (with "protein", "carbs" and "fats"), '
+                 '"guidelines" (a list of strings) and "meals" (a list of objects with "type" and "options")')
+    else:
+        name = f"week {section} of the training plan"
+        current = next(week for week in plan['training_plan']['weeks'] if str(week.get('week_number')) == str(section))
+        shape = (f'one JSON object with "week_number" ({section}), "focus" and "schedule": 7 days, each with '
+                 '"day", "type" ("Rest Day" for rest), "exercises" (objects with "name", "sets", "reps", "notes") '
+                 'and "cardio" (text or null)')
+    request = instructions.strip()[:MAX_INSTRUCTIONS] or "Write a fresh version that fits the rest of the plan."
+    return f"""
+You are an expert AI personal trainer and nutritionist named FitTrack AI. The user has a 4-week training and diet plan and wants {name} rewritten. Keep it consistent with the rest of the plan and its progression.
+
+{_profile_block(inputs)}
+
+### Rest of the Plan
+{plan_outline(plan, skip=section)}
+
+### Current Version of {name[0].upper() + name[1:]}
+{json.dumps(current, separators=(',', ':'))}
+
+### User Request
+{request}
+
+### Your Task
+Return only the new version of {name} as {shape}. Do not include any markdown formatting or explanatory text outside the JSON object.
+"""
+
+
+def generate_plan_section(user_profile, training_history_summary, plan, section, instructions=""):
+    """
+    Rewrite one week (section = its week number) or the diet (section =
+    DIET_SECTION) of a plan with the configured model backend.
+
+    Returns:
+        dict: The new week or diet_plan object, or an {"error": ...} dict
+    """
+    try:
+        prompt = build_section_prompt(prompt_inputs(user_profile, training_history_summary), plan, section, instructions)
+        result_text = get_client().generate(prompt)
+    except StopIteration:
+        return {"error": f"The plan has no week {section}.", "details": ""}
+    except Exception as e:
+        return _error_result(e)
+
+    try:
+        value = json.loads(re.sub(r'```json\s*|\s*```', '', result_text).strip())
+    except json.JSONDecodeError:
+        return {"error": "Failed to parse AI response as JSON", "raw_text": result_text}
+    # Models sometimes wrap the object in its key
+    if isinstance(value, dict) and len(value) == 1 and isinstance(next(iter(value.values())), dict):
+        value = next(iter(value.values()))
+    expected = 'macros' if section == DIET_SECTION else 'schedule'
+    if not isinstance(value, dict) or expected not in value:
+        return {"error": "The AI response did not contain the requested part of the plan.", "raw_text": result_text}
+    if section != DIET_SECTION:
+        value['week_number'] = int(section)
+    return value
+
+
+def _error_result(e):
+    """The {"error": ..., "details": ...} result ai_planner.html shows for a failed generation."""
+    if isinstance(e, CircuitOpen):
+        return {"error": "The AI planner is temporarily unavailable.", "details": f"{str(e)} Please try again shortly."}
+    if isinstance(e, TooManyCalls):
+        return {"error": str(e), "details": "Please try again in a minute."}
+    if isinstance(e, TimeoutError):
+        return {"error": "The AI planner took too long to respond.", "details": "The model service may be slow right now; please try again."}
+    if isinstance(e, ValueError):
+        # API key or configuration error
+        return {"error": f"Configuration Error: {str(e)}", "details": "Please check your .env file and API key."}
+    # Other errors (API errors, network errors, etc.)
+    error_type = type(e).__name__
+    return {"error": f"Error generating plan ({error_type}): {str(e)}", "details": "Please check your internet connection and API quota."}
+
+
+def generate_fitness_plan_from_profile(user_profile, training_history_summary=""):
+    """
+    Generates a personalized fitness plan based on user profile using the configured model backend.
+    
+    Args:
+        user_profile: UserProfile model instance
+        training_history_summary: Optional string containing training history
+    
+    Returns:
+        str: Generated fitness plan text
+    """
+    try:
+        # 1. Construct the prompt from the profile and training history
+        prompt = build_prompt(prompt_inputs(user_profile, training_history_summary))
         
-        # 6. Call the Generative AI Model (Gemini)
-        try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-        except Exception:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        response = model.generate_content(prompt)
-        result_text = response.text
+        # 2. Call the configured model backend
+        result_text = get_client().generate(prompt)
         
         # Clean up the response to ensure it's valid JSON
         # Remove markdown code blocks if present
@@ -155,11 +285,37 @@ Generate a detailed 4-week plan in strict JSON format. Do not include any markdo
             # Fallback if JSON parsing fails - return text but wrapped in a structure
             return {"error": "Failed to parse AI response as JSON", "raw_text": result_text}
         
-    except ValueError as ve:
-        # API key or configuration error
-        return {"error": f"Configuration Error: {str(ve)}", "details": "Please check your .env file and API key."}
     except Exception as e:
-        # Other errors (API errors, network errors, etc.)
-        error_type = type(e).__name__
-        return {"error": f"Error generating plan ({error_type}): {str(e)}", "details": "Please check your internet connection and API quota."}
+        return _error_result(e)
+
 
+def stream_fitness_plan_from_profile(user_profile, training_history_summary="", on_week=None):
+    """
+    Generate a plan like generate_fitness_plan_from_profile, reading the
+    model output as it is produced.
+
+    Each training week is parsed as soon as its closing brace arrives and
+    passed to `on_week`, so callers can show the first week long before the
+    whole plan is written.
+
+    Returns:
+        dict: The parsed plan, or an {"error": ...} dict as for the non-streaming call
+    """
+    parser = PlanStreamParser()
+    received = []
+    try:
+        prompt = build_prompt(prompt_inputs(user_profile, training_history_summary))
+        for chunk in get_client().stream(prompt):
+            received.append(chunk)
+            for week in parser.feed(chunk):
+                if on_week is not None:
+                    on_week(week)
+    except json.JSONDecodeError:
+        return {"error": "Failed to parse AI response as JSON", "raw_text": ''.join(received)}
+    except Exception as e:
+        return _error_result(e)
+
+    try:
+        return parser.result()
+    except ValueError:
+        return {"error": "Failed to parse AI response as JSON", "raw_text": ''.join(received)}
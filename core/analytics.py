@@ -0,0 +1,164 @@
+"""
+Training-load analytics over a user's whole history.
+
+The history is loaded as columnar NumPy arrays, with one values_list query
+for the workouts and one for their exercise sets, and every metric is
+computed with vectorised reductions rather than per-object loops:
+
+- weekly volume (sets x reps x kg) per exercise category
+- daily load, taken as training minutes per local day
+- acute:chronic workload ratio: mean daily load over the last 7 days divided
+  by the mean over the last 28
+- Foster's monotony (7-day mean / standard deviation of daily load) and
+  strain (7-day total load x monotony)
+"""
+import numpy as np
+from django.db.models.functions import TruncDate
+
+from .models import Exercise, ExerciseSet, WorkoutSession
+
+CATEGORIES = [key for key, _ in Exercise._meta.get_field('category').choices]
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+
+def as_columns(rows, names):
+    """Transpose value rows into one tuple per column name; empty tuples without rows."""
+    return dict(zip(names, zip(*rows))) or dict.fromkeys(names, ())
+
+
+def load_columns(user, tz):
+    """
+    Load a user's workouts and exercise sets as NumPy arrays.
+
+    Local days are cut in the database once per workout; sets are matched to
+    their workout's day in NumPy, which avoids converting a timestamp for
+    every set row.
+    """
+    workouts = as_columns(
+        WorkoutSession.objects.filter(user=user)
+        .order_by()
+        .annotate(day=TruncDate('date', tzinfo=tz))
+        .values_list('pk', 'day', 'duration_minutes', 'total_seconds'),
+        ('id', 'day', 'duration_minutes', 'total_seconds'),
+    )
+    sets = as_columns(
+        ExerciseSet.objects.filter(workout__user=user)
+        .order_by()
+        .values_list('workout_id', 'exercise__category', 'sets', 'reps', 'weight_kg'),
+        ('workout_id', 'category', 'sets', 'reps', 'weight_kg'),
+    )
+
+    # Sorted by id so each set finds its workout with a binary search
+    workout_ids = np.array(workouts['id'], dtype=np.int64)
+    order = np.argsort(workout_ids)
+    workout_ids = workout_ids[order]
+    workout_days = np.array(workouts['day'], dtype='datetime64[D]')[order]
+    duration = np.array(workouts['duration_minutes'], dtype=float)[order]
+    seconds = np.array(workouts['total_seconds'], dtype=float)[order]
+    set_workouts = np.searchsorted(workout_ids, np.array(sets['workout_id'], dtype=np.int64))
+    return {
+        'day': workout_days,
+        'minutes': np.where(duration > 0, duration, np.round(seconds / 60)),
+        'set_day': workout_days[set_workouts],
+        'category': np.array(sets['category'], dtype=object),
+        'volume': np.nan_to_num(
+            np.array(sets['sets'], dtype=float) * np.array(sets['reps'], dtype=float)
+            * np.array(sets['weight_kg'], dtype=float)
+        ),
+    }
+
+
+def _rolling(values, window):
+    """Trailing sums over `window` entries; the first entries sum what exists so far."""
+    totals = np.cumsum(values)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals
+
+
+def _week_start(days):
+    # 1970-01-01 was a Thursday, so day numbers are shifted by 3 to land on Mondays
+    return days - (days.astype(np.int64) + 3) % 7
+
+
+def _listed(values, digits=2):
+    """Round for JSON, with NaN (undefined ratios) as None."""
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def daily_load(columns, first_day, days):
+    """Training minutes for each of `days` local days starting at first_day."""
+    day_index = (columns['day'] - first_day).astype(np.int64)
+    return np.bincount(day_index, weights=columns['minutes'], minlength=days)
+
+
+def training_load(columns, today):
+    """
+    Compute the training-load metrics from load_columns() output.
+
+    Returns:
+        dict: weekly series (weeks, volume_by_category, load, acwr, monotony,
+            strain) and the values as of today under 'current'
+    """
+    today = np.datetime64(today, 'D')
+    if not len(columns['day']):
+        return {'weeks': [], 'volume_by_category': {}, 'load': [], 'acwr': [], 'monotony': [], 'strain': [],
+                'current': {'acute_load': 0, 'chronic_load': 0, 'acwr': None, 'monotony': None, 'strain': None,
+                            'week_volume': 0}}
+
+    first_day = _week_start(columns['day'].min())
+    last_day = max(today, columns['day'].max())
+    days = int((last_day - first_day).astype(np.int64)) + 1
+
+    load = daily_load(columns, first_day, days)
+    acute_sum = _rolling(load, ACUTE_DAYS)
+    acute = acute_sum / ACUTE_DAYS
+    chronic = _rolling(load, CHRONIC_DAYS) / CHRONIC_DAYS
+    acwr = np.divide(acute, chronic, out=np.full(days, np.nan), where=chronic > 0)
+    # Loads are whole minutes, so the running sums and this numerator are exact integers
+    spread = ACUTE_DAYS * _rolling(load ** 2, ACUTE_DAYS) - acute_sum ** 2
+    std = np.sqrt(np.maximum(spread, 0)) / ACUTE_DAYS
+    monotony = np.divide(acute, std, out=np.full(days, np.nan), where=spread > 0)
+    strain = acute_sum * monotony
+
+    # Weekly volume per category, accumulated on a flat (category, week) grid
+    weeks = days // 7 + (days % 7 > 0)
+    volume = columns['volume']
+    week_index = (_week_start(columns['set_day']) - first_day).astype(np.int64) // 7
+    names, inverse = np.unique(columns['category'].astype(str), return_inverse=True)
+    lookup = np.array([CATEGORIES.index(name) if name in CATEGORIES else -1 for name in names], dtype=np.int64)
+    category_index = lookup[inverse]
+    known = category_index >= 0
+    grid = np.bincount(
+        category_index[known] * weeks + week_index[known], weights=volume[known], minlength=len(CATEGORIES) * weeks,
+    ).reshape(len(CATEGORIES), weeks)
+
+    # Weekly metrics are read at each week's last day, or today for the current week
+    week_ends = np.minimum(np.arange(weeks) * 7 + 6, days - 1)
+    weekly_load = np.add.reduceat(load, np.arange(weeks) * 7)
+    today_index = int((today - first_day).astype(np.int64))
+
+    return {
+        'weeks': [str(first_day + np.timedelta64(7 * i, 'D')) for i in range(weeks)],
+        'volume_by_category': {
+            name: _listed(grid[i], 1) for i, name in enumerate(CATEGORIES) if grid[i].any()
+        },
+        'load': _listed(weekly_load, 1),
+        'acwr': _listed(acwr[week_ends]),
+        'monotony': _listed(monotony[week_ends]),
+        'strain': _listed(strain[week_ends], 1),
+        'current': {
+            'acute_load': round(float(acute[today_index] * ACUTE_DAYS), 1),
+            'chronic_load': round(float(chronic[today_index] * CHRONIC_DAYS), 1),
+            'acwr': _listed(acwr[today_index:today_index + 1])[0],
+            'monotony': _listed(monotony[today_index:today_index + 1])[0],
+            'strain': _listed(strain[today_index:today_index + 1], 1)[0],
+            'week_volume': round(float(grid[:, today_index // 7].sum()), 1),
+        },
+    }
+
+
+def user_training_load(user, today, tz):
+    """Training-load metrics for a user's whole history, as of `today` in `tz`."""
+    return training_load(load_columns(user, tz), today)
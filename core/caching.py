@@ -0,0 +1,96 @@
+"""
+Per-user cached computations.
+
+Every user has a data version that is bumped whenever one of their workouts,
+exercise sets, weight entries or profile changes (see core.signals). Cached
+values are keyed by that version, so a write makes stale entries unreachable
+instead of having to find and delete them; they age out through the timeout.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+_MISSING = object()
+_STATS_KEYS = {'hits': 'fittrack:stats:hits', 'misses': 'fittrack:stats:misses'}
+
+
+def _cache():
+    return caches[getattr(settings, 'FITTRACK_CACHE_ALIAS', 'default')]
+
+
+def _version_key(user_id):
+    return f'fittrack:user:{user_id}:version'
+
+
+def data_version(user_id):
+    """Return the current data version for a user, initialising it if needed."""
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Seeding from the clock keeps a re-created key above any version evicted earlier
+        cache.add(_version_key(user_id), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached value for a user."""
+    cache = _cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def _count(outcome):
+    cache = _cache()
+    try:
+        cache.incr(_STATS_KEYS[outcome])
+    except ValueError:
+        cache.add(_STATS_KEYS[outcome], 1, timeout=None)
+
+
+def get_or_compute(user_id, name, compute, timeout=None):
+    """
+    Return a cached value for the user's current data version, computing it on a miss.
+
+    Args:
+        user_id: Owner of the data the value is derived from
+        name: Name of the cached value, unique per kind of computation
+        compute: Zero-argument callable producing the value
+        timeout: Seconds to keep the value, defaults to FITTRACK_USER_CACHE_TIMEOUT
+
+    Returns:
+        The cached or freshly computed value
+    """
+    cache = _cache()
+    key = f'fittrack:user:{user_id}:{name}:v{data_version(user_id)}'
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count('hits')
+        return value
+
+    _count('misses')
+    value = compute()
+    if timeout is None:
+        timeout = getattr(settings, 'FITTRACK_USER_CACHE_TIMEOUT', 60 * 60 * 24)
+    cache.set(key, value, timeout)
+    return value
+
+
+def cache_stats():
+    """Return hit/miss counters shared by every process using the cache backend."""
+    values = _cache().get_many(_STATS_KEYS.values())
+    hits = values.get(_STATS_KEYS['hits'], 0)
+    misses = values.get(_STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_cache_stats():
+    _cache().delete_many(_STATS_KEYS.values())
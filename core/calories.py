@@ -0,0 +1,158 @@
+"""
+Energy estimates for workouts from MET values.
+
+A workout burns MET x body weight (kg) x hours. Its MET is the mean of its
+exercises' METs (Exercise.met, else a default for the exercise category),
+weighted by each set's time: the logged seconds, or SET_SECONDS per set when
+the set is untimed. Its hours come from the logged duration, else from the
+summed set durations, as for the daily rollups. Body weight is the user's
+WeightHistory entry nearest to the workout day, else the profile weight;
+workouts of users with neither get no estimate. Weight entries are dated in
+the server timezone, so workout days are cut in it too.
+
+Estimates are computed for any number of workouts at once over NumPy arrays
+and stored on WorkoutSession.kcal.
+"""
+import numpy as np
+from django.db import connection, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .analytics import as_columns
+from .models import ExerciseSet, UserProfile, WeightHistory, WorkoutSession
+from .rollups import day_bounds
+
+CATEGORY_METS = {'strength': 5.0, 'cardio': 7.0, 'flexibility': 2.5, 'other': 3.5}
+
+# Used for workouts whose sets carry no category, e.g. a logged duration without sets
+DEFAULT_MET = CATEGORY_METS['other']
+
+# Assumed working time of one untimed set
+SET_SECONDS = 60
+
+# Users are keyed with their day numbers into one sorted int64 array
+_DAYS_PER_USER = 1 << 20
+
+
+def _days(values):
+    return np.array(values, dtype='datetime64[D]').astype(np.int64)
+
+
+def _met(columns):
+    """Effective MET of each set: the exercise's own, else its category default."""
+    names, inverse = np.unique(np.array(columns['category'], dtype=object).astype(str), return_inverse=True)
+    defaults = np.array([CATEGORY_METS.get(name, DEFAULT_MET) for name in names])[inverse]
+    met = np.array(columns['met'], dtype=float)
+    return np.where(np.isnan(met), defaults, met)
+
+
+def _body_weights(user_ids, days):
+    """Body weight per workout: the nearest WeightHistory entry, else the profile weight, else NaN."""
+    users = np.unique(user_ids).tolist()
+    history = as_columns(
+        WeightHistory.objects.filter(user_id__in=users).order_by('user_id', 'recorded_date')
+        .values_list('user_id', 'recorded_date', 'weight_kg'),
+        ('user_id', 'day', 'weight_kg'),
+    )
+    profile_weights = dict(
+        UserProfile.objects.filter(user_id__in=users, weight_kg__isnull=False).values_list('user_id', 'weight_kg')
+    )
+    weights = np.array([profile_weights.get(user_id, np.nan) for user_id in user_ids.tolist()], dtype=float)
+    if not history['day']:
+        return weights
+
+    keys = np.array(history['user_id'], dtype=np.int64) * _DAYS_PER_USER + _days(history['day'])
+    history_weights = np.array(history['weight_kg'], dtype=float)
+    wanted = user_ids * _DAYS_PER_USER + days
+    # The entries either side of each workout day; the nearer one of the same user wins
+    after = np.clip(np.searchsorted(keys, wanted), 0, len(keys) - 1)
+    before = np.clip(after - 1, 0, len(keys) - 1)
+    gap_after = np.where(keys[after] // _DAYS_PER_USER == user_ids, np.abs(keys[after] - wanted), np.inf)
+    gap_before = np.where(keys[before] // _DAYS_PER_USER == user_ids, np.abs(wanted - keys[before]), np.inf)
+    nearest = np.where(gap_before <= gap_after, before, after)
+    found = np.minimum(gap_before, gap_after) < np.inf
+    return np.where(found, history_weights[nearest], weights)
+
+
+def estimate(workouts):
+    """
+    Estimate the energy of each workout in a queryset.
+
+    Returns:
+        dict: {workout_id: kcal}, with None where the user's weight is unknown
+    """
+    rows = as_columns(
+        workouts.order_by().annotate(day=TruncDate('date', tzinfo=timezone.get_default_timezone()))
+        .values_list('pk', 'user_id', 'day', 'duration_minutes', 'total_seconds'),
+        ('id', 'user_id', 'day', 'duration_minutes', 'total_seconds'),
+    )
+    if not rows['id']:
+        return {}
+    sets = as_columns(
+        ExerciseSet.objects.filter(workout_id__in=workouts.order_by().values('pk')).order_by()
+        .values_list('workout_id', 'exercise__met', 'exercise__category', 'sets', 'duration_seconds'),
+        ('workout_id', 'met', 'category', 'sets', 'duration_seconds'),
+    )
+
+    ids = np.array(rows['id'], dtype=np.int64)
+    order = np.argsort(ids)
+    ids = ids[order]
+    user_ids = np.array(rows['user_id'], dtype=np.int64)[order]
+    days = _days(rows['day'])[order]
+    duration = np.array(rows['duration_minutes'], dtype=float)[order]
+    seconds = np.array(rows['total_seconds'], dtype=float)[order]
+
+    met = np.full(len(ids), DEFAULT_MET)
+    if sets['workout_id']:
+        workout_index = np.searchsorted(ids, np.array(sets['workout_id'], dtype=np.int64))
+        set_seconds = np.nan_to_num(np.array(sets['duration_seconds'], dtype=float))
+        untimed = np.maximum(np.nan_to_num(np.array(sets['sets'], dtype=float)), 1) * SET_SECONDS
+        time = np.where(set_seconds > 0, set_seconds, untimed)
+        met_time = np.bincount(workout_index, weights=_met(sets) * time, minlength=len(ids))
+        total_time = np.bincount(workout_index, weights=time, minlength=len(ids))
+        met = np.divide(met_time, total_time, out=met, where=total_time > 0)
+
+    hours = np.where(duration > 0, duration / 60, seconds / 3600)
+    kcal = np.round(met * _body_weights(user_ids, days) * hours, 1)
+    return {
+        workout_id: None if np.isnan(value) else float(value)
+        for workout_id, value in zip(ids.tolist(), kcal.tolist())
+    }
+
+
+def store(workouts):
+    """Estimate and save the kcal of the workouts in a queryset."""
+    estimates = estimate(workouts)
+    # One prepared UPDATE executed per row; bulk_update's CASE over every row dominated large backfills
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(WorkoutSession._meta.db_table)} SET {quote('kcal')} = %s WHERE {quote('id')} = %s",
+            [(kcal, pk) for pk, kcal in estimates.items()],
+        )
+    return estimates
+
+
+def refresh(workout_ids):
+    """Re-estimate the given workouts after their sets, duration or date changed."""
+    return store(WorkoutSession.objects.filter(pk__in=workout_ids))
+
+
+def refresh_near_weight(user_id, day):
+    """
+    Re-estimate the workouts whose nearest weight entry may have changed
+    with an entry added, edited or removed on `day`.
+
+    Only workouts between the neighbouring entries on either side can
+    switch to or from this entry.
+    """
+    entries = WeightHistory.objects.filter(user_id=user_id).values_list('recorded_date', flat=True)
+    previous = entries.filter(recorded_date__lt=day).order_by('-recorded_date').first()
+    following = entries.filter(recorded_date__gt=day).order_by('recorded_date').first()
+    tz = timezone.get_default_timezone()
+    workouts = WorkoutSession.objects.filter(user_id=user_id)
+    if previous is not None:
+        workouts = workouts.filter(date__gte=day_bounds(previous, tz)[0])
+    if following is not None:
+        workouts = workouts.filter(date__lt=day_bounds(following, tz)[1])
+    return store(workouts)
@@ -0,0 +1,200 @@
+"""
+Chart series for the dashboard's JSON API.
+
+Activity minutes come from the daily rollups and weight from WeightHistory;
+both are bucketed by day, week or month in the database. Ranges span at
+most MAX_RANGE_DAYS, and an activity bucket is coarsened when it would give
+more than MAX_POINTS buckets, so no series grows with the dates asked for.
+Weight series longer than the requested point budget are downsampled with
+largest-triangle-three-buckets, which keeps the visual peaks and dips.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Avg, F, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyActivity, WeightHistory
+
+SERIES = ('activity', 'weight')
+RANGES = ('week', 'month', 'year', 'all', 'custom')
+BUCKETS = ('day', 'week', 'month')
+
+RANGE_DAYS = {'week': 7, 'month': 30, 'year': 365}
+
+# Longest range a chart covers; 'all' starts no earlier than this before its end
+MAX_RANGE_DAYS = 20 * 366
+
+# Shortest length of each bucket in days
+BUCKET_DAYS = {'day': 1, 'week': 7, 'month': 28}
+
+DEFAULT_POINTS = 200
+MAX_POINTS = 2000
+
+_TRUNC = {'week': TruncWeek, 'month': TruncMonth}
+
+
+def resolve_range(range_name, today, start=None, end=None):
+    """
+    Turn a named range into concrete (start, end) dates, inclusive.
+
+    'all' returns a None start, which the series functions replace with the
+    first day that has data.
+
+    Raises:
+        ValueError: For an unknown range or a malformed or too long custom range
+    """
+    if range_name not in RANGES:
+        raise ValueError(f"Unknown range '{range_name}'. Use one of: {', '.join(RANGES)}.")
+    if range_name == 'all':
+        return None, today
+    if range_name == 'custom':
+        if not start or not end:
+            raise ValueError("A custom range needs both 'start' and 'end' (YYYY-MM-DD).")
+        start, end = date.fromisoformat(start), date.fromisoformat(end)
+        if start > end:
+            raise ValueError("'start' must not be after 'end'.")
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValueError(f"A custom range covers at most {MAX_RANGE_DAYS} days.")
+        return start, end
+    return today - timedelta(days=RANGE_DAYS[range_name] - 1), today
+
+
+def default_bucket(start, end):
+    """Pick a bucket size that keeps a range to at most a few hundred points."""
+    days = (end - start).days + 1
+    if days <= 92:
+        return 'day'
+    if days <= 730:
+        return 'week'
+    return 'month'
+
+
+def fit_bucket(start, end, bucket=None):
+    """The requested (default: picked) bucket, coarsened until the range has at most MAX_POINTS buckets."""
+    bucket = bucket or default_bucket(start, end)
+    days = (end - start).days + 1
+    while bucket != BUCKETS[-1] and days > BUCKET_DAYS[bucket] * MAX_POINTS:
+        bucket = BUCKETS[BUCKETS.index(bucket) + 1]
+    return bucket
+
+
+def first_day(first, end):
+    """Start of an 'all' range: the first day with data, at most MAX_RANGE_DAYS before `end`."""
+    if first is None:
+        return end
+    return max(first, end - timedelta(days=MAX_RANGE_DAYS - 1))
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_keys(start, end, bucket):
+    """Every bucket start between two dates, so empty buckets can be filled in."""
+    key = bucket_start(start, bucket)
+    keys = []
+    while key <= end:
+        keys.append(key)
+        if bucket == 'day':
+            key += timedelta(days=1)
+        elif bucket == 'week':
+            key += timedelta(days=7)
+        else:
+            key = (key + timedelta(days=32)).replace(day=1)
+    return keys
+
+
+def _bucketed(queryset, date_field, bucket, **aggregates):
+    """Group a queryset by bucket start in the database."""
+    key = F(date_field) if bucket == 'day' else _TRUNC[bucket](date_field)
+    return (
+        queryset.order_by()
+        .annotate(bucket_key=key)
+        .values('bucket_key')
+        .annotate(**aggregates)
+        .order_by('bucket_key')
+    )
+
+
+def activity_series(user, start, end, bucket=None):
+    """Total activity minutes per bucket, with empty buckets reported as 0."""
+    rollups = DailyActivity.objects.filter(user=user)
+    if start is None:
+        start = first_day(rollups.aggregate(first=Min('day'))['first'], end)
+    bucket = fit_bucket(start, end, bucket)
+
+    rows = _bucketed(rollups.filter(day__range=(start, end)), 'day', bucket, minutes=Sum('minutes'))
+    minutes = {row['bucket_key']: row['minutes'] for row in rows}
+    keys = bucket_keys(start, end, bucket)
+    return {
+        'bucket': bucket,
+        'start': start,
+        'end': end,
+        'labels': [key.isoformat() for key in keys],
+        'values': [minutes.get(key, 0) for key in keys],
+    }
+
+
+def weight_series(user, start, end, bucket=None, points=DEFAULT_POINTS):
+    """Average weight per bucket, downsampled to at most `points` points."""
+    records = WeightHistory.objects.filter(user=user)
+    if start is None:
+        start = first_day(records.aggregate(first=Min('recorded_date'))['first'], end)
+    # No bucket limit here: the point budget bounds this series
+    bucket = bucket or default_bucket(start, end)
+
+    rows = _bucketed(
+        records.filter(recorded_date__range=(start, end)), 'recorded_date', bucket, weight=Avg('weight_kg')
+    )
+    series = lttb([(row['bucket_key'], row['weight']) for row in rows], points)
+    return {
+        'bucket': bucket,
+        'start': start,
+        'end': end,
+        'labels': [day.isoformat() for day, _ in series],
+        'values': [round(weight, 1) for _, weight in series],
+    }
+
+
+def lttb(points, threshold):
+    """
+    Largest-triangle-three-buckets downsampling.
+
+    Args:
+        points: (date, value) pairs sorted by date
+        threshold: Maximum number of points to keep
+
+    Returns:
+        list: The selected (date, value) pairs, always including the first and last
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    xs = [day.toordinal() for day, _ in points]
+    ys = [value for _, value in points]
+    every = (n - 2) / (threshold - 2)
+
+    sampled = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = max(min(int((i + 2) * every) + 1, n), next_start + 1)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,73 @@
+"""
+CSV export of workout data.
+
+Rows are read with a server-side iterator and formatted a chunk at a time, so
+an export is streamed to the client as it is produced and memory does not
+grow with the size of the history. The column layout matches what the
+importer reads back.
+"""
+import csv
+import zlib
+
+from django.utils import timezone
+
+from .importer import DATE_FORMAT
+from .models import ExerciseSet
+
+HEADER = ['date', 'exercise', 'sets', 'reps', 'weight_kg', 'duration_minutes',
+          'duration_seconds', 'distance_km', 'notes', 'exercise_notes']
+
+# Rows fetched per database round trip and formatted per yielded chunk
+CHUNK_SIZE = 2000
+
+_COLUMNS = ('workout__date', 'exercise__name', 'sets', 'reps', 'weight_kg', 'workout__duration_minutes',
+            'duration_seconds', 'distance_km', 'workout__notes', 'notes')
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(user, tz):
+    """Yield the CSV export for a user as text chunks, header first."""
+    writer = csv.writer(Echo())
+    rows = (
+        ExerciseSet.objects.filter(workout__user=user)
+        .order_by('workout__date', 'id')
+        .values_list(*_COLUMNS)
+    )
+
+    yield writer.writerow(HEADER)
+    chunk = []
+    for date, name, sets, *optional, workout_notes, notes in rows.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(writer.writerow([
+            timezone.localtime(date, tz).strftime(DATE_FORMAT),
+            name,
+            sets,
+            *(value or '' for value in optional),
+            workout_notes or '',
+            notes or '',
+        ]))
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def encode(chunks, compress=False):
+    """Encode text chunks as UTF-8, optionally as one gzip stream."""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
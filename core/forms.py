@@ -1,3 +1,5 @@
+import zoneinfo
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
@@ -34,6 +36,8 @@ class UserProfileForm(forms.ModelForm):
             "weight_kg",
             "fitness_level",
             "primary_goal_choice",
+            "timezone",
+            "leaderboard_opt_in",
         ]
         widgets = {
             "avatar": forms.FileInput(attrs={
@@ -66,6 +70,13 @@ class UserProfileForm(forms.ModelForm):
             "primary_goal_choice": forms.Select(attrs={
                 "class": "form-select",
             }),
+            "timezone": forms.Select(
+                choices=[(name, name) for name in sorted(zoneinfo.available_timezones())],
+                attrs={"class": "form-select"},
+            ),
+            "leaderboard_opt_in": forms.CheckboxInput(attrs={
+                "class": "form-check-input",
+            }),
         }
 
 
@@ -0,0 +1,134 @@
+"""
+Training history summaries for the AI planner prompt.
+
+The summary covers the WEEKS weeks up to the user's last active day, so it
+only changes when their data does: workout frequency, weekly minutes, the
+category mix, the most trained exercises with their recent weight trend,
+estimated energy and body weight. It is built from a handful of aggregate
+queries over the daily rollups, exercise sets, workouts and weight entries,
+cached against the user's data version, and capped at MAX_TOKENS so heavy
+users do not get longer prompts (and slower plans) than anyone else.
+"""
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Max, Q, Sum
+
+from .caching import get_or_compute
+from .models import DailyActivity, ExerciseSet, WeightHistory, WorkoutSession
+from .rollups import day_bounds, zone
+
+WEEKS = 8
+TOP_EXERCISES = 5
+
+# Hard cap on the summary, estimated at CHARS_PER_TOKEN characters per token
+MAX_TOKENS = 300
+CHARS_PER_TOKEN = 4
+
+
+def _weekly_minutes(user_id, first_day, last_day):
+    """Minutes per week of the period, oldest first, and the number of days with workouts."""
+    minutes = [0] * WEEKS
+    active_days = 0
+    rows = DailyActivity.objects.filter(user_id=user_id, day__range=(first_day, last_day)).order_by().values_list(
+        'day', 'minutes', 'workout_count',
+    )
+    for day, day_minutes, workout_count in rows:
+        minutes[(day - first_day).days // 7] += day_minutes
+        active_days += workout_count > 0
+    return minutes, active_days
+
+
+def _top_exercises(sets, middle):
+    """The most trained exercises with their heaviest weight in each half of the period."""
+    return list(
+        sets.values('exercise__name')
+        .annotate(
+            total_sets=Sum('sets'),
+            earlier=Max('weight_kg', filter=Q(workout__date__lt=middle)),
+            recent=Max('weight_kg', filter=Q(workout__date__gte=middle)),
+        )
+        .order_by('-total_sets', 'exercise__name')[:TOP_EXERCISES]
+    )
+
+
+def _exercise_line(row):
+    text = f"{row['exercise__name']} ({row['total_sets']} sets"
+    if row['recent'] and row['earlier']:
+        change = row['recent'] - row['earlier']
+        trend = 'steady' if abs(change) < 0.5 else f"{'up' if change > 0 else 'down'} from {row['earlier']:g} kg"
+        text += f", best {row['recent']:g} kg, {trend}"
+    elif row['recent'] or row['earlier']:
+        text += f", best {(row['recent'] or row['earlier']):g} kg"
+    return text + ")"
+
+
+def build_summary(user_id, last_day, tz):
+    """The summary lines for the WEEKS weeks ending on `last_day`, most important first."""
+    first_day = last_day - timedelta(weeks=WEEKS) + timedelta(days=1)
+    start, end = day_bounds(first_day, tz)[0], day_bounds(last_day, tz)[1]
+    middle = day_bounds(first_day + timedelta(weeks=WEEKS // 2), tz)[0]
+
+    workouts = WorkoutSession.objects.filter(user_id=user_id, date__gte=start, date__lt=end)
+    totals = workouts.aggregate(count=Count('pk'), avg_kcal=Avg('kcal'), kcal=Sum('kcal'))
+    if not totals['count']:
+        return []
+    weekly, active_days = _weekly_minutes(user_id, first_day, last_day)
+    sets = ExerciseSet.objects.filter(workout__in=workouts)
+    categories = dict(sets.order_by().values_list('exercise__category').annotate(total=Sum('sets')))
+    weights = WeightHistory.objects.filter(user_id=user_id, recorded_date__range=(first_day, last_day))
+    first_weight = weights.order_by('recorded_date').values_list('weight_kg', flat=True).first()
+    last_weight = weights.order_by('-recorded_date').values_list('weight_kg', flat=True).first()
+
+    lines = [
+        f"* **Period:** the {WEEKS} weeks up to {last_day.isoformat()} (last workout)",
+        f"* **Workout Frequency:** {totals['count'] / WEEKS:.1f} workouts per week "
+        f"({totals['count']} workouts on {active_days} days)",
+        f"* **Weekly Minutes (oldest first):** {', '.join(str(m) for m in weekly)}; "
+        f"average {sum(weekly) / WEEKS:.0f}",
+    ]
+    total_sets = sum(categories.values())
+    if total_sets:
+        mix = sorted(categories.items(), key=lambda item: -item[1])
+        lines.append("* **Workout Types:** " + ', '.join(
+            f"{name} {share / total_sets:.0%}" for name, share in mix
+        ) + " of sets")
+    top = _top_exercises(sets, middle)
+    if top:
+        lines.append("* **Top Exercises:** " + '; '.join(_exercise_line(row) for row in top))
+    if totals['kcal']:
+        lines.append(f"* **Energy:** about {totals['avg_kcal']:.0f} kcal per workout, "
+                     f"{totals['kcal'] / WEEKS:.0f} kcal per week")
+    if first_weight is not None and last_weight is not None:
+        lines.append(f"* **Body Weight:** {first_weight:g} kg to {last_weight:g} kg over the period")
+    return lines
+
+
+def _capped(lines, max_chars):
+    """Whole lines in order while they fit; the first line that does not is cut short."""
+    text = ''
+    for line in lines:
+        candidate = f"{text}\n{line}" if text else line
+        if len(candidate) > max_chars:
+            room = max_chars - len(text) - 1
+            if room > 20:
+                text = f"{text}\n{line[:room - 3]}..." if text else f"{line[:room - 3]}..."
+            break
+        text = candidate
+    return text
+
+
+def training_summary(profile):
+    """
+    The history block for a profile's planner prompt, or "" without workouts.
+
+    Cached against the user's data version, so repeated plan requests reuse it.
+    """
+    last_day = profile.last_active_day
+    if last_day is None:
+        return ""
+
+    def compute():
+        lines = build_summary(profile.user_id, last_day, zone(profile.timezone))
+        return _capped(lines, MAX_TOKENS * CHARS_PER_TOKEN)
+
+    return get_or_compute(profile.user_id, f'history_summary:{last_day.isoformat()}', compute)
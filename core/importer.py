@@ -0,0 +1,233 @@
+"""
+CSV import engine for workout data.
+
+Uploads are decoded chunk by chunk and parsed as a stream. Rows are collected
+into fixed-size batches; for each batch, exercises and sessions are resolved
+with a few set-based lookups and the missing exercises, sessions and sets are
+created with bulk_create, so memory stays bounded by the batch size rather
+than the file size. Row-level problems are collected as "Row N: message"
+strings, the same way the per-row importer reported them.
+"""
+import codecs
+import csv
+from contextlib import nullcontext
+from datetime import datetime
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import calories, signals
+from .models import Exercise, ExerciseSet, WorkoutSession
+from .records import record_sets
+from .rollups import refresh_workout_summaries, user_timezone
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Rows per bulk insert and per IN (...) lookup; stays under SQLite's variable limit
+BATCH_SIZE = 500
+
+
+class ImportResult:
+    """Outcome of an import: counts, per-row errors and the workout dates touched."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.imported_count = 0
+        self.error_rows = []
+        self.workout_dates = set()
+
+
+def _optional(row, key, cast):
+    value = row.get(key)
+    if not value:
+        return None
+    value = cast(value)
+    if value < 0:
+        raise ValueError(f"{key} must not be negative: {value}")
+    return value
+
+
+def _parse_session(row, tz):
+    workout_date = timezone.make_aware(datetime.strptime(row.get('date', ''), DATE_FORMAT), tz)
+    defaults = {
+        'duration_minutes': _optional(row, 'duration_minutes', int),
+        'notes': row.get('notes', ''),
+    }
+    return workout_date, defaults
+
+
+def _parse_set(row):
+    sets = int(row.get('sets', 1))
+    if sets < 0:
+        raise ValueError(f"sets must not be negative: {sets}")
+    return {
+        'sets': sets,
+        'reps': _optional(row, 'reps', int),
+        'weight_kg': _optional(row, 'weight_kg', float),
+        'duration_seconds': _optional(row, 'duration_seconds', int),
+        'distance_km': _optional(row, 'distance_km', float),
+        'notes': row.get('exercise_notes', ''),
+    }
+
+
+def parse_rows(reader, tz, result):
+    """
+    Lazily parse CSV dict rows into (row_num, workout_date, session_defaults, exercise_name, set_fields).
+
+    A row whose set columns are invalid still contributes its session, matching
+    the per-row importer, which created the session before the set failed.
+    """
+    for row_num, row in enumerate(reader, start=2):  # Start from 2 (after header)
+        result.rows_read += 1
+        try:
+            workout_date, defaults = _parse_session(row, tz)
+        except Exception as e:
+            result.error_rows.append(f"Row {row_num}: {str(e)}")
+            continue
+
+        exercise_name = (row.get('exercise') or '').strip()
+        set_fields = None
+        if exercise_name:
+            try:
+                set_fields = _parse_set(row)
+            except Exception as e:
+                result.error_rows.append(f"Row {row_num}: {str(e)}")
+        yield row_num, workout_date, defaults, exercise_name if set_fields else '', set_fields
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _resolve_sessions(user, parsed):
+    """Map each workout date to a session, creating the missing ones in bulk."""
+    defaults_by_date = {}
+    for _, workout_date, defaults, _, _ in parsed:
+        defaults_by_date.setdefault(workout_date, defaults)
+
+    sessions = {}
+    for dates in _chunks(defaults_by_date):
+        for session in WorkoutSession.objects.filter(user=user, date__in=dates).order_by('id'):
+            sessions.setdefault(session.date, session)
+
+    missing = [
+        WorkoutSession(user=user, date=workout_date, **defaults)
+        for workout_date, defaults in defaults_by_date.items()
+        if workout_date not in sessions
+    ]
+    for session in WorkoutSession.objects.bulk_create(missing, batch_size=BATCH_SIZE):
+        sessions[session.date] = session
+    return sessions
+
+
+def _resolve_exercises(names):
+    """Map exercise names to exercises, creating the missing ones in bulk."""
+    exercises = {}
+    for chunk in _chunks(names):
+        for exercise in Exercise.objects.filter(name__in=chunk).order_by('id'):
+            exercises.setdefault(exercise.name, exercise)
+
+    missing = [
+        Exercise(name=name, category='other', description=f'Imported from CSV: {name}')
+        for name in names
+        if name not in exercises
+    ]
+    for exercise in Exercise.objects.bulk_create(missing, batch_size=BATCH_SIZE):
+        exercises[exercise.name] = exercise
+    return exercises
+
+
+def _import_batch(user, batch):
+    """Create the sessions, exercises and sets for one batch of parsed rows."""
+    sessions = _resolve_sessions(user, batch)
+    exercises = _resolve_exercises({name for _, _, _, name, _ in batch if name})
+    new_sets = [
+        ExerciseSet(workout=sessions[workout_date], exercise=exercises[name], **set_fields)
+        for _, workout_date, _, name, set_fields in batch
+        if name
+    ]
+    ExerciseSet.objects.bulk_create(new_sets, batch_size=BATCH_SIZE)
+    refresh_workout_summaries({exercise_set.workout_id for exercise_set in new_sets})
+    calories.refresh([session.pk for session in sessions.values()])
+    record_sets(user.id, new_sets)
+    return len(new_sets), set(sessions)
+
+
+def import_rows(user, reader, tz=None, atomic=True, progress=None):
+    """
+    Import parsed CSV dict rows for a user.
+
+    Args:
+        user: Owner of the imported workouts
+        reader: Iterable of dict rows (e.g. csv.DictReader)
+        tz: Timezone the naive CSV dates are in, defaults to the user's profile timezone
+        atomic: Import everything in one transaction; otherwise each batch
+            commits on its own, so progress is visible to other connections
+        progress: Optional callable(result) invoked after each batch
+
+    Returns:
+        ImportResult
+    """
+    result = ImportResult()
+    with transaction.atomic() if atomic else nullcontext():
+        try:
+            for batch in _batches(parse_rows(reader, tz or user_timezone(user.id), result)):
+                with transaction.atomic():
+                    imported, workout_dates = _import_batch(user, batch)
+                result.imported_count += imported
+                result.workout_dates |= workout_dates
+                if progress:
+                    progress(result)
+        except Exception:
+            # Batches committed before a failure part way through the file stay imported
+            if not atomic:
+                _sync(user, result)
+            raise
+        _sync(user, result)
+    return result
+
+
+def _sync(user, result):
+    """Bring rollups, streaks and the cache version up to date for the imported workouts."""
+    if result.workout_dates:
+        with transaction.atomic():
+            signals.sync_bulk_changes(user.id, result.workout_dates)
+
+
+def decode_lines(chunks, encoding='utf-8-sig'):
+    """
+    Decode byte chunks incrementally and yield text lines, keeping their line endings.
+
+    Multi-byte characters split across chunks are handled by the incremental
+    decoder; 'utf-8-sig' drops a leading byte order mark if there is one.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def import_file(user, file, tz=None, **kwargs):
+    """Stream-import a CSV file object (an UploadedFile or a stored FieldFile)."""
+    return import_rows(user, csv.DictReader(decode_lines(file.chunks())), tz, **kwargs)
+
+
+def import_csv_text(user, text, tz=None):
+    """Import a decoded CSV document."""
+    return import_rows(user, csv.DictReader(text.splitlines()), tz)
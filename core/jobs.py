@@ -0,0 +1,190 @@
+"""
+Background jobs.
+
+Jobs are rows in the database (ImportJob, PlanJob) so any process can report
+their progress. They run on small in-process thread pools, or, with
+FITTRACK_JOBS_IN_PROCESS = False, are left queued for
+``python manage.py run_jobs`` to pick up.
+
+AI plan generations spend tens of seconds waiting on the model, so they get
+their own pool (FITTRACK_PLAN_WORKERS threads) and cannot hold up imports.
+Their queue is bounded: past FITTRACK_PLAN_QUEUE_LIMIT unfinished jobs,
+enqueue_plan() raises QueueFull instead of queueing more.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import history, plans
+from .importer import import_file
+from .models import ImportJob, PlanJob, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Pool name -> setting holding its number of worker threads
+POOLS = {'default': 'FITTRACK_JOB_WORKERS', 'llm': 'FITTRACK_PLAN_WORKERS'}
+
+# Unfinished plan jobs older than this were lost with their process and no longer count
+PLAN_JOB_STALE_AFTER = timedelta(minutes=10)
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    """Raised when too many plan generations are already waiting or running."""
+
+
+def _get_executor(pool='default'):
+    with _executor_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=getattr(settings, POOLS[pool], 2),
+                thread_name_prefix=f'fittrack-{pool}',
+            )
+        return _executors[pool]
+
+
+def _run_in_worker(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background job %s%r crashed", func.__name__, args)
+    finally:
+        connection.close()
+
+
+def submit(func, *args, pool='default'):
+    """
+    Run func(*args) on a background pool once the current transaction commits.
+
+    With FITTRACK_JOBS_EAGER the call happens inline instead, which keeps
+    tests on a single connection.
+    """
+    if getattr(settings, 'FITTRACK_JOBS_EAGER', False):
+        func(*args)
+        return
+    if not getattr(settings, 'FITTRACK_JOBS_IN_PROCESS', True):
+        return
+    transaction.on_commit(lambda: _get_executor(pool).submit(_run_in_worker, func, *args))
+
+
+def _claim(job_model, job_id):
+    """Move a queued job to running; False if another worker got there first."""
+    return job_model.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now(),
+    ) == 1
+
+
+def enqueue_import(job):
+    submit(run_import_job, job.pk)
+
+
+def run_import_job(job_id):
+    """Import the CSV stored on an ImportJob, saving progress after every batch."""
+    if not _claim(ImportJob, job_id):
+        return
+    job = ImportJob.objects.select_related('user').get(pk=job_id)
+
+    def save_progress(result):
+        job.processed_rows = result.rows_read
+        job.failed_rows = len(result.error_rows)
+        job.imported_count = result.imported_count
+        job.save(update_fields=['processed_rows', 'failed_rows', 'imported_count'])
+
+    try:
+        with job.csv_file.open('rb'):
+            result = import_file(job.user, job.csv_file, atomic=False, progress=save_progress)
+    except Exception as e:
+        job.status = 'failed'
+        job.errors = job.errors + [f'Error processing CSV file: {str(e)}']
+    else:
+        job.status = 'done'
+        job.processed_rows = result.rows_read
+        job.failed_rows = len(result.error_rows)
+        job.imported_count = result.imported_count
+        job.errors = result.error_rows[:ImportJob.MAX_STORED_ERRORS]
+    job.finished_at = timezone.now()
+    # The upload is only needed while the job runs
+    job.csv_file.delete(save=False)
+    job.save()
+
+
+def enqueue_plan(user, regenerate=False, section='', instructions=''):
+    """
+    Queue an AI plan generation for a user and return its PlanJob.
+
+    With a `section` (a week number or "diet") only that part of the user's
+    latest plan is rewritten, following the optional `instructions`.
+
+    A user's unfinished job is returned rather than queueing a second one.
+
+    Raises:
+        QueueFull: FITTRACK_PLAN_QUEUE_LIMIT jobs are already waiting or running
+    """
+    active = PlanJob.objects.filter(status__in=('queued', 'running'),
+                                    created_at__gte=timezone.now() - PLAN_JOB_STALE_AFTER)
+    existing = active.filter(user=user).first()
+    if existing is not None:
+        return existing
+    if active.count() >= getattr(settings, 'FITTRACK_PLAN_QUEUE_LIMIT', 20):
+        raise QueueFull("The planner is busy right now. Please try again in a minute.")
+    job = PlanJob.objects.create(user=user, regenerate=regenerate, section=section, instructions=instructions)
+    submit(run_plan_job, job.pk, pool='llm')
+    return job
+
+
+def run_plan_job(job_id):
+    """
+    Generate (or reuse) the plan for a PlanJob's user, or rewrite the
+    job's section of their latest plan.
+
+    The model output is streamed and every finished week is saved on the job
+    straight away, for the planner page to show while the rest is written.
+    """
+    if not _claim(PlanJob, job_id):
+        return
+    job = PlanJob.objects.select_related('user').get(pk=job_id)
+    profile, _ = UserProfile.objects.get_or_create(user=job.user)
+
+    def save_week(week):
+        job.weeks.append(week)
+        PlanJob.objects.filter(pk=job.pk).update(weeks=job.weeks)
+
+    try:
+        latest = plans.latest_plan(job.user) if job.section else None
+        if job.section and latest is None:
+            result, stored = {"error": "There is no stored plan to change.", "details": ""}, None
+        elif job.section:
+            result, stored = plans.regenerate_section(latest, profile, history.training_summary(profile),
+                                                      job.section, job.instructions)
+        else:
+            result, stored = plans.get_or_generate(profile, history.training_summary(profile),
+                                                   regenerate=job.regenerate, on_week=save_week)
+    except Exception as e:
+        result, stored = {"error": f"An error occurred while generating the plan: {str(e)}", "details": ""}, None
+    if stored is None and not isinstance(result, dict):
+        result = {"error": "The AI response was not a plan object.", "raw_text": str(result)}
+    job.plan = stored
+    job.error = None if stored is not None else result
+    job.status = 'done' if stored is not None else 'failed'
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def run_queued_jobs():
+    """Process every queued job in this process; returns how many ran."""
+    count = 0
+    for job_id in ImportJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True):
+        run_import_job(job_id)
+        count += 1
+    for job_id in PlanJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True):
+        run_plan_job(job_id)
+        count += 1
+    return count
@@ -0,0 +1,135 @@
+"""
+Leaderboards among users who opted in on their profile.
+
+Boards are snapshots: refresh() ranks every opted-in user from the daily
+rollups (weekly minutes and volume) and the personal records (one board per
+exercise and record kind), and stores each user's position and rank. Pages
+are read with keyset pagination on the stored position, and a user's own
+rank is a single lookup on the (leaderboard, user) unique index, so neither
+grows with the number of users. Run ``manage.py refresh_leaderboards``
+periodically to keep the snapshots current.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailyActivity, Leaderboard, LeaderboardEntry, PersonalRecord
+from .records import LOWER_IS_BETTER
+
+PAGE_SIZE = 50
+
+# Weekly metric -> DailyActivity column summed over the week
+WEEKLY_COLUMNS = {'weekly_minutes': 'minutes', 'weekly_volume': 'volume_kg'}
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _ranked(rows):
+    """Yield (user_id, score, position, rank) from (user_id, score) rows in board order."""
+    previous = None
+    rank = 0
+    for position, (user_id, score) in enumerate(rows, start=1):
+        if score != previous:
+            rank, previous = position, score
+        yield user_id, score, position, rank
+
+
+def _store(leaderboard, rows, batch_size=1000):
+    """Replace a board's entries with `rows`, (user_id, score) pairs in board order."""
+    with transaction.atomic():
+        leaderboard.entries.all().delete()
+        count = 0
+        batch = []
+        for user_id, score, position, rank in _ranked(rows):
+            batch.append(LeaderboardEntry(leaderboard=leaderboard, user_id=user_id,
+                                          score=score, position=position, rank=rank))
+            if len(batch) >= batch_size:
+                count += len(LeaderboardEntry.objects.bulk_create(batch))
+                batch = []
+        count += len(LeaderboardEntry.objects.bulk_create(batch))
+        leaderboard.entry_count = count
+        leaderboard.refreshed_at = timezone.now()
+        leaderboard.save(update_fields=['entry_count', 'refreshed_at'])
+    return count
+
+
+def refresh_weekly(metric, start):
+    """Rebuild one weekly board for the week starting on `start` from the daily rollups."""
+    leaderboard, _ = Leaderboard.objects.get_or_create(metric=metric, week_start=start)
+    rows = (
+        DailyActivity.objects.filter(user__profile__leaderboard_opt_in=True, day__range=(start, start + timedelta(days=6)))
+        .values('user_id')
+        .annotate(score=Sum(WEEKLY_COLUMNS[metric]))
+        .filter(score__gt=0)
+        .order_by('-score', 'user_id')
+        .values_list('user_id', 'score')
+    )
+    return _store(leaderboard, rows.iterator())
+
+
+def refresh_records():
+    """Rebuild the per-exercise record boards; boards nobody holds a record on are dropped."""
+    records = PersonalRecord.objects.filter(user__profile__leaderboard_opt_in=True).values_list(
+        'exercise_id', 'kind', 'user_id', 'value',
+    )
+    lower = records.filter(kind__in=LOWER_IS_BETTER).order_by('exercise_id', 'kind', 'value', 'user_id')
+    higher = records.exclude(kind__in=LOWER_IS_BETTER).order_by('exercise_id', 'kind', '-value', 'user_id')
+
+    kept = []
+    for ordered in (lower, higher):
+        for (exercise_id, kind), rows in groupby(ordered.iterator(), key=lambda row: row[:2]):
+            leaderboard, _ = Leaderboard.objects.get_or_create(metric='record', exercise_id=exercise_id,
+                                                               record_kind=kind)
+            _store(leaderboard, (row[2:] for row in rows))
+            kept.append(leaderboard.pk)
+    Leaderboard.objects.filter(metric='record').exclude(pk__in=kept).delete()
+    return len(kept)
+
+
+def refresh(today=None, weeks=2, keep_weeks=8):
+    """
+    Rebuild the weekly boards of the last `weeks` weeks and every record board.
+
+    The previous week is included by default so workouts logged late still
+    count towards its final standings. Weekly boards older than `keep_weeks`
+    weeks are deleted.
+
+    Returns:
+        int: Number of boards rebuilt
+    """
+    current = week_start(today or timezone.localdate())
+    refreshed = 0
+    for i in range(weeks):
+        for metric in WEEKLY_COLUMNS:
+            refresh_weekly(metric, current - timedelta(weeks=i))
+            refreshed += 1
+    Leaderboard.objects.filter(metric__in=WEEKLY_COLUMNS,
+                               week_start__lt=current - timedelta(weeks=keep_weeks - 1)).delete()
+    return refreshed + refresh_records()
+
+
+def withdraw(user_id):
+    """Take a user off every board at once, e.g. when they opt out; ranks settle on the next refresh."""
+    return LeaderboardEntry.objects.filter(user_id=user_id).delete()[0]
+
+
+def page(leaderboard, after=0, size=PAGE_SIZE):
+    """Up to `size` entries following position `after`, with their users loaded."""
+    return list(leaderboard.entries.filter(position__gt=after).select_related('user')[:size])
+
+
+def own_entry(leaderboard, user):
+    return leaderboard.entries.filter(user=user).first()
+
+
+def format_score(leaderboard, score):
+    if leaderboard.metric == 'record':
+        return PersonalRecord(kind=leaderboard.record_kind, value=score).display_value
+    if leaderboard.metric == 'weekly_volume':
+        return f"{score:,.0f} kg"
+    return f"{score:,.0f} min"
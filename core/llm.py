@@ -0,0 +1,353 @@
+"""
+Language model backends for the AI planner.
+
+FITTRACK_LLM_BACKEND picks one:
+
+- 'gemini' (default): Google Gemini through google.generativeai, keyed by
+  GEMINI_API_KEY.
+- 'http': a local server speaking the OpenAI chat completions API
+  (llama.cpp, Ollama, vLLM, ...) at FITTRACK_LLM_URL, asked for
+  FITTRACK_LLM_MODEL.
+- 'stub': no model at all. Writes a fixed, valid 4-week plan after
+  FITTRACK_LLM_STUB_LATENCY seconds, streamed in chunks with the first one
+  after FITTRACK_LLM_STUB_FIRST_CHUNK seconds. Same prompt, same plan; for
+  development without a key, load tests and ``manage.py bench_planner``.
+
+Every backend has generate(prompt), returning the whole response text, and
+stream(prompt), yielding it in pieces as they are produced.
+
+Callers go through get_client(), which keeps one configured backend per
+process and guards it:
+
+- every call has a deadline of FITTRACK_LLM_TIMEOUT seconds;
+- transient failures (timeouts, connection errors, 429 and 5xx responses)
+  are retried up to FITTRACK_LLM_RETRIES times with jittered exponential
+  backoff, within the deadline;
+- after FITTRACK_LLM_BREAKER_FAILURES calls in a row fail, a circuit
+  breaker fails every call immediately for FITTRACK_LLM_BREAKER_RESET
+  seconds, then lets one trial call through;
+- at most FITTRACK_LLM_MAX_IN_FLIGHT calls run at once per process.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+
+# HTTP statuses worth retrying
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# google.api_core exception classes worth retrying, by name to keep the import optional
+TRANSIENT_ERRORS = {'DeadlineExceeded', 'InternalServerError', 'ResourceExhausted', 'ServiceUnavailable',
+                    'TooManyRequests', 'GatewayTimeout', 'Aborted'}
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the model while recent calls keep failing."""
+
+
+class TooManyCalls(Exception):
+    """Raised when no model call slot frees up before the deadline."""
+
+
+def is_transient(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in TRANSIENT_STATUSES
+    return isinstance(error, (TimeoutError, ConnectionError, urllib.error.URLError)) \
+        or type(error).__name__ in TRANSIENT_ERRORS
+
+
+class LLMBackend:
+    """`timeout` is the time left for the call in seconds, or None for no limit."""
+    name = None
+
+    def generate(self, prompt, timeout=None):
+        raise NotImplementedError
+
+    def stream(self, prompt, timeout=None):
+        yield self.generate(prompt, timeout=timeout)
+
+
+class GeminiBackend(LLMBackend):
+    name = 'gemini'
+    MODELS = ('gemini-2.5-flash', 'gemini-1.5-flash')
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    def model(self):
+        """The GenerativeModel, configured on first use and reused afterwards."""
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                api_key = os.getenv('GEMINI_API_KEY')
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY not found in .env file. Please set your Gemini API key.")
+                genai.configure(api_key=api_key)
+                try:
+                    self._model = genai.GenerativeModel(self.MODELS[0])
+                except Exception:
+                    self._model = genai.GenerativeModel(self.MODELS[1])
+            return self._model
+
+    def _options(self, timeout):
+        return {'request_options': {'timeout': timeout}} if timeout is not None else {}
+
+    def generate(self, prompt, timeout=None):
+        return self.model().generate_content(prompt, **self._options(timeout)).text
+
+    def stream(self, prompt, timeout=None):
+        for chunk in self.model().generate_content(prompt, stream=True, **self._options(timeout)):
+            yield chunk.text
+
+
+class HTTPBackend(LLMBackend):
+    """A chat completions endpoint, e.g. http://localhost:11434/v1/chat/completions for Ollama."""
+    name = 'http'
+
+    def __init__(self, url, model):
+        if not url:
+            raise ValueError("FITTRACK_LLM_URL is not set. Point it at your local chat completions endpoint.")
+        self.url = url
+        self.model = model
+
+    def _open(self, prompt, stream, timeout):
+        body = {'model': self.model, 'messages': [{'role': 'user', 'content': prompt}], 'stream': stream}
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        # The timeout bounds the connect and every read, so a stalled server cannot hang the worker
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def generate(self, prompt, timeout=None):
+        with self._open(prompt, stream=False, timeout=timeout) as response:
+            return json.load(response)['choices'][0]['message']['content']
+
+    def stream(self, prompt, timeout=None):
+        # Server-sent events, one JSON delta per data: line
+        with self._open(prompt, stream=True, timeout=timeout) as response:
+            for line in response:
+                line = line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    return
+                text = json.loads(data)['choices'][0]['delta'].get('content')
+                if text:
+                    yield text
+
+
+class StubBackend(LLMBackend):
+    name = 'stub'
+
+    DAYS = [
+        ('Upper Body Push', ['Bench Press', 'Overhead Press', 'Incline Dumbbell Press', 'Triceps Dips']),
+        ('Lower Body', ['Barbell Squat', 'Romanian Deadlift', 'Walking Lunges', 'Calf Raises']),
+        ('Rest Day', []),
+        ('Upper Body Pull', ['Pull-ups', 'Barbell Row', 'Face Pulls', 'Biceps Curls']),
+        ('Full Body Conditioning', ['Kettlebell Swings', 'Push-ups', 'Goblet Squat', 'Plank']),
+        ('Cardio', []),
+        ('Rest Day', []),
+    ]
+
+    def __init__(self, latency=0.0, first_chunk=0.0, chunk_size=200):
+        self.latency = latency
+        self.first_chunk = min(first_chunk, latency)
+        self.chunk_size = chunk_size
+
+    def plan(self, prompt):
+        tag = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+        weeks = [{
+            'week_number': week,
+            'focus': f'Progression block {week}',
+            'schedule': [{
+                'day': f'Day {day}',
+                'type': kind,
+                'exercises': [{'name': name, 'sets': '3', 'reps': f'{12 - week}-{14 - week}', 'notes': ''}
+                              for name in names],
+                'cardio': '25 min easy run' if kind == 'Cardio' else None,
+            } for day, (kind, names) in enumerate(self.DAYS, start=1)],
+        } for week in range(1, 5)]
+        return {
+            'training_plan': {'summary': f'Stub plan {tag}: a 4-day split with one cardio day.', 'weeks': weeks},
+            'diet_plan': {
+                'calories': '2400 kcal',
+                'macros': {'protein': '150 g', 'carbs': '270 g', 'fats': '80 g'},
+                'guidelines': ['Eat protein with every meal', 'Favour whole foods', 'Drink 2-3 litres of water'],
+                'meals': [{'type': meal, 'options': ['Option 1', 'Option 2']}
+                          for meal in ('Breakfast', 'Lunch', 'Dinner', 'Snacks')],
+            },
+        }
+
+    def _chunks(self, prompt):
+        text = json.dumps(self.plan(prompt), indent=2)
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def _sleep(self, seconds, deadline):
+        if deadline is not None and time.monotonic() + seconds > deadline:
+            time.sleep(max(deadline - time.monotonic(), 0))
+            raise TimeoutError("The stub model did not answer within the deadline.")
+        time.sleep(seconds)
+
+    def _deadline(self, timeout):
+        return None if timeout is None else time.monotonic() + timeout
+
+    def generate(self, prompt, timeout=None):
+        self._sleep(self.latency, self._deadline(timeout))
+        return ''.join(self._chunks(prompt))
+
+    def stream(self, prompt, timeout=None):
+        deadline = self._deadline(timeout)
+        chunks = self._chunks(prompt)
+        self._sleep(self.first_chunk, deadline)
+        gap = (self.latency - self.first_chunk) / max(len(chunks) - 1, 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                self._sleep(gap, deadline)
+            yield chunk
+
+
+def get_backend():
+    """A new instance of the backend selected by FITTRACK_LLM_BACKEND; callers want get_client()."""
+    name = getattr(settings, 'FITTRACK_LLM_BACKEND', 'gemini')
+    if name == 'gemini':
+        return GeminiBackend()
+    if name == 'http':
+        return HTTPBackend(getattr(settings, 'FITTRACK_LLM_URL', ''), getattr(settings, 'FITTRACK_LLM_MODEL', ''))
+    if name == 'stub':
+        return StubBackend(latency=getattr(settings, 'FITTRACK_LLM_STUB_LATENCY', 0.0),
+                           first_chunk=getattr(settings, 'FITTRACK_LLM_STUB_FIRST_CHUNK', 0.0))
+    raise ValueError(f"Unknown FITTRACK_LLM_BACKEND {name!r}; use 'gemini', 'http' or 'stub'.")
+
+
+class CircuitBreaker:
+    """Counts consecutive failures; open (failing fast) for `reset_after` seconds once `threshold` is reached."""
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_after - time.monotonic()
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpen(f"The model service is failing; calls resume in {max(remaining, 1):.0f} s.")
+            # Half open: this call is the trial
+            self._trial_running = True
+
+    def abandon(self):
+        """End a call that says nothing about the model's health, e.g. a configuration error."""
+        with self._lock:
+            self._trial_running = False
+
+    def record(self, success):
+        with self._lock:
+            self._trial_running = False
+            if success:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """One configured backend with deadlines, retries, a circuit breaker and a cap on concurrent calls."""
+
+    def __init__(self, backend, timeout, retries, backoff, max_in_flight, breaker_failures, breaker_reset):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+
+    def _call(self, attempt):
+        """Run attempt(time_left) under the guards; attempt yields text and is retried only before its first chunk."""
+        deadline = time.monotonic() + self.timeout
+        self.breaker.before_call()
+        if not self.slots.acquire(timeout=self.timeout):
+            self.breaker.abandon()
+            raise TooManyCalls("Too many plans are being generated right now.")
+        try:
+            for tries in range(self.retries + 1):
+                produced = False
+                try:
+                    for text in attempt(deadline - time.monotonic()):
+                        produced = True
+                        if time.monotonic() > deadline:
+                            raise TimeoutError("The model did not finish within the deadline.")
+                        yield text
+                except GeneratorExit:
+                    # The caller stopped reading
+                    self.breaker.abandon()
+                    raise
+                except Exception as e:
+                    transient = is_transient(e)
+                    # Full jitter backoff, as long as another try still fits in the deadline
+                    delay = random.uniform(0, self.backoff * 2 ** tries)
+                    if produced or not transient or tries == self.retries or time.monotonic() + delay >= deadline:
+                        if transient:
+                            self.breaker.record(False)
+                        else:
+                            self.breaker.abandon()
+                        raise
+                    time.sleep(delay)
+                else:
+                    self.breaker.record(True)
+                    return
+        finally:
+            self.slots.release()
+
+    def generate(self, prompt):
+        return ''.join(self._call(lambda timeout: [self.backend.generate(prompt, timeout=timeout)]))
+
+    def stream(self, prompt):
+        return self._call(lambda timeout: self.backend.stream(prompt, timeout=timeout))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_settings():
+    names = ('FITTRACK_LLM_BACKEND', 'FITTRACK_LLM_URL', 'FITTRACK_LLM_MODEL', 'FITTRACK_LLM_STUB_LATENCY',
+             'FITTRACK_LLM_STUB_FIRST_CHUNK', 'FITTRACK_LLM_TIMEOUT', 'FITTRACK_LLM_RETRIES', 'FITTRACK_LLM_BACKOFF',
+             'FITTRACK_LLM_MAX_IN_FLIGHT', 'FITTRACK_LLM_BREAKER_FAILURES', 'FITTRACK_LLM_BREAKER_RESET')
+    return tuple(getattr(settings, name, None) for name in names)
+
+
+def get_client():
+    """The process-wide LLMClient for the current settings."""
+    key = _client_settings()
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = LLMClient(
+                get_backend(),
+                timeout=getattr(settings, 'FITTRACK_LLM_TIMEOUT', 90),
+                retries=getattr(settings, 'FITTRACK_LLM_RETRIES', 2),
+                backoff=getattr(settings, 'FITTRACK_LLM_BACKOFF', 1.0),
+                max_in_flight=getattr(settings, 'FITTRACK_LLM_MAX_IN_FLIGHT', 4),
+                breaker_failures=getattr(settings, 'FITTRACK_LLM_BREAKER_FAILURES', 5),
+                breaker_reset=getattr(settings, 'FITTRACK_LLM_BREAKER_RESET', 30),
+            )
+        return _clients[key]
+
+
+def reset_clients():
+    """Forget the process-wide clients, with their breaker state (tests)."""
+    with _clients_lock:
+        _clients.clear()
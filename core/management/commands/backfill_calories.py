@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.caching import bump_data_version
+from core.calories import store
+from core.models import WorkoutSession
+
+
+class Command(BaseCommand):
+    help = "Estimate and store the energy (kcal) of existing workouts, a batch of workouts at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only estimate workouts of this user id (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Workouts estimated per round of queries.')
+
+    def handle(self, *args, **options):
+        workouts = WorkoutSession.objects.order_by('pk')
+        if options['user_ids']:
+            workouts = workouts.filter(user_id__in=options['user_ids'])
+
+        estimated = 0
+        last_pk = 0
+        while True:
+            # Keyset batches, so each round reads only its own workouts
+            batch = list(workouts.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            estimated += len(store(WorkoutSession.objects.filter(pk__in=batch)))
+            last_pk = batch[-1]
+            self.stdout.write(f"Estimated {estimated} workouts...")
+        self.stdout.write(self.style.SUCCESS(f"Stored energy estimates for {estimated} workouts."))
+
+        # Cached dashboards and plan summaries carry the old estimates
+        for user_id in workouts.order_by().values_list('user_id', flat=True).distinct():
+            bump_data_version(user_id)
@@ -0,0 +1,91 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core import analytics, signals
+from core.models import Exercise, ExerciseSet, WorkoutSession
+from core.rollups import refresh_workout_summaries
+
+
+def naive_training_load(user, today):
+    """The per-object version: load model instances and fold them in Python loops."""
+    daily = defaultdict(float)
+    volume = defaultdict(float)
+    seen = set()
+    for exercise_set in ExerciseSet.objects.filter(workout__user=user).select_related('workout', 'exercise'):
+        workout = exercise_set.workout
+        day = workout.date.date()
+        if workout.pk not in seen:
+            seen.add(workout.pk)
+            daily[day] += workout.duration_minutes or round(workout.total_seconds / 60)
+        week = day - timedelta(days=day.weekday())
+        volume[(exercise_set.exercise.category, week)] += (
+            (exercise_set.sets or 0) * (exercise_set.reps or 0) * (exercise_set.weight_kg or 0)
+        )
+
+    def window(days):
+        return [daily.get(today - timedelta(days=i), 0) for i in range(days)]
+
+    acute, chronic = window(analytics.ACUTE_DAYS), window(analytics.CHRONIC_DAYS)
+    acute_mean, chronic_mean = sum(acute) / len(acute), sum(chronic) / len(chronic)
+    std = statistics.pstdev(acute)
+    monotony = acute_mean / std if std else None
+    week = today - timedelta(days=today.weekday())
+    return {
+        'acute_load': round(sum(acute), 1),
+        'chronic_load': round(sum(chronic), 1),
+        'acwr': round(acute_mean / chronic_mean, 2) if chronic_mean else None,
+        'monotony': round(monotony, 2) if monotony else None,
+        'strain': round(sum(acute) * monotony, 1) if monotony else None,
+        'week_volume': round(sum(v for (_, w), v in volume.items() if w == week), 1),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Time the NumPy training-load analytics against a per-object loop on a synthetic history. "
+            "Writes to the configured database under a throwaway user; run it against a scratch copy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sets', type=int, default=100_000)
+        parser.add_argument('--sets-per-workout', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        user = User.objects.create_user(f'bench-analytics-{time.time_ns()}')
+        exercises = [Exercise.objects.create(name=f'Bench Analytics {category}', category=category)
+                     for category in analytics.CATEGORIES]
+        try:
+            workouts_needed = options['sets'] // options['sets_per_workout']
+            today = datetime(2025, 1, 1, 12, tzinfo=dt_timezone.utc)
+            with signals.muted():
+                workouts = WorkoutSession.objects.bulk_create([
+                    WorkoutSession(user=user, date=today - timedelta(days=i), duration_minutes=rng.choice([None, 45, 60]))
+                    for i in range(workouts_needed)
+                ], batch_size=1000)
+                ExerciseSet.objects.bulk_create([
+                    ExerciseSet(workout=workout, exercise=rng.choice(exercises), sets=3, reps=rng.randint(5, 12),
+                                weight_kg=rng.uniform(20, 120), duration_seconds=rng.randint(30, 240))
+                    for workout in workouts for _ in range(options['sets_per_workout'])
+                ], batch_size=1000)
+                refresh_workout_summaries(WorkoutSession.objects.filter(user=user).values('pk'))
+
+            runs = [
+                ('per-object loop', lambda: naive_training_load(user, today.date())),
+                ('numpy', lambda: analytics.user_training_load(user, today.date(), dt_timezone.utc)['current']),
+            ]
+            results = []
+            for label, run in runs:
+                started = time.perf_counter()
+                results.append(run())
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{label:>16}: {elapsed:.2f}s for {options['sets']:,} sets")
+            if results[0] != results[1]:
+                self.stderr.write(f"Results differ:\n  {results[0]}\n  {results[1]}")
+        finally:
+            user.delete()
+            Exercise.objects.filter(pk__in=[e.pk for e in exercises]).delete()
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = '''
+CREATE TABLE weight (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, weight_kg REAL NOT NULL, recorded TEXT NOT NULL);
+CREATE INDEX weight_user ON weight (user_id, recorded);
+'''
+
+# (label, pragmas, BEGIN statement): Django's SQLite defaults against the tuned settings
+CONFIGS = [
+    ('default', {}, 'BEGIN'),
+    ('tuned', getattr(settings, 'FITTRACK_SQLITE_PRAGMAS', {}), 'BEGIN IMMEDIATE'),
+]
+
+
+def connect(path, pragmas):
+    # Python's default 5 s timeout, the same busy wait Django uses without OPTIONS
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def writer(path, pragmas, begin, user_id, stop, counts):
+    """Log weights the way the views do: read the user's history, then insert, in one transaction."""
+    conn = connect(path, pragmas)
+    while not stop.is_set():
+        try:
+            conn.execute(begin)
+            conn.execute('SELECT count(*) FROM weight WHERE user_id = ?', (user_id,)).fetchone()
+            conn.execute("INSERT INTO weight (user_id, weight_kg, recorded) VALUES (?, 80.5, datetime('now'))",
+                         (user_id,))
+            conn.execute('COMMIT')
+            counts['writes'] += 1
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            counts['errors'] += 1
+    conn.close()
+
+
+def reader(path, pragmas, user_id, stop, counts):
+    """Read a user's weight series, as the dashboard and chart API do."""
+    conn = connect(path, pragmas)
+    while not stop.is_set():
+        try:
+            conn.execute('SELECT recorded, weight_kg FROM weight WHERE user_id = ? ORDER BY recorded DESC LIMIT 200',
+                         (user_id,)).fetchall()
+            counts['reads'] += 1
+        except sqlite3.OperationalError:
+            counts['errors'] += 1
+    conn.close()
+
+
+class Command(BaseCommand):
+    help = ("Compare SQLite throughput of parallel writers and readers with Django's default connection "
+            "settings and with FITTRACK_SQLITE_PRAGMAS plus immediate transactions. Uses a scratch file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        for label, pragmas, begin in CONFIGS:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                setup = connect(path, pragmas)
+                setup.executescript(SCHEMA)
+                setup.close()
+
+                stop = threading.Event()
+                counts = [{'writes': 0, 'reads': 0, 'errors': 0}
+                          for _ in range(options['writers'] + options['readers'])]
+                threads = [
+                    threading.Thread(target=writer, args=(path, pragmas, begin, i % 3, stop, counts[i]))
+                    for i in range(options['writers'])
+                ] + [
+                    threading.Thread(target=reader, args=(path, pragmas, i % 3, stop, counts[options['writers'] + i]))
+                    for i in range(options['readers'])
+                ]
+                for thread in threads:
+                    thread.start()
+                time.sleep(options['seconds'])
+                stop.set()
+                for thread in threads:
+                    thread.join()
+
+            totals = {key: sum(c[key] for c in counts) for key in ('writes', 'reads', 'errors')}
+            seconds = options['seconds']
+            self.stdout.write(
+                f"{label:>8}: {totals['writes'] / seconds:,.0f} writes/s, {totals['reads'] / seconds:,.0f} reads/s, "
+                f"{totals['errors']} 'database is locked' errors"
+            )
@@ -0,0 +1,91 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import signals
+from core.exporter import HEADER
+from core.importer import DATE_FORMAT, import_csv_text
+from core.models import Exercise, ExerciseSet, WorkoutSession
+
+
+def synthetic_csv(rows, seed=0):
+    """A CSV export with `rows` sets spread over sessions of about five sets each."""
+    rng = random.Random(seed)
+    names = [f'Bench Exercise {i}' for i in range(40)]
+    start = datetime(2020, 1, 1, 7, 0)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(HEADER)
+    for i in range(rows):
+        session_date = start + timedelta(days=i // 5, hours=rng.randint(0, 12))
+        writer.writerow([
+            session_date.replace(hour=7).strftime(DATE_FORMAT), rng.choice(names), rng.randint(1, 5),
+            rng.randint(5, 12), round(rng.uniform(10, 120), 1), 60, rng.randint(30, 300), '',
+            'bench session', '',
+        ])
+    return out.getvalue()
+
+
+def legacy_import(user, text):
+    """The previous importer: get_or_create and create per row, autocommit on."""
+    imported = 0
+    for row in csv.DictReader(io.StringIO(text)):
+        workout_date = timezone.make_aware(datetime.strptime(row['date'], DATE_FORMAT))
+        workout, _ = WorkoutSession.objects.get_or_create(
+            user=user, date=workout_date,
+            defaults={'duration_minutes': int(row['duration_minutes']) if row['duration_minutes'] else None,
+                      'notes': row.get('notes', '')},
+        )
+        exercise, _ = Exercise.objects.get_or_create(
+            name=row['exercise'].strip(),
+            defaults={'category': 'other', 'description': f"Imported from CSV: {row['exercise']}"},
+        )
+        ExerciseSet.objects.create(
+            workout=workout, exercise=exercise, sets=int(row['sets']),
+            reps=int(row['reps']) if row['reps'] else None,
+            weight_kg=float(row['weight_kg']) if row['weight_kg'] else None,
+            duration_seconds=int(row['duration_seconds']) if row['duration_seconds'] else None,
+            notes=row.get('exercise_notes', ''),
+        )
+        imported += 1
+    return imported
+
+
+class Command(BaseCommand):
+    help = ("Compare CSV import throughput (rows/second) of the per-row importer and the bulk engine. "
+            "Writes to the configured database under a throwaway user; run it against a scratch copy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help='Only time the bulk engine (the legacy path is slow on large files).')
+
+    def handle(self, *args, **options):
+        text = synthetic_csv(options['rows'])
+        runs = [('bulk engine', lambda user: import_csv_text(user, text).imported_count)]
+        if not options['skip_legacy']:
+            # The legacy path ran with the write hooks muted and one refresh at the end
+            def run_legacy(user):
+                with signals.muted():
+                    imported = legacy_import(user, text)
+                signals.sync_bulk_changes(user.id, WorkoutSession.objects.filter(user=user).values_list('date', flat=True))
+                return imported
+            runs.insert(0, ('per-row (before)', run_legacy))
+
+        created_exercises = Exercise.objects.filter(name__startswith='Bench Exercise ')
+        for label, run in runs:
+            user = User.objects.create_user(f'bench-import-{time.time_ns()}')
+            try:
+                started = time.perf_counter()
+                imported = run(user)
+                elapsed = time.perf_counter() - started
+            finally:
+                user.delete()
+                created_exercises.delete()
+            self.stdout.write(f"{label:>18}: {imported} rows in {elapsed:.2f}s = {imported / elapsed:,.0f} rows/s")
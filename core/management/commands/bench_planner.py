@@ -0,0 +1,105 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import jobs
+from core.models import PlanJob, UserProfile
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def client_loop(user, requests, poll, results):
+    """Request plans one after another like a user on the planner page, timing each until it is ready."""
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(user)
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.post(reverse('ai_planner'), {'regenerate': '1'})
+        if response.status_code == 503:
+            results['rejected'] += 1
+            continue
+        job_id = int(response['Location'].rsplit('=', 1)[1])
+        first_week = None
+        while True:
+            status, weeks = PlanJob.objects.filter(pk=job_id).values_list('status', 'weeks').get()
+            if first_week is None and weeks:
+                first_week = time.perf_counter() - start
+            if status in ('done', 'failed'):
+                break
+            time.sleep(poll)
+        results['latency'].append(time.perf_counter() - start)
+        if first_week is not None:
+            results['first_week'].append(first_week)
+        results['failed'] += status == 'failed'
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = ("Load the AI planner end to end (POST, background job, streamed plan) with concurrent clients "
+            "against the stub model backend, for each plan worker pool size given. Writes throwaway users "
+            "to the configured database; run it against a scratch copy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=4, help='Plans requested by each client')
+        parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+        parser.add_argument('--latency', type=float, default=2.0, help='Simulated seconds per plan')
+        parser.add_argument('--first-chunk', type=float, default=0.5, help='Simulated seconds to the first chunk')
+        parser.add_argument('--queue-limit', type=int, default=1000)
+        parser.add_argument('--poll', type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        stamp = time.time_ns()
+        users = [User.objects.create_user(f'bench-planner-{stamp}-{i}') for i in range(options['clients'])]
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, gender='male', age=30, height_cm=180, weight_kg=80) for user in users
+        ])
+        try:
+            for workers in options['workers']:
+                self.run(users, workers, options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, users, workers, options):
+        # One result dict per client thread, merged afterwards
+        per_client = [{'latency': [], 'first_week': [], 'rejected': 0, 'failed': 0} for _ in users]
+        with override_settings(FITTRACK_LLM_BACKEND='stub', FITTRACK_LLM_STUB_LATENCY=options['latency'],
+                               FITTRACK_LLM_STUB_FIRST_CHUNK=options['first_chunk'],
+                               FITTRACK_PLAN_WORKERS=workers, FITTRACK_LLM_MAX_IN_FLIGHT=workers,
+                               FITTRACK_PLAN_QUEUE_LIMIT=options['queue_limit'],
+                               FITTRACK_JOBS_EAGER=False, FITTRACK_JOBS_IN_PROCESS=True):
+            # A fresh pool sized for this run
+            jobs._executors.pop('llm', None)
+            threads = [
+                threading.Thread(target=client_loop, args=(user, options['requests'], options['poll'], results))
+                for user, results in zip(users, per_client)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            jobs._executors.pop('llm').shutdown()
+
+        results = {key: sum((r[key] for r in per_client), start=[] if key in ('latency', 'first_week') else 0)
+                   for key in per_client[0]}
+        latency = results['latency']
+        self.stdout.write(
+            f"{workers:>3} workers: {len(latency) / elapsed:6.2f} plans/s, "
+            f"latency p50 {percentile(latency, 50):6.2f}s p95 {percentile(latency, 95):6.2f}s "
+            f"(mean {statistics.fmean(latency) if latency else float('nan'):.2f}s), "
+            f"first week p50 {percentile(results['first_week'], 50):6.2f}s, "
+            f"{results['rejected']} rejected, {results['failed']} failed"
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from core.caching import bump_data_version
+from core.models import DailyActivity, WorkoutSession
+from core.records import rebuild_records
+from core.rollups import rebuild_rollups, refresh_workout_summaries
+from core.streaks import rebuild_streaks
+
+
+class Command(BaseCommand):
+    help = ("Recompute the per-workout set totals and rebuild the daily activity rollups, personal records "
+            "and streaks from workout history.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild rollups for this user id (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Users whose rows may change: those with workouts, and those whose old rollups are dropped
+        if options['user_ids']:
+            touched = set(options['user_ids'])
+        else:
+            touched = set(WorkoutSession.objects.order_by().values_list('user_id', flat=True).distinct())
+            touched |= set(DailyActivity.objects.order_by().values_list('user_id', flat=True).distinct())
+
+        workouts = None
+        if options['user_ids']:
+            workouts = WorkoutSession.objects.filter(user_id__in=options['user_ids']).values_list('pk', flat=True)
+        refreshed = refresh_workout_summaries(workouts)
+        self.stdout.write(f"Refreshed set totals of {refreshed} workouts.")
+        written = rebuild_rollups(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily rollup rows."))
+
+        user_ids = options['user_ids'] or WorkoutSession.objects.order_by().values_list('user_id', flat=True).distinct()
+        records = sum(len(rebuild_records(user_id)) for user_id in user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {records} personal records."))
+        profiles = rebuild_streaks(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the streaks of {profiles} profiles."))
+
+        # Cached dashboards and charts were computed from the old rows
+        for user_id in touched:
+            bump_data_version(user_id)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.leaderboards import refresh
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the leaderboard snapshots of opted-in users: weekly minutes and volume for recent weeks "
+            "and per-exercise personal records. Run it periodically, e.g. every 15 minutes from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=2,
+                            help='Weekly boards to rebuild, counting back from the current week.')
+        parser.add_argument('--keep-weeks', type=int, default=8,
+                            help='Weekly boards older than this many weeks are deleted.')
+
+    def handle(self, *args, **options):
+        boards = refresh(weeks=options['weeks'], keep_weeks=options['keep_weeks'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {boards} leaderboards."))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_queued_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (CSV imports, AI plans)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new jobs instead of exiting when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_queued_jobs()
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f"Ran {ran} job(s)."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
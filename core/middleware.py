@@ -0,0 +1,30 @@
+import zoneinfo
+
+from django.utils import timezone
+
+# Session key holding the signed-in user's profile timezone name
+TIMEZONE_SESSION_KEY = 'profile_timezone'
+
+
+class UserTimezoneMiddleware:
+    """Activate the signed-in user's profile timezone for the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        name = request.session.get(TIMEZONE_SESSION_KEY)
+        if name is None and request.user.is_authenticated:
+            # Sessions started before the key existed; look it up once
+            from .models import UserProfile
+            name = UserProfile.objects.filter(user=request.user).values_list('timezone', flat=True).first() or ''
+            request.session[TIMEZONE_SESSION_KEY] = name
+
+        try:
+            if name:
+                timezone.activate(zoneinfo.ZoneInfo(name))
+            else:
+                timezone.deactivate()
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            timezone.deactivate()
+        return self.get_response(request)
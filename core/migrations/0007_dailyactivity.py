@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rollups(apps, schema_editor):
+    from django.utils import timezone
+
+    DailyActivity = apps.get_model('core', 'DailyActivity')
+    ExerciseSet = apps.get_model('core', 'ExerciseSet')
+    WorkoutSession = apps.get_model('core', 'WorkoutSession')
+
+    def set_totals(expression, output_field):
+        sets = ExerciseSet.objects.filter(workout=OuterRef('pk')).order_by().values('workout')
+        return Coalesce(
+            Subquery(sets.annotate(total=expression).values('total'), output_field=output_field),
+            Value(0, output_field=output_field),
+        )
+
+    workouts = WorkoutSession.objects.order_by().annotate(
+        set_total=set_totals(Count('id'), IntegerField()),
+        seconds_total=set_totals(Sum('duration_seconds'), IntegerField()),
+        volume_total=set_totals(Sum(F('sets') * F('reps') * F('weight_kg'), output_field=FloatField()), FloatField()),
+    ).values_list('user_id', 'date', 'duration_minutes', 'set_total', 'seconds_total', 'volume_total')
+
+    # Profiles have no timezone yet, so days are counted in the server's, as 0008 defaults to
+    tz = timezone.get_default_timezone()
+    totals = {}
+    for user_id, date, duration, set_count, seconds, volume in workouts.iterator():
+        row = totals.setdefault((user_id, timezone.localtime(date, tz).date()), [0, 0, 0.0, 0])
+        # Logged duration, else the set durations rounded to whole minutes, as core.rollups counts it
+        row[0] += duration if duration else int(seconds / 60 + 0.5)
+        row[1] += set_count
+        row[2] += volume
+        row[3] += 1
+    DailyActivity.objects.bulk_create([
+        DailyActivity(user_id=user_id, day=day, minutes=minutes, set_count=set_count,
+                      volume_kg=volume, workout_count=workout_count)
+        for (user_id, day), (minutes, set_count, volume, workout_count) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_weighthistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('minutes', models.PositiveIntegerField(default=0)),
+                ('set_count', models.PositiveIntegerField(default=0)),
+                ('volume_kg', models.FloatField(default=0)),
+                ('workout_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_daily_activity_per_user_day')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:15
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_dailyactivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='timezone',
+            field=models.CharField(default=core.models.default_timezone, max_length=64, validators=[core.models.validate_timezone]),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:34
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_summaries(apps, schema_editor):
+    WorkoutSession = apps.get_model('core', 'WorkoutSession')
+    ExerciseSet = apps.get_model('core', 'ExerciseSet')
+
+    def set_totals(expression, output_field):
+        sets = ExerciseSet.objects.filter(workout=OuterRef('pk')).order_by().values('workout')
+        return Coalesce(
+            Subquery(sets.annotate(total=expression).values('total'), output_field=output_field),
+            Value(0, output_field=output_field),
+        )
+
+    WorkoutSession.objects.update(
+        set_count=set_totals(Count('id'), IntegerField()),
+        total_seconds=set_totals(Sum('duration_seconds'), IntegerField()),
+        total_volume_kg=set_totals(Sum(F('sets') * F('reps') * F('weight_kg'), output_field=FloatField()), FloatField()),
+        total_distance_km=set_totals(Sum('distance_km'), FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workoutsession',
+            name='set_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workoutsession',
+            name='total_distance_km',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workoutsession',
+            name='total_seconds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workoutsession',
+            name='total_volume_kg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
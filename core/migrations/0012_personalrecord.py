@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of the record rules in core.records as of this migration, so later
+# changes to the app code do not change what it writes
+SET_FIELDS = ('pk', 'exercise_id', 'reps', 'weight_kg', 'duration_seconds', 'distance_km', 'workout__date')
+
+
+def estimated_1rm(weight, reps):
+    if reps == 1:
+        return weight
+    epley = weight * (1 + reps / 30)
+    if reps > 10:
+        return epley
+    return (epley + weight * 36 / (37 - reps)) / 2
+
+
+def set_values(reps, weight_kg, duration_seconds, distance_km):
+    values = {}
+    if weight_kg:
+        values['max_weight'] = weight_kg
+        if reps:
+            values['est_1rm'] = estimated_1rm(weight_kg, reps)
+    if reps:
+        values['max_reps'] = reps
+    if distance_km:
+        values['max_distance'] = distance_km
+        if duration_seconds:
+            values['best_pace'] = duration_seconds / distance_km
+    return values
+
+
+def fold(rows):
+    """Best (value, set_id, achieved_at) per (exercise_id, kind); earlier rows win ties, pace is lower-is-better."""
+    best = {}
+    for set_id, exercise_id, reps, weight_kg, duration_seconds, distance_km, achieved_at in rows:
+        for kind, value in set_values(reps, weight_kg, duration_seconds, distance_km).items():
+            current = best.get((exercise_id, kind))
+            if current is None or (value < current[0] if kind == 'best_pace' else value > current[0]):
+                best[(exercise_id, kind)] = (value, set_id, achieved_at)
+    return best
+
+
+def backfill_records(apps, schema_editor):
+    ExerciseSet = apps.get_model('core', 'ExerciseSet')
+    PersonalRecord = apps.get_model('core', 'PersonalRecord')
+    WorkoutSession = apps.get_model('core', 'WorkoutSession')
+
+    for user_id in WorkoutSession.objects.order_by().values_list('user_id', flat=True).distinct():
+        sets = ExerciseSet.objects.filter(workout__user_id=user_id).order_by('workout__date', 'pk')
+        best = fold(sets.values_list(*SET_FIELDS).iterator())
+        PersonalRecord.objects.bulk_create([
+            PersonalRecord(user_id=user_id, exercise_id=exercise_id, kind=kind,
+                           value=value, exercise_set_id=set_id, achieved_at=achieved_at)
+            for (exercise_id, kind), (value, set_id, achieved_at) in best.items()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_workoutsession_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('max_weight', 'Heaviest weight'), ('est_1rm', 'Estimated 1RM'), ('max_reps', 'Most reps'), ('max_distance', 'Longest distance'), ('best_pace', 'Fastest pace')], max_length=20)),
+                ('value', models.FloatField()),
+                ('achieved_at', models.DateTimeField()),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to='core.exercise')),
+                ('exercise_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='personal_records', to='core.exerciseset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-achieved_at'],
+                'indexes': [models.Index(fields=['user', 'achieved_at'], name='record_user_achieved_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise', 'kind'), name='unique_personal_record_per_kind')],
+            },
+        ),
+        migrations.RunPython(backfill_records, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:49
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def streak_state(days):
+    """
+    Streak fields for a sorted sequence of distinct active days.
+
+    Copied from core.streaks when this migration was written; importing it
+    would let later changes to the app alter this backfill.
+    """
+    state = {'first_active_day': None, 'streak_start': None, 'last_active_day': None, 'longest_streak': 0}
+    for day in days:
+        if state['last_active_day'] is None or day > state['last_active_day'] + timedelta(days=1):
+            state['streak_start'] = day
+        state['first_active_day'] = state['first_active_day'] or day
+        state['last_active_day'] = day
+        state['longest_streak'] = max(state['longest_streak'], (day - state['streak_start']).days + 1)
+    return state
+
+
+def backfill_streaks(apps, schema_editor):
+    DailyActivity = apps.get_model('core', 'DailyActivity')
+    UserProfile = apps.get_model('core', 'UserProfile')
+
+    for user_id in UserProfile.objects.values_list('user_id', flat=True):
+        days = DailyActivity.objects.filter(user_id=user_id).order_by('day').values_list('day', flat=True)
+        UserProfile.objects.filter(user_id=user_id).update(**streak_state(days))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_personalrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='first_active_day',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='last_active_day',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='streak_start',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_streaks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_userprofile_streaks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='leaderboard_opt_in',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('weekly_minutes', 'Weekly minutes'), ('weekly_volume', 'Weekly volume'), ('record', 'Personal record')], max_length=20)),
+                ('week_start', models.DateField(blank=True, null=True)),
+                ('record_kind', models.CharField(blank=True, choices=[('max_weight', 'Heaviest weight'), ('est_1rm', 'Estimated 1RM'), ('max_reps', 'Most reps'), ('max_distance', 'Longest distance'), ('best_pace', 'Fastest pace')], max_length=20)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('exercise', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboards', to='core.exercise')),
+            ],
+            options={
+                'ordering': ['metric', '-week_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('leaderboard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.leaderboard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['position'],
+                'constraints': [models.UniqueConstraint(fields=('leaderboard', 'position'), name='unique_leaderboard_position'), models.UniqueConstraint(fields=('leaderboard', 'user'), name='unique_leaderboard_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercise',
+            name='met',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workoutsession',
+            name='kcal',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+    ]
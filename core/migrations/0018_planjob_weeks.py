@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_planjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planjob',
+            name='weeks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
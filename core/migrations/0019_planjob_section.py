@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_planjob_weeks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planjob',
+            name='instructions',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='planjob',
+            name='section',
+            field=models.CharField(blank=True, max_length=8),
+        ),
+    ]
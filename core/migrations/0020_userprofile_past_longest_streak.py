@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:55
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def past_longest_streak(days):
+    """
+    Length of the longest run of consecutive days before the last run, for sorted distinct days.
+
+    Kept here rather than imported from core.streaks, so later changes to the
+    app code do not change what this migration writes.
+    """
+    longest = 0
+    start = last = None
+    for day in days:
+        if last is None or day > last + timedelta(days=1):
+            if last is not None:
+                longest = max(longest, (last - start).days + 1)
+            start = day
+        last = day
+    return longest
+
+
+def backfill_past_streaks(apps, schema_editor):
+    DailyActivity = apps.get_model('core', 'DailyActivity')
+    UserProfile = apps.get_model('core', 'UserProfile')
+
+    for user_id in UserProfile.objects.filter(last_active_day__isnull=False).values_list('user_id', flat=True):
+        days = DailyActivity.objects.filter(user_id=user_id).order_by('day').values_list('day', flat=True)
+        UserProfile.objects.filter(user_id=user_id).update(past_longest_streak=past_longest_streak(days))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_planjob_section'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='past_longest_streak',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_past_streaks, migrations.RunPython.noop),
+    ]
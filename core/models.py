@@ -1,8 +1,21 @@
+import zoneinfo
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 
+def validate_timezone(value):
+    if value not in zoneinfo.available_timezones():
+        raise ValidationError(f"'{value}' is not a known time zone.")
+
+
+def default_timezone():
+    return settings.TIME_ZONE
+
+
 class UserProfile(models.Model):
     GENDER_CHOICES = (
         ("male", "Male"),
@@ -31,6 +44,15 @@ class UserProfile(models.Model):
     weight_kg = models.FloatField(null=True, blank=True)
     fitness_level = models.CharField(max_length=16, choices=FITNESS_LEVEL_CHOICES, blank=True)
     primary_goal_choice = models.CharField(max_length=32, choices=GOAL_CHOICES, blank=True)
+    # IANA name; workout days, charts and rollups are counted in this zone
+    timezone = models.CharField(max_length=64, default=default_timezone, validators=[validate_timezone])
+    # Streak state in local days, maintained by core.streaks
+    first_active_day = models.DateField(null=True, blank=True, editable=False)
+    streak_start = models.DateField(null=True, blank=True, editable=False)
+    last_active_day = models.DateField(null=True, blank=True, editable=False)
+    longest_streak = models.PositiveIntegerField(default=0, editable=False)
+    past_longest_streak = models.PositiveIntegerField(default=0, editable=False)
+    leaderboard_opt_in = models.BooleanField(default=False)
 
     def __str__(self) -> str:
         return f"Profile of {self.user.username}"
@@ -38,7 +60,7 @@ class UserProfile(models.Model):
 
 class Exercise(models.Model):
     """Exercise types that users can perform"""
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     category = models.CharField(max_length=50, choices=[
         ('strength', 'Strength Training'),
         ('cardio', 'Cardio'),
@@ -46,6 +68,8 @@ class Exercise(models.Model):
         ('other', 'Other')
     ], default='strength')
     description = models.TextField(blank=True)
+    # Metabolic equivalent; blank uses the category default in core.calories
+    met = models.FloatField(null=True, blank=True)
     
     def __str__(self):
         return self.name
@@ -57,13 +81,28 @@ class WorkoutSession(models.Model):
     date = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True)
     duration_minutes = models.PositiveIntegerField(null=True, blank=True)
+    # Totals over the workout's exercise sets, kept in sync by core.signals
+    set_count = models.PositiveIntegerField(default=0, editable=False)
+    total_seconds = models.PositiveIntegerField(default=0, editable=False)
+    total_volume_kg = models.FloatField(default=0, editable=False)
+    total_distance_km = models.FloatField(default=0, editable=False)
+    # MET-based energy estimate, kept in sync by core.signals; null while the user's weight is unknown
+    kcal = models.FloatField(null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='workout_user_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.date.strftime('%Y-%m-%d %H:%M')}"
 
+    @property
+    def calculated_duration(self):
+        """Minutes from the summed set durations, for workouts without a logged duration"""
+        return round(self.total_seconds / 60, 1) if self.total_seconds else None
+
 
 class ExerciseSet(models.Model):
     """Individual set within a workout"""
@@ -100,6 +139,212 @@ class WeightHistory(models.Model):
     
     class Meta:
         ordering = ['recorded_date']
+        indexes = [
+            models.Index(fields=['user', 'recorded_date'], name='weight_user_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.weight_kg}kg on {self.recorded_date}"
+
+
+class DailyActivity(models.Model):
+    """Per-user activity totals for one local day, kept in sync by core.signals"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="daily_activity")
+    day = models.DateField()
+    minutes = models.PositiveIntegerField(default=0)
+    set_count = models.PositiveIntegerField(default=0)
+    volume_kg = models.FloatField(default=0)
+    workout_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_daily_activity_per_user_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.day}: {self.minutes} min"
+
+
+class PersonalRecord(models.Model):
+    """A user's best value of one kind for one exercise, maintained by core.records"""
+    KIND_CHOICES = [
+        ('max_weight', 'Heaviest weight'),
+        ('est_1rm', 'Estimated 1RM'),
+        ('max_reps', 'Most reps'),
+        ('max_distance', 'Longest distance'),
+        ('best_pace', 'Fastest pace'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="personal_records")
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, related_name="personal_records")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Pace is stored as seconds per km, lower is better; every other kind is higher-is-better
+    value = models.FloatField()
+    exercise_set = models.ForeignKey(ExerciseSet, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name="personal_records")
+    achieved_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-achieved_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise', 'kind'], name='unique_personal_record_per_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'achieved_at'], name='record_user_achieved_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name} {self.get_kind_display()}: {self.display_value}"
+
+    @property
+    def display_value(self):
+        if self.kind == 'best_pace':
+            minutes, seconds = divmod(round(self.value), 60)
+            return f"{minutes}:{seconds:02d} /km"
+        if self.kind == 'max_reps':
+            return f"{self.value:g} reps"
+        if self.kind == 'max_distance':
+            return f"{self.value:g} km"
+        return f"{self.value:.1f} kg"
+
+
+class Leaderboard(models.Model):
+    """A ranked snapshot of opted-in users, rebuilt by core.leaderboards"""
+    METRIC_CHOICES = [
+        ('weekly_minutes', 'Weekly minutes'),
+        ('weekly_volume', 'Weekly volume'),
+        ('record', 'Personal record'),
+    ]
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    # Weekly boards cover the week from this Monday; record boards one exercise and record kind
+    week_start = models.DateField(null=True, blank=True)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name="leaderboards")
+    record_kind = models.CharField(max_length=20, choices=PersonalRecord.KIND_CHOICES, blank=True)
+    entry_count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['metric', '-week_start']
+
+    def __str__(self):
+        if self.metric == 'record':
+            return f"{self.exercise.name} - {self.get_record_kind_display()}"
+        return f"{self.get_metric_display()} - week of {self.week_start}"
+
+
+class LeaderboardEntry(models.Model):
+    """One user's place on a leaderboard snapshot"""
+    leaderboard = models.ForeignKey(Leaderboard, on_delete=models.CASCADE, related_name="entries")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    # Unique 1..n order (ties by user id), used as the keyset pagination cursor
+    position = models.PositiveIntegerField()
+    # Competition rank: tied scores share a rank and the next rank is skipped
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['leaderboard', 'position'], name='unique_leaderboard_position'),
+            models.UniqueConstraint(fields=['leaderboard', 'user'], name='unique_leaderboard_user'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} {self.user.username} on {self.leaderboard}"
+
+
+class GeneratedPlan(models.Model):
+    """A parsed AI plan, reused while its prompt inputs are unchanged (see core.plans)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="generated_plans")
+    # sha256 of the profile values and training history summary the prompt was built from
+    fingerprint = models.CharField(max_length=64)
+    plan = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'fingerprint'], name='plan_user_fingerprint_idx'),
+            models.Index(fields=['user', 'created_at'], name='plan_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Plan for {self.user.username} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def is_expired(self) -> bool:
+        return timezone.now() >= self.expires_at
+
+
+class PlanJob(models.Model):
+    """An AI plan generation run in the background (see core.jobs), polled by the planner page"""
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="plan_jobs")
+    regenerate = models.BooleanField(default=False)
+    # A week number or "diet" to rewrite only that part of the user's latest plan
+    section = models.CharField(max_length=8, blank=True)
+    instructions = models.TextField(blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued")
+    plan = models.ForeignKey(GeneratedPlan, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+    # Training weeks parsed so far from the streamed model output
+    weeks = models.JSONField(default=list, blank=True)
+    # The planner's {"error": ..., "details": ...} result when generation failed
+    error = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='planjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Plan job {self.pk} for {self.user.username} ({self.status})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+class ImportJob(models.Model):
+    """A CSV upload imported in the background, with progress for the upload page to poll"""
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    # Row errors kept on the job; failed_rows always has the full count
+    MAX_STORED_ERRORS = 200
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="import_jobs")
+    csv_file = models.FileField(upload_to="imports/")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued")
+    processed_rows = models.PositiveIntegerField(default=0)
+    failed_rows = models.PositiveIntegerField(default=0)
+    imported_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import {self.pk} by {self.user.username} ({self.status})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "failed")
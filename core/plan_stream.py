@@ -0,0 +1,70 @@
+"""
+Incremental parsing of a plan streamed from the model.
+
+The model writes one JSON object, sometimes wrapped in ```json fences or
+prose. PlanStreamParser scans the text as it arrives, tracking strings,
+nesting and object keys, and hands back every object of the
+training_plan.weeks array the moment its closing brace is read. Text outside
+the top-level object (fences, commentary) is skipped.
+"""
+import json
+
+# Array whose object items are emitted as soon as they are complete
+WEEKS_KEY = 'weeks'
+
+
+class PlanStreamParser:
+    def __init__(self):
+        self._text = []  # the top-level object so far, one entry per character
+        self._stack = []  # open containers: (bracket, key of the container, start index)
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._key = None
+        self.complete = False
+
+    def feed(self, chunk):
+        """Scan the next piece of model output; returns the week objects it completed."""
+        weeks = []
+        for char in chunk:
+            if self.complete or (not self._stack and char != '{'):
+                continue
+            index = len(self._text)
+            self._text.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = ''.join(self._text[self._string_start:index + 1])
+            elif char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char == ':':
+                self._key = json.loads(self._last_string)
+            elif char == ',':
+                self._key = None
+            elif char in '{[':
+                in_object = bool(self._stack) and self._stack[-1][0] == '{'
+                self._stack.append((char, self._key if in_object else None, index))
+                self._key = None
+            elif char in '}]':
+                bracket, _, start = self._stack.pop()
+                if bracket == '{' and self._stack and self._stack[-1][:2] == ('[', WEEKS_KEY):
+                    weeks.append(json.loads(''.join(self._text[start:index + 1])))
+                self.complete = not self._stack
+        return weeks
+
+    def result(self):
+        """The whole parsed object once the top-level object has closed."""
+        if not self.complete:
+            raise ValueError("The plan stream ended before the JSON object was complete.")
+        return json.loads(''.join(self._text))
+
+    @property
+    def text(self):
+        return ''.join(self._text)
@@ -0,0 +1,134 @@
+"""
+Stored AI plans.
+
+Generating a plan takes tens of seconds and an API call, so every parsed plan
+is saved with a fingerprint of the prompt inputs (the profile values and the
+training history summary). A request whose fingerprint matches an unexpired
+plan is answered from the store; a changed profile or history, an expired
+plan or an explicit regenerate calls the model again.
+
+When the model call fails or misses its deadline, a rule-based quick plan
+(core.quick_plan) is stored and returned in its place, unless
+FITTRACK_PLAN_FALLBACK is off. Quick plans are fingerprinted separately, so
+they never satisfy a later request for an AI plan.
+
+A single week or the diet of a stored plan can be rewritten on its own
+(regenerate_section), which costs a fraction of a whole plan.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import quick_plan
+from .ai_planner import (
+    DIET_SECTION, generate_fitness_plan_from_profile, generate_plan_section, prompt_inputs,
+    stream_fitness_plan_from_profile,
+)
+from .models import GeneratedPlan
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'FITTRACK_PLAN_TTL', 7 * 24 * 60 * 60))
+
+
+def fingerprint(profile, training_history_summary="", kind='ai'):
+    """sha256 over everything the prompt is built from, and the kind of plan when it is not an AI plan."""
+    inputs = prompt_inputs(profile, training_history_summary)
+    if kind != 'ai':
+        inputs['kind'] = kind
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def latest_plan(user):
+    """The user's most recent stored plan, expired or not, or None."""
+    return GeneratedPlan.objects.filter(user=user).first()
+
+
+def find_plan(profile, training_history_summary=""):
+    """The user's unexpired plan for the current prompt inputs, or None."""
+    return GeneratedPlan.objects.filter(
+        user_id=profile.user_id,
+        fingerprint=fingerprint(profile, training_history_summary),
+        expires_at__gt=timezone.now(),
+    ).first()
+
+
+def get_or_generate(profile, training_history_summary="", regenerate=False, on_week=None):
+    """
+    Return a plan for the profile, from the store when its inputs are unchanged.
+
+    Args:
+        profile: UserProfile the plan is for
+        training_history_summary: History block passed to the prompt
+        regenerate: Call the model even if a matching plan is stored
+        on_week: Stream the model output and call on_week(week) with each
+            training week as soon as it is complete
+
+    Returns:
+        tuple: (plan dict, GeneratedPlan or None); when generation failed
+            this is the stored quick plan, or the {"error": ...} dict and
+            None with FITTRACK_PLAN_FALLBACK off
+    """
+    if not regenerate:
+        stored = find_plan(profile, training_history_summary)
+        if stored is not None:
+            return stored.plan, stored
+
+    if on_week is not None:
+        plan = stream_fitness_plan_from_profile(profile, training_history_summary, on_week=on_week)
+    else:
+        plan = generate_fitness_plan_from_profile(profile, training_history_summary)
+    if not isinstance(plan, dict) or 'error' in plan:
+        if not getattr(settings, 'FITTRACK_PLAN_FALLBACK', True):
+            return plan, None
+        error = plan.get('error') if isinstance(plan, dict) else None
+        return quick(profile, training_history_summary,
+                     notice=f"The AI planner could not answer ({error or 'unreadable response'}), "
+                            f"so this is a quick plan built from your profile.")
+    return plan, save_plan(profile.user_id, fingerprint(profile, training_history_summary), plan)
+
+
+def quick(profile, training_history_summary="", notice=None):
+    """Build and store a rule-based plan for the profile; returns (plan dict, GeneratedPlan)."""
+    plan = quick_plan.build_plan(profile, notice=notice)
+    return plan, save_plan(profile.user_id, fingerprint(profile, training_history_summary, kind='quick'), plan)
+
+
+def merge_section(plan, section, value):
+    """A copy of `plan` with one week (by week number) or the diet replaced by `value`."""
+    merged = {**plan, 'training_plan': {**plan.get('training_plan', {})}}
+    if section == DIET_SECTION:
+        merged['diet_plan'] = value
+    else:
+        merged['training_plan']['weeks'] = [
+            value if str(week.get('week_number')) == str(section) else week
+            for week in plan['training_plan']['weeks']
+        ]
+    return merged
+
+
+def regenerate_section(stored, profile, training_history_summary="", section=DIET_SECTION, instructions=""):
+    """
+    Rewrite one week or the diet of a stored plan and save the result merged into it.
+
+    Returns:
+        tuple: (plan dict, GeneratedPlan), or ({"error": ...}, None) leaving
+            the stored plan unchanged
+    """
+    value = generate_plan_section(profile, training_history_summary, stored.plan, section, instructions)
+    if 'error' in value:
+        return value, None
+    stored.plan = merge_section(stored.plan, section, value)
+    stored.save(update_fields=['plan'])
+    return stored.plan, stored
+
+
+def save_plan(user_id, key, plan):
+    """Store a parsed plan under its fingerprint, replacing the user's expired plans."""
+    now = timezone.now()
+    GeneratedPlan.objects.filter(user_id=user_id, expires_at__lte=now).delete()
+    return GeneratedPlan.objects.create(user_id=user_id, fingerprint=key, plan=plan,
+                                        created_at=now, expires_at=now + _ttl())
@@ -0,0 +1,187 @@
+"""
+Rule-based plans, in the same JSON schema as the AI planner's.
+
+A quick plan is built in milliseconds from the profile alone: daily
+calories from the Mifflin-St Jeor BMR times an activity factor for the
+fitness level, adjusted for the goal; macros from per-goal protein and fat
+targets; and a weekly split for the fitness level filled with exercises
+from the Exercise catalog. It is offered as an explicit "quick plan" mode
+and replaces the AI plan when the model call fails or runs out of time.
+"""
+from .models import Exercise
+
+# Used when the profile leaves a value blank, as in the AI prompt
+DEFAULT_AGE = 25
+DEFAULT_HEIGHT_CM = 170
+DEFAULT_WEIGHT_KG = 70
+
+# Mifflin-St Jeor sex constants; profiles without a binary gender get the midpoint
+SEX_CONSTANTS = {'male': 5, 'female': -161}
+NEUTRAL_SEX_CONSTANT = -78
+
+ACTIVITY_FACTORS = {'beginner': 1.375, 'intermediate': 1.55, 'advanced': 1.725}
+
+# goal -> (kcal adjustment, protein g per kg, share of kcal from fat)
+GOAL_TARGETS = {
+    'fat_loss': (-500, 2.2, 0.25),
+    'muscle_gain': (300, 2.0, 0.25),
+    'endurance': (0, 1.6, 0.20),
+    'general_fitness': (0, 1.6, 0.30),
+}
+
+GOAL_REPS = {'fat_loss': '10-15', 'muscle_gain': '8-12', 'endurance': '15-20', 'general_fitness': '10-12'}
+
+GOAL_CARDIO = {
+    'fat_loss': '25 min intervals: 1 min hard, 2 min easy',
+    'muscle_gain': '20 min easy cycling or brisk walk',
+    'endurance': '45 min steady pace, able to hold a conversation',
+    'general_fitness': '30 min moderate pace',
+}
+
+# Seven days per fitness level
+SPLITS = {
+    'beginner': ['Full Body', 'Rest Day', 'Cardio', 'Full Body', 'Rest Day', 'Full Body', 'Rest Day'],
+    'intermediate': ['Upper Body', 'Lower Body', 'Rest Day', 'Cardio', 'Upper Body', 'Lower Body', 'Rest Day'],
+    'advanced': ['Upper Body Push', 'Upper Body Pull', 'Lower Body', 'Cardio', 'Upper Body', 'Lower Body', 'Rest Day'],
+}
+
+WEEK_FOCUS = ['Foundation & Form', 'Build Volume', 'Progressive Overload', 'Deload & Recovery']
+
+# Catalog names are matched to muscle groups by keyword
+GROUP_KEYWORDS = {
+    'push': ('press', 'push', 'dip', 'fly'),
+    'pull': ('pull', 'row', 'curl', 'chin'),
+    'legs': ('squat', 'lunge', 'deadlift', 'leg', 'calf', 'hip'),
+    'core': ('plank', 'sit-up', 'crunch', 'twist'),
+}
+DEFAULT_EXERCISES = {
+    'push': ['Push-up', 'Overhead Press'],
+    'pull': ['Pull-up', 'Dumbbell Row'],
+    'legs': ['Squat', 'Lunges'],
+    'core': ['Plank'],
+}
+DAY_GROUPS = {
+    'Full Body': ('legs', 'push', 'pull', 'core'),
+    'Upper Body': ('push', 'pull', 'push', 'pull'),
+    'Upper Body Push': ('push', 'push', 'push', 'core'),
+    'Upper Body Pull': ('pull', 'pull', 'pull', 'core'),
+    'Lower Body': ('legs', 'legs', 'legs', 'core'),
+}
+
+GUIDELINES = {
+    'fat_loss': 'Keep a steady 500 kcal daily deficit; do not cut further on training days.',
+    'muscle_gain': 'Eat a small surplus every day and spread protein over 4 meals.',
+    'endurance': 'Take most carbohydrates around longer cardio sessions.',
+    'general_fitness': 'Build meals around vegetables, lean protein and whole grains.',
+}
+MEALS = [
+    {'type': 'Breakfast', 'options': ['Oats with milk, berries and nuts', 'Eggs on wholegrain toast with spinach']},
+    {'type': 'Lunch', 'options': ['Chicken, rice and roasted vegetables', 'Lentil and quinoa salad with feta']},
+    {'type': 'Dinner', 'options': ['Salmon, potatoes and green beans', 'Lean beef stir-fry with noodles']},
+    {'type': 'Snacks', 'options': ['Greek yogurt with fruit', 'Hummus with carrot sticks']},
+]
+
+
+def daily_targets(profile):
+    """Calories and macros in grams for a profile."""
+    goal = profile.primary_goal_choice or 'general_fitness'
+    weight = profile.weight_kg or DEFAULT_WEIGHT_KG
+    bmr = (10 * weight + 6.25 * (profile.height_cm or DEFAULT_HEIGHT_CM) - 5 * (profile.age or DEFAULT_AGE)
+           + SEX_CONSTANTS.get(profile.gender, NEUTRAL_SEX_CONSTANT))
+    adjustment, protein_per_kg, fat_share = GOAL_TARGETS[goal]
+    kcal = round((bmr * ACTIVITY_FACTORS.get(profile.fitness_level, ACTIVITY_FACTORS['beginner']) + adjustment) / 50) * 50
+    protein = round(protein_per_kg * weight)
+    fats = round(kcal * fat_share / 9)
+    carbs = max(round((kcal - protein * 4 - fats * 9) / 4), 0)
+    return {'kcal': kcal, 'protein': protein, 'carbs': carbs, 'fats': fats}
+
+
+def _exercise_groups():
+    """Strength exercises of the catalog by muscle group, with defaults for groups it lacks."""
+    groups = {group: [] for group in GROUP_KEYWORDS}
+    for name in Exercise.objects.filter(category='strength').order_by('name').values_list('name', flat=True):
+        lowered = name.lower()
+        for group, keywords in GROUP_KEYWORDS.items():
+            if any(keyword in lowered for keyword in keywords):
+                groups[group].append(name)
+                break
+    return {group: names or DEFAULT_EXERCISES[group] for group, names in groups.items()}
+
+
+def _week(number, split, groups, goal):
+    sets = {1: 3, 2: 3, 3: 4, 4: 2}[number]
+    reps = GOAL_REPS[goal]
+    seen = {}
+    schedule = []
+    for day, kind in enumerate(split, start=1):
+        exercises = []
+        if kind in DAY_GROUPS:
+            # Repeated day types rotate through each group's exercises
+            occurrence = seen[kind] = seen.get(kind, -1) + 1
+            used = {}
+            for group in DAY_GROUPS[kind]:
+                names = groups[group]
+                index = (occurrence * 2 + used.get(group, 0)) % len(names)
+                used[group] = used.get(group, 0) + 1
+                name = names[index]
+                if any(exercise['name'] == name for exercise in exercises):
+                    continue
+                exercises.append({
+                    'name': name,
+                    'sets': str(sets),
+                    'reps': '30-60 s' if group == 'core' else reps,
+                    'notes': 'Add 2.5-5% load if every rep was clean last week' if number == 3 else '',
+                })
+        schedule.append({
+            'day': f'Day {day}',
+            'type': kind,
+            'exercises': exercises,
+            'cardio': GOAL_CARDIO[goal] if kind == 'Cardio' else None,
+        })
+    return {'week_number': number, 'focus': WEEK_FOCUS[number - 1], 'schedule': schedule}
+
+
+def build_plan(profile, notice=None):
+    """
+    A 4-week training and diet plan for a profile, without calling a model.
+
+    Args:
+        profile: UserProfile the plan is for
+        notice: Optional message shown above the plan, e.g. why the AI plan was replaced
+
+    Returns:
+        dict: training_plan and diet_plan as generate_fitness_plan_from_profile
+            returns them, with "source": "quick"
+    """
+    goal = profile.primary_goal_choice or 'general_fitness'
+    level = profile.fitness_level or 'beginner'
+    split = SPLITS[level]
+    groups = _exercise_groups()
+    targets = daily_targets(profile)
+    training_days = sum(kind != 'Rest Day' for kind in split)
+
+    plan = {
+        'source': 'quick',
+        'training_plan': {
+            'summary': (f"A {training_days}-day {level} split for {goal.replace('_', ' ')}: three building weeks "
+                        f"with rising volume, then a lighter week to recover."),
+            'weeks': [_week(number, split, groups, goal) for number in range(1, 5)],
+        },
+        'diet_plan': {
+            'calories': f"{targets['kcal']} kcal",
+            'macros': {
+                'protein': f"{targets['protein']} g",
+                'carbs': f"{targets['carbs']} g",
+                'fats': f"{targets['fats']} g",
+            },
+            'guidelines': [
+                GUIDELINES[goal],
+                f"Get {targets['protein']} g of protein a day, about {round(targets['protein'] / 4)} g per meal.",
+                'Drink 30-35 ml of water per kg of body weight, more on training days.',
+            ],
+            'meals': MEALS,
+        },
+    }
+    if notice:
+        plan['notice'] = notice
+    return plan
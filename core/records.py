@@ -0,0 +1,119 @@
+"""
+Personal records.
+
+Each PersonalRecord row is a user's best value of one kind for one exercise.
+New sets are compared with the stored bests and only improvements are
+written, so detecting a record costs one indexed lookup per batch of sets.
+Deleting a set, or editing the set that holds a record, can lower a best;
+those rebuild the records of the affected exercises from their sets.
+"""
+from .models import ExerciseSet, PersonalRecord
+
+# Kinds where the smaller value is the better one
+LOWER_IS_BETTER = {'best_pace'}
+
+_SET_FIELDS = ('pk', 'exercise_id', 'reps', 'weight_kg', 'duration_seconds', 'distance_km', 'workout__date')
+
+
+def estimated_1rm(weight, reps):
+    """
+    Estimated one-rep max from `reps` repetitions at `weight`.
+
+    Up to 10 reps, where both formulas hold up, this is the mean of the Epley
+    and Brzycki estimates; above that Epley alone, as Brzycki diverges when
+    reps approach 37.
+    """
+    if reps == 1:
+        return weight
+    epley = weight * (1 + reps / 30)
+    if reps > 10:
+        return epley
+    brzycki = weight * 36 / (37 - reps)
+    return (epley + brzycki) / 2
+
+
+def set_values(reps, weight_kg, duration_seconds, distance_km):
+    """Record candidates of one set, as {kind: value}."""
+    values = {}
+    if weight_kg:
+        values['max_weight'] = weight_kg
+        if reps:
+            values['est_1rm'] = estimated_1rm(weight_kg, reps)
+    if reps:
+        values['max_reps'] = reps
+    if distance_km:
+        values['max_distance'] = distance_km
+        if duration_seconds:
+            values['best_pace'] = duration_seconds / distance_km
+    return values
+
+
+def _better(kind, value, than):
+    return value < than if kind in LOWER_IS_BETTER else value > than
+
+
+def _fold(rows, best=None):
+    """Fold set rows into {(exercise_id, kind): (value, set_id, achieved_at)}; earlier rows win ties."""
+    best = {} if best is None else best
+    for set_id, exercise_id, reps, weight_kg, duration_seconds, distance_km, achieved_at in rows:
+        for kind, value in set_values(reps, weight_kg, duration_seconds, distance_km).items():
+            current = best.get((exercise_id, kind))
+            if current is None or _better(kind, value, current[0]):
+                best[(exercise_id, kind)] = (value, set_id, achieved_at)
+    return best
+
+
+def _records(user_id, best):
+    return [
+        PersonalRecord(user_id=user_id, exercise_id=exercise_id, kind=kind,
+                       value=value, exercise_set_id=set_id, achieved_at=achieved_at)
+        for (exercise_id, kind), (value, set_id, achieved_at) in best.items()
+    ]
+
+
+def record_sets(user_id, exercise_sets):
+    """
+    Compare new sets with a user's records and store the ones they beat.
+
+    Args:
+        user_id: Owner of the sets
+        exercise_sets: Saved ExerciseSet instances with their workout loaded
+
+    Returns:
+        list: The PersonalRecord rows that were set or improved
+    """
+    exercise_sets = [s for s in exercise_sets if s.pk is not None]
+    if not exercise_sets:
+        return []
+    existing = PersonalRecord.objects.filter(
+        user_id=user_id, exercise_id__in={s.exercise_id for s in exercise_sets},
+    ).order_by().values_list('exercise_id', 'kind', 'value', 'exercise_set_id', 'achieved_at')
+    best = {(exercise_id, kind): (value, set_id, at) for exercise_id, kind, value, set_id, at in existing}
+    previous = dict(best)
+
+    rows = sorted(
+        ((s.pk, s.exercise_id, s.reps, s.weight_kg, s.duration_seconds, s.distance_km, s.workout.date)
+         for s in exercise_sets),
+        key=lambda row: (row[-1], row[0]),
+    )
+    _fold(rows, best)
+    improved = {key: value for key, value in best.items() if previous.get(key) != value}
+    return PersonalRecord.objects.bulk_create(
+        _records(user_id, improved),
+        update_conflicts=True,
+        unique_fields=['user', 'exercise', 'kind'],
+        update_fields=['value', 'exercise_set', 'achieved_at'],
+    )
+
+
+def rebuild_records(user_id, exercise_ids=None):
+    """Recompute a user's records for the given (default: all) exercises from their sets."""
+    sets = ExerciseSet.objects.filter(workout__user_id=user_id)
+    records = PersonalRecord.objects.filter(user_id=user_id)
+    if exercise_ids is not None:
+        sets = sets.filter(exercise_id__in=exercise_ids)
+        records = records.filter(exercise_id__in=exercise_ids)
+
+    best = _fold(sets.order_by('workout__date', 'pk').values_list(*_SET_FIELDS).iterator())
+    records.delete()
+    return PersonalRecord.objects.bulk_create(_records(user_id, best))
@@ -0,0 +1,192 @@
+"""
+Derived workout data.
+
+Each WorkoutSession carries totals over its exercise sets (set count,
+seconds, volume, distance), and each DailyActivity row holds one user's
+totals for one local day, summed from those workout totals. Both are
+refreshed from the source tables whenever a workout or exercise set changes,
+so history pages never join the sets and dashboard charts only read one row
+per day shown.
+"""
+import zoneinfo
+from datetime import datetime, time, timedelta
+
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round, TruncDate
+from django.utils import timezone
+
+from .models import DailyActivity, ExerciseSet, UserProfile, WorkoutSession
+
+
+def zone(name):
+    """Resolve a profile timezone name, falling back to the server default."""
+    try:
+        return zoneinfo.ZoneInfo(name) if name else timezone.get_default_timezone()
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return timezone.get_default_timezone()
+
+
+def user_timezone(user_id):
+    """Return the tzinfo a user's local days are counted in."""
+    return zone(UserProfile.objects.filter(user_id=user_id).values_list('timezone', flat=True).first())
+
+
+def local_day(value, tz):
+    """Return the local calendar day a workout timestamp belongs to."""
+    return timezone.localtime(value, tz).date()
+
+
+def day_bounds(day, tz):
+    """Return the aware [start, end) datetimes covering one local day."""
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def _set_totals(expression, output_field):
+    """Per-workout aggregate over its exercise sets, as a correlated subquery."""
+    sets = ExerciseSet.objects.filter(workout=OuterRef('pk')).order_by().values('workout')
+    return Coalesce(
+        Subquery(sets.annotate(total=expression).values('total'), output_field=output_field),
+        Value(0, output_field=output_field),
+    )
+
+
+def refresh_workout_summaries(workout_ids=None):
+    """Recompute the exercise set totals stored on the given (default: all) workouts, in one UPDATE."""
+    workouts = WorkoutSession.objects.all()
+    if workout_ids is not None:
+        workouts = workouts.filter(pk__in=workout_ids)
+    return workouts.update(
+        set_count=_set_totals(Count('id'), IntegerField()),
+        total_seconds=_set_totals(Sum('duration_seconds'), IntegerField()),
+        total_volume_kg=_set_totals(Sum(F('sets') * F('reps') * F('weight_kg'), output_field=FloatField()), FloatField()),
+        total_distance_km=_set_totals(Sum('distance_km'), FloatField()),
+    )
+
+
+def daily_totals(workouts, tz):
+    """
+    Group workouts into per-user, per-local-day totals in the database.
+
+    A workout counts for its logged duration, else for its summed set durations
+    rounded to whole minutes. Days are cut with a tz-aware TruncDate, so no
+    timestamp is converted in Python.
+
+    Returns:
+        QuerySet: dicts with user_id, day, minutes, set_count, volume_kg and workout_count
+    """
+    minutes = Case(
+        When(duration_minutes__gt=0, then=F('duration_minutes')),
+        default=Cast(Round(F('total_seconds') / 60.0), IntegerField()),
+        output_field=IntegerField(),
+    )
+    return (
+        workouts.order_by()
+        .annotate(day=TruncDate('date', tzinfo=tz))
+        .values('user_id', 'day')
+        .annotate(
+            minutes=Sum(minutes),
+            set_count=Sum('set_count'),
+            volume_kg=Sum('total_volume_kg'),
+            workout_count=Count('id'),
+        )
+        .order_by('user_id', 'day')
+    )
+
+
+def refresh_day(user_id, day, tz=None):
+    """Recompute the rollup row for one user and local day from the source tables."""
+    tz = tz or user_timezone(user_id)
+    start, end = day_bounds(day, tz)
+    totals = daily_totals(WorkoutSession.objects.filter(user_id=user_id, date__gte=start, date__lt=end), tz).first()
+
+    if totals is None:
+        DailyActivity.objects.filter(user_id=user_id, day=day).delete()
+        return None
+    fields = {name: totals[name] for name in ('minutes', 'set_count', 'volume_kg', 'workout_count')}
+    rollup, _ = DailyActivity.objects.update_or_create(user_id=user_id, day=day, defaults=fields)
+    return rollup
+
+
+def _write_rollups(rows, batch_size=1000):
+    """Insert rollup rows from a daily_totals queryset without materialising it."""
+    written = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(DailyActivity(**row))
+        if len(batch) >= batch_size:
+            written += len(DailyActivity.objects.bulk_create(batch))
+            batch = []
+    written += len(DailyActivity.objects.bulk_create(batch))
+    return written
+
+
+def refresh_range(user_id, first_day, last_day, tz=None):
+    """Recompute every rollup row for one user between two local days, inclusive."""
+    tz = tz or user_timezone(user_id)
+    start, _ = day_bounds(first_day, tz)
+    _, end = day_bounds(last_day, tz)
+    rows = daily_totals(WorkoutSession.objects.filter(user_id=user_id, date__gte=start, date__lt=end), tz)
+
+    DailyActivity.objects.filter(user_id=user_id, day__range=(first_day, last_day)).delete()
+    _write_rollups(rows)
+
+
+def refresh_days(user_id, days, tz=None):
+    """Refresh several local days for one user; many days are rebuilt as one range. Returns the days."""
+    tz = tz or user_timezone(user_id)
+    days = sorted(set(days))
+    if len(days) > 3:
+        refresh_range(user_id, days[0], days[-1], tz)
+        return days
+    for day in days:
+        refresh_day(user_id, day, tz)
+    return days
+
+
+def refresh_at(user_id, *timestamps):
+    """Refresh the local days containing the given workout timestamps and return those days."""
+    tz = user_timezone(user_id)
+    return refresh_days(user_id, [local_day(value, tz) for value in timestamps if value is not None], tz)
+
+
+def rebuild_rollups(user_ids=None, batch_size=1000):
+    """
+    Drop and rebuild rollup rows from scratch.
+
+    Users are grouped by profile timezone so each group is aggregated with a
+    single grouped query.
+
+    Args:
+        user_ids: Optional iterable of user ids to limit the rebuild to
+        batch_size: Rows per bulk insert
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    workouts = WorkoutSession.objects.all()
+    rollups = DailyActivity.objects.all()
+    if user_ids is not None:
+        workouts = workouts.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    user_zones = dict(UserProfile.objects.values_list('user_id', 'timezone'))
+    zones = {}
+    for user_id in workouts.order_by().values_list('user_id', flat=True).distinct():
+        zones.setdefault(user_zones.get(user_id) or '', []).append(user_id)
+
+    rollups.delete()
+    written = 0
+    for name, ids in zones.items():
+        for i in range(0, len(ids), 500):
+            rows = daily_totals(workouts.filter(user_id__in=ids[i:i + 500]), zone(name))
+            written += _write_rollups(rows, batch_size)
+    return written
+
+
+def minutes_by_day(user, start, end):
+    """Map each local day in [start, end] with activity to its total minutes."""
+    return dict(
+        DailyActivity.objects.filter(user=user, day__range=(start, end)).values_list('day', 'minutes')
+    )
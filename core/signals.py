@@ -0,0 +1,240 @@
+"""
+Write hooks that keep derived tables and per-user cache versions in sync
+with workout data.
+
+Bulk writers (e.g. the CSV importer) wrap their work in ``muted()`` and call
+``sync_bulk_changes`` once at the end instead of paying per-row hook costs.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import calories, leaderboards, records, rollups, streaks
+from .caching import bump_data_version
+from .middleware import TIMEZONE_SESSION_KEY
+from .models import Exercise, ExerciseSet, PersonalRecord, UserProfile, WeightHistory, WorkoutSession
+
+_state = threading.local()
+
+
+@contextmanager
+def muted():
+    """Suspend the per-row hooks below for the current thread."""
+    previous = getattr(_state, 'muted', False)
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def is_muted():
+    return getattr(_state, 'muted', False)
+
+
+def _deleted_directly(origin, model):
+    """True unless the row went away in a cascade started from another model."""
+    if origin is None:
+        return True
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(origin_model, model)
+
+
+def _bump_on_commit(user_id):
+    """Bump the user's cache version once the write commits, not while it can still roll back."""
+    transaction.on_commit(lambda: bump_data_version(user_id))
+
+
+def sync_bulk_changes(user_id, workout_dates):
+    """Bring derived tables up to date after a bulk write that ran muted."""
+    streaks.update_days(user_id, rollups.refresh_at(user_id, *workout_dates))
+    _bump_on_commit(user_id)
+
+
+@receiver(pre_save, sender=WorkoutSession)
+def remember_previous_date(sender, instance, raw=False, **kwargs):
+    instance._previous_date = None
+    if raw or is_muted() or instance.pk is None:
+        return
+    instance._previous_date = WorkoutSession.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=WorkoutSession)
+def workout_saved(sender, instance, raw=False, **kwargs):
+    if raw or is_muted():
+        return
+    previous_date = getattr(instance, '_previous_date', None)
+    if previous_date is not None and previous_date != instance.date:
+        PersonalRecord.objects.filter(exercise_set__workout=instance).update(achieved_at=instance.date)
+    # save() writes the set totals too, which are stale if the instance was loaded before its sets changed
+    rollups.refresh_workout_summaries([instance.pk])
+    instance.kcal = calories.refresh([instance.pk]).get(instance.pk)
+    streaks.update_days(instance.user_id, rollups.refresh_at(instance.user_id, instance.date, previous_date))
+    _bump_on_commit(instance.user_id)
+
+
+@receiver(pre_delete, sender=WorkoutSession)
+def remember_workout_exercises(sender, instance, origin=None, **kwargs):
+    instance._exercise_ids = []
+    if is_muted() or not _deleted_directly(origin, WorkoutSession):
+        return
+    instance._exercise_ids = list(instance.exercise_sets.values_list('exercise_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=WorkoutSession)
+def workout_deleted(sender, instance, origin=None, **kwargs):
+    # Rollup rows and records of a deleted user go away in the same cascade
+    if is_muted() or not _deleted_directly(origin, WorkoutSession):
+        return
+    if getattr(instance, '_exercise_ids', None):
+        records.rebuild_records(instance.user_id, instance._exercise_ids)
+    streaks.update_days(instance.user_id, rollups.refresh_at(instance.user_id, instance.date))
+    _bump_on_commit(instance.user_id)
+
+
+@receiver(pre_save, sender=ExerciseSet)
+def remember_previous_workout(sender, instance, raw=False, **kwargs):
+    instance._previous_workout = None
+    if raw or is_muted() or instance.pk is None:
+        return
+    instance._previous_workout = ExerciseSet.objects.filter(pk=instance.pk).values_list(
+        'workout_id', 'workout__user_id', 'workout__date',
+    ).first()
+
+
+@receiver(post_save, sender=ExerciseSet)
+def exercise_set_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw or is_muted():
+        return
+    # A set moved to another workout leaves the totals of the one it came from stale too
+    previous = getattr(instance, '_previous_workout', None)
+    moved_from = previous if previous is not None and previous[0] != instance.workout_id else None
+    workout_ids = [instance.workout_id] + ([moved_from[0]] if moved_from else [])
+    rollups.refresh_workout_summaries(workout_ids)
+    calories.refresh(workout_ids)
+    workout = instance.workout
+    # An edit can lower the best it holds, so those exercises are recomputed instead
+    held = set() if created else set(
+        PersonalRecord.objects.filter(exercise_set=instance).values_list('exercise_id', flat=True)
+    )
+    if held:
+        records.rebuild_records(workout.user_id, held | {instance.exercise_id})
+    else:
+        records.record_sets(workout.user_id, [instance])
+    previous_date = None
+    if moved_from:
+        _, previous_user_id, previous_date = moved_from
+        if previous_user_id != workout.user_id:
+            records.rebuild_records(previous_user_id, [instance.exercise_id])
+            rollups.refresh_at(previous_user_id, previous_date)
+            _bump_on_commit(previous_user_id)
+            previous_date = None
+    rollups.refresh_at(workout.user_id, workout.date, previous_date)
+    _bump_on_commit(workout.user_id)
+
+
+@receiver(post_delete, sender=ExerciseSet)
+def exercise_set_deleted(sender, instance, origin=None, **kwargs):
+    # Sets removed by a workout cascade are covered by workout_deleted
+    if is_muted() or not _deleted_directly(origin, ExerciseSet):
+        return
+    workout = WorkoutSession.objects.filter(pk=instance.workout_id).values_list('user_id', 'date').first()
+    if workout:
+        rollups.refresh_workout_summaries([instance.workout_id])
+        calories.refresh([instance.workout_id])
+        records.rebuild_records(workout[0], [instance.exercise_id])
+        rollups.refresh_at(*workout)
+        _bump_on_commit(workout[0])
+
+
+@receiver(pre_delete, sender=Exercise)
+def remember_exercise_workouts(sender, instance, **kwargs):
+    instance._workouts = []
+    if is_muted():
+        return
+    instance._workouts = list(
+        ExerciseSet.objects.filter(exercise=instance).order_by()
+        .values_list('workout_id', 'workout__user_id', 'workout__date').distinct()
+    )
+
+
+@receiver(post_delete, sender=Exercise)
+def exercise_deleted(sender, instance, **kwargs):
+    # Its sets and records went away in the cascade, which exercise_set_deleted leaves to this hook
+    workouts = getattr(instance, '_workouts', None)
+    if is_muted() or not workouts:
+        return
+    workout_ids = {workout_id for workout_id, _, _ in workouts}
+    rollups.refresh_workout_summaries(workout_ids)
+    calories.refresh(workout_ids)
+    dates = {}
+    for _, user_id, workout_date in workouts:
+        dates.setdefault(user_id, []).append(workout_date)
+    for user_id, workout_dates in dates.items():
+        rollups.refresh_at(user_id, *workout_dates)
+        _bump_on_commit(user_id)
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_previous_settings(sender, instance, raw=False, **kwargs):
+    instance._previous_timezone = None
+    instance._previous_opt_in = False
+    instance._previous_weight = None
+    if raw or instance.pk is None:
+        return
+    previous = UserProfile.objects.filter(pk=instance.pk).values_list(
+        'timezone', 'leaderboard_opt_in', 'weight_kg',
+    ).first()
+    if previous:
+        instance._previous_timezone, instance._previous_opt_in, instance._previous_weight = previous
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw or is_muted():
+        return
+    # Local days move with the timezone, so the user's rollups and streaks are rebuilt
+    previous = getattr(instance, '_previous_timezone', None)
+    if previous is not None and previous != instance.timezone:
+        rollups.rebuild_rollups([instance.user_id])
+    if created or (previous is not None and previous != instance.timezone):
+        streaks.rebuild_streaks([instance.user_id])
+        instance.refresh_from_db(fields=streaks.FIELDS)
+    # Opting out takes effect at once rather than at the next leaderboard refresh
+    if getattr(instance, '_previous_opt_in', False) and not instance.leaderboard_opt_in:
+        leaderboards.withdraw(instance.user_id)
+    # The profile weight only feeds energy estimates of users without weight entries
+    if (instance.weight_kg != getattr(instance, '_previous_weight', None)
+            and not WeightHistory.objects.filter(user_id=instance.user_id).exists()):
+        calories.store(WorkoutSession.objects.filter(user_id=instance.user_id))
+
+
+@receiver(post_save, sender=WeightHistory)
+@receiver(post_delete, sender=WeightHistory)
+def weight_changed(sender, instance, raw=False, **kwargs):
+    if raw or is_muted():
+        return
+    calories.refresh_near_weight(instance.user_id, instance.recorded_date)
+
+
+@receiver(post_save, sender=WeightHistory)
+@receiver(post_delete, sender=WeightHistory)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_data_changed(sender, instance, raw=False, **kwargs):
+    if raw or is_muted():
+        return
+    _bump_on_commit(instance.user_id)
+
+
+@receiver(user_logged_in)
+def remember_timezone_in_session(sender, request, user, **kwargs):
+    if request is None or not hasattr(request, 'session'):
+        return
+    name = UserProfile.objects.filter(user=user).values_list('timezone', flat=True).first()
+    request.session[TIMEZONE_SESSION_KEY] = name or ''
@@ -0,0 +1,214 @@
+"""
+Workout streaks.
+
+A streak is a run of consecutive local days with at least one workout, read
+from the daily rollups. Each profile stores its first active day, the
+current run (streak_start to last_active_day), the length of the longest
+run, and the length of the longest run that ended before the current one,
+so the dashboard gets every consistency metric from the profile row.
+
+Adding or removing a workout day updates that state in constant time or by
+walking along the runs next to it. Keeping the past best apart from the
+current streak means breaking the current streak, usually the longest one,
+never needs the rest of the history. Only a change to the longest past run
+itself (a day removed from it, or it joining the current streak) leaves the
+past best unknown and re-reads all active days.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import Max, Min
+
+from .models import DailyActivity, UserProfile
+
+FIELDS = ('first_active_day', 'streak_start', 'last_active_day', 'longest_streak', 'past_longest_streak')
+
+# Days read per query while walking along a run
+WINDOW = 32
+
+ONE_DAY = timedelta(days=1)
+
+
+def streak_state(days):
+    """Streak fields for a sorted sequence of distinct active days."""
+    state = dict.fromkeys(FIELDS)
+    state['longest_streak'] = state['past_longest_streak'] = 0
+    for day in days:
+        if state['last_active_day'] is None or day > state['last_active_day'] + ONE_DAY:
+            _end_streak(state)
+            state['streak_start'] = day
+        state['first_active_day'] = state['first_active_day'] or day
+        state['last_active_day'] = day
+        state['longest_streak'] = max(state['longest_streak'], (day - state['streak_start']).days + 1)
+    return state
+
+
+def _end_streak(state):
+    """Count the current streak as a past run, before a later day starts a new one."""
+    if state['last_active_day'] is not None:
+        state['past_longest_streak'] = max(state['past_longest_streak'],
+                                           _length(state['streak_start'], state['last_active_day']))
+
+
+def _with_longest(state):
+    state['longest_streak'] = max(state['past_longest_streak'],
+                                  _length(state['streak_start'], state['last_active_day']))
+    return state
+
+
+def _active_days(user_id):
+    return DailyActivity.objects.filter(user_id=user_id)
+
+
+def _run_edge(user_id, day, step):
+    """The last active day reached from an active `day` without a gap, walking by `step`."""
+    while True:
+        bounds = sorted([day + step, day + WINDOW * step])
+        days = set(_active_days(user_id).filter(day__range=bounds).values_list('day', flat=True))
+        for _ in range(WINDOW):
+            if day + step not in days:
+                return day
+            day += step
+
+
+def _run(user_id, day):
+    """First and last day of the run of active days around `day`."""
+    return _run_edge(user_id, day, -ONE_DAY), _run_edge(user_id, day, ONE_DAY)
+
+
+def _length(first, last):
+    return (last - first).days + 1
+
+
+def _added(user_id, state, day):
+    if state['last_active_day'] is None:
+        return streak_state([day])
+    state['first_active_day'] = min(state['first_active_day'], day)
+    if day > state['last_active_day']:
+        if day > state['last_active_day'] + ONE_DAY:
+            _end_streak(state)
+            state['streak_start'] = day
+        state['last_active_day'] = day
+    elif day < state['streak_start']:
+        # An older day only matters for the run it closes a gap in
+        first, last = _run(user_id, day)
+        if last >= state['streak_start'] - ONE_DAY:
+            # The past run before the gap joins the current streak
+            if first < day and _length(first, day - ONE_DAY) >= state['past_longest_streak']:
+                return rebuild_state(user_id)
+            state['streak_start'] = first
+        else:
+            state['past_longest_streak'] = max(state['past_longest_streak'], _length(first, last))
+    return _with_longest(state)
+
+
+def _removed(user_id, state, day):
+    if state['last_active_day'] is None or not state['first_active_day'] <= day <= state['last_active_day']:
+        return state
+    if day < state['streak_start']:
+        before = _active_days(user_id).filter(day=day - ONE_DAY).exists()
+        after = _active_days(user_id).filter(day=day + ONE_DAY).exists()
+        run = (_run_edge(user_id, day - ONE_DAY, -ONE_DAY) if before else day,
+               _run_edge(user_id, day + ONE_DAY, ONE_DAY) if after else day)
+        if _length(*run) >= state['past_longest_streak']:
+            # The broken run may have been the only past one that long
+            return rebuild_state(user_id)
+    if day == state['first_active_day']:
+        state['first_active_day'] = _active_days(user_id).aggregate(first=Min('day'))['first']
+    if day < state['streak_start']:
+        return state
+
+    if day < state['last_active_day']:
+        # The days before the gap become a past run
+        if day > state['streak_start']:
+            state['past_longest_streak'] = max(state['past_longest_streak'],
+                                               _length(state['streak_start'], day - ONE_DAY))
+        state['streak_start'] = day + ONE_DAY
+        return _with_longest(state)
+    last = _active_days(user_id).filter(day__lt=day).aggregate(last=Max('day'))['last']
+    if last is None:
+        return streak_state([])
+    if last < state['streak_start']:
+        # The streak was this one day; the run before it becomes current
+        start = _run_edge(user_id, last, -ONE_DAY)
+        if _length(start, last) >= state['past_longest_streak']:
+            return rebuild_state(user_id)
+        state['streak_start'] = start
+    state['last_active_day'] = last
+    return _with_longest(state)
+
+
+def rebuild_state(user_id):
+    """Streak fields for one user, read from all of their active days."""
+    return streak_state(_active_days(user_id).order_by('day').values_list('day', flat=True))
+
+
+def update_days(user_id, days):
+    """
+    Bring a user's streak state up to date after workouts on `days` changed.
+
+    Args:
+        user_id: Owner of the workouts
+        days: Local days whose rollups were just refreshed
+
+    Returns:
+        dict: The stored streak fields, or None if the user has no profile
+    """
+    stored = UserProfile.objects.filter(user_id=user_id).values(*FIELDS).first()
+    if stored is None:
+        return None
+    days = sorted(set(days))
+    if len(days) > WINDOW:
+        # e.g. an import; one read of the active days beats walking runs day by day
+        state = rebuild_state(user_id)
+    else:
+        state = dict(stored)
+        active = set(_active_days(user_id).filter(day__in=days).values_list('day', flat=True))
+        for day in days:
+            state = _added(user_id, state, day) if day in active else _removed(user_id, state, day)
+    if state != stored:
+        UserProfile.objects.filter(user_id=user_id).update(**state)
+    return state
+
+
+def rebuild_streaks(user_ids=None):
+    """Recompute the stored streak state of the given (default: all) users from their rollups."""
+    profiles = UserProfile.objects.all()
+    rollups = DailyActivity.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    states = {
+        user_id: streak_state(day for _, day in rows)
+        for user_id, rows in groupby(rollups.order_by('user_id', 'day').values_list('user_id', 'day').iterator(),
+                                     key=lambda row: row[0])
+    }
+    empty = streak_state([])
+    updated = 0
+    for user_id in profiles.values_list('user_id', flat=True):
+        updated += UserProfile.objects.filter(user_id=user_id).update(**states.get(user_id, empty))
+    return updated
+
+
+def summary(profile, today, total_workouts):
+    """
+    Consistency metrics from a profile's stored streak state.
+
+    The current streak still counts when the last workout was yesterday, as
+    today may not be trained yet.
+
+    Returns:
+        dict: current_streak, longest_streak, workouts_per_week and
+            days_since_last_workout (None without workouts)
+    """
+    last = profile.last_active_day
+    if last is None:
+        return {'current_streak': 0, 'longest_streak': 0, 'workouts_per_week': 0, 'days_since_last_workout': None}
+    weeks = max(_length(profile.first_active_day, max(today, last)) / 7, 1)
+    return {
+        'current_streak': _length(profile.streak_start, last) if last >= today - ONE_DAY else 0,
+        'longest_streak': profile.longest_streak,
+        'workouts_per_week': round(total_workouts / weeks, 1),
+        'days_since_last_workout': max((today - last).days, 0),
+    }
@@ -1,3 +1,1229 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import random
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+import unittest.mock
+import zoneinfo
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files import File
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analytics, calories, charts, exporter, history, jobs, leaderboards, llm, plans, quick_plan, streaks, views,
+)
+from .ai_planner import generate_fitness_plan_from_profile, stream_fitness_plan_from_profile
+from .caching import cache_stats, data_version, reset_cache_stats
+from .importer import decode_lines, import_file
+from .plan_stream import PlanStreamParser
+from .records import estimated_1rm
+from .rollups import daily_totals
+from .models import (
+    DailyActivity, Exercise, ExerciseSet, GeneratedPlan, ImportJob, Leaderboard, LeaderboardEntry, PersonalRecord,
+    PlanJob, UserProfile, WeightHistory, WorkoutSession,
+)
+
+
+def create_history(user, workouts, sets_per_workout=3):
+    """Create `workouts` sessions for `user`, one per day, each with a few timed sets."""
+    exercise = Exercise.objects.create(name='Test Squat', category='strength')
+    now = timezone.now()
+    for i in range(workouts):
+        workout = WorkoutSession.objects.create(
+            user=user,
+            date=now - timedelta(days=i),
+            duration_minutes=None if i % 2 else 45,
+        )
+        for _ in range(sets_per_workout):
+            ExerciseSet.objects.create(
+                workout=workout, exercise=exercise, sets=3, reps=8, weight_kg=60, duration_seconds=90,
+            )
+
+
+class DashboardQueryCountTests(TestCase):
+    # Session + user lookup, recent workouts, rollup totals, rollup chart window,
+    # profile, weight history and personal records
+    EXPECTED_QUERIES = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def assert_dashboard_queries(self):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_is_constant_in_history_size(self):
+        create_history(self.user, workouts=3)
+        self.assert_dashboard_queries()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_history(self.user, workouts=25, sets_per_workout=5)
+            WeightHistory.objects.create(user=self.user, weight_kg=80)
+        response = self.assert_dashboard_queries()
+
+        self.assertEqual(response.context['total_workouts'], 28)
+        self.assertEqual(response.context['total_exercises'], 3 * 3 + 25 * 5)
+        self.assertEqual(len(response.context['recent_workouts']), 10)
+
+    def test_recent_workouts_are_annotated(self):
+        create_history(self.user, workouts=2, sets_per_workout=4)
+        response = self.assert_dashboard_queries()
+
+        latest, previous = response.context['recent_workouts']
+        self.assertEqual(latest.set_count, 4)
+        self.assertEqual(latest.duration_minutes, 45)
+        # 4 sets x 90 seconds, no logged duration
+        self.assertEqual(previous.calculated_duration, 6.0)
+
+
+class DashboardCacheTests(TestCase):
+    # Session + user lookup, recent workouts and profile; stats come from the cache
+    CACHED_QUERIES = 4
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        cache.clear()
+        reset_cache_stats()
+
+    def test_repeat_view_is_served_from_cache(self):
+        create_history(self.user, workouts=3)
+        self.client.get(reverse('dashboard'))
+
+        with self.assertNumQueries(self.CACHED_QUERIES):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_workouts'], 3)
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_writes_invalidate_cached_stats(self):
+        create_history(self.user, workouts=3)
+        self.client.get(reverse('dashboard'))
+
+        workout = WorkoutSession.objects.filter(user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseSet.objects.filter(workout=workout).first().delete()
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_exercises'], 8)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            workout.delete()
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_workouts'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            WeightHistory.objects.create(user=self.user, weight_kg=72.5)
+        self.assertEqual(self.client.get(reverse('dashboard')).context['weight_values'], '[72.5]')
+        self.assertEqual(cache_stats()['hits'], 0)
+
+    def test_version_is_bumped_only_when_the_write_commits(self):
+        version = data_version(self.user.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_history(self.user, workouts=1)
+            self.assertEqual(data_version(self.user.id), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(data_version(self.user.id), version)
+
+        version = data_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                create_history(self.user, workouts=1)
+                raise RuntimeError
+        self.assertEqual(data_version(self.user.id), version)
+
+
+class ChartDataTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_activity_is_bucketed_by_week(self):
+        create_history(self.user, workouts=14)
+        response = self.client.get(reverse('chart_data', args=['activity']), {'range': 'month', 'bucket': 'week'})
+        data = response.json()
+
+        self.assertEqual(data['bucket'], 'week')
+        self.assertTrue(all(date.fromisoformat(label).weekday() == 0 for label in data['labels']))
+        self.assertEqual(sum(data['values']), sum(self.client.get(
+            reverse('chart_data', args=['activity']), {'range': 'month', 'bucket': 'day'}
+        ).json()['values']))
+
+    def test_weight_series_respects_point_budget(self):
+        for i in range(500):
+            WeightHistory.objects.create(user=self.user, weight_kg=80 + (i % 7) * 0.3)
+        # recorded_date is auto_now_add, so backdate the rows after creating them
+        for i, record in enumerate(WeightHistory.objects.filter(user=self.user)):
+            record.recorded_date = date(2020, 1, 1) + timedelta(days=i)
+            record.save()
+
+        data = self.client.get(
+            reverse('chart_data', args=['weight']), {'range': 'all', 'bucket': 'day', 'points': 50}
+        ).json()
+        self.assertEqual(len(data['values']), 50)
+        self.assertEqual(data['labels'][0], '2020-01-01')
+
+    def test_invalid_parameters(self):
+        url = reverse('chart_data', args=['activity'])
+        self.assertEqual(self.client.get(url, {'range': 'decade'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'range': 'custom', 'start': '2025-02-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bucket': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('chart_data', args=['steps'])).status_code, 404)
+
+    def test_ranges_are_bounded(self):
+        url = reverse('chart_data', args=['activity'])
+        too_long = self.client.get(url, {'range': 'custom', 'start': '0001-01-01', 'end': '9000-01-01', 'bucket': 'day'})
+        self.assertEqual(too_long.status_code, 400)
+        # Buckets past date.max are invalid input, not a server error
+        for bucket in ('day', 'week', 'month'):
+            response = self.client.get(url, {'range': 'custom', 'start': '9999-01-01', 'end': '9999-12-31',
+                                             'bucket': bucket})
+            self.assertEqual(response.status_code, 400)
+
+        # A daily activity series of 20 years falls back to weekly buckets
+        data = self.client.get(url, {'range': 'custom', 'start': '2000-01-01', 'end': '2019-12-31',
+                                     'bucket': 'day'}).json()
+        self.assertEqual(data['bucket'], 'week')
+        self.assertLessEqual(len(data['values']), charts.MAX_POINTS)
+
+        WorkoutSession.objects.create(user=self.user, date=datetime(1, 1, 1, 12, tzinfo=dt_timezone.utc),
+                                      duration_minutes=30)
+        data = self.client.get(url, {'range': 'all', 'bucket': 'day'}).json()
+        self.assertEqual(data['bucket'], 'week')
+        self.assertGreaterEqual(data['start'], (timezone.localdate() - timedelta(days=charts.MAX_RANGE_DAYS)).isoformat())
+        self.assertLessEqual(len(data['values']), charts.MAX_POINTS)
+
+
+class TimezoneBucketingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.profile = UserProfile.objects.create(user=self.user, timezone='America/New_York')
+
+    def test_late_evening_workout_counts_on_local_day(self):
+        # 23:30 in New York is 03:30 UTC on the next calendar day
+        late = datetime(2025, 3, 10, 23, 30, tzinfo=zoneinfo.ZoneInfo('America/New_York'))
+        WorkoutSession.objects.create(user=self.user, date=late, duration_minutes=40)
+
+        rollup = DailyActivity.objects.get(user=self.user)
+        self.assertEqual((rollup.day, rollup.minutes), (date(2025, 3, 10), 40))
+
+    def test_changing_timezone_rebuilds_rollups(self):
+        WorkoutSession.objects.create(
+            user=self.user, date=datetime(2025, 3, 11, 3, 30, tzinfo=dt_timezone.utc), duration_minutes=40,
+        )
+        self.assertEqual(DailyActivity.objects.get(user=self.user).day, date(2025, 3, 10))
+
+        self.profile.timezone = 'Asia/Tokyo'
+        self.profile.save()
+        self.assertEqual(DailyActivity.objects.get(user=self.user).day, date(2025, 3, 11))
+
+
+class DailyActivityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=self.user, timezone='UTC')
+        self.squat = Exercise.objects.create(name='Squat', category='strength')
+
+    def at(self, day, hour=12):
+        return datetime(2025, 3, day, hour, tzinfo=dt_timezone.utc)
+
+    def rows(self):
+        return list(DailyActivity.objects.filter(user=self.user).order_by('day').values_list(
+            'day', 'minutes', 'set_count', 'volume_kg', 'workout_count',
+        ))
+
+    def test_hooks_follow_saves_moves_and_deletes(self):
+        morning = WorkoutSession.objects.create(user=self.user, date=self.at(10, 8), duration_minutes=30)
+        evening = WorkoutSession.objects.create(user=self.user, date=self.at(10, 18))
+        ExerciseSet.objects.create(workout=evening, exercise=self.squat, sets=3, reps=5, weight_kg=100,
+                                   duration_seconds=600)
+        self.assertEqual(self.rows(), [(date(2025, 3, 10), 40, 1, 1500.0, 2)])
+
+        # Moving a workout to another day refreshes both days
+        evening = WorkoutSession.objects.get(pk=evening.pk)
+        evening.date = self.at(12)
+        evening.save()
+        self.assertEqual(self.rows(), [(date(2025, 3, 10), 30, 0, 0.0, 1), (date(2025, 3, 12), 10, 1, 1500.0, 1)])
+
+        morning.delete()
+        self.assertEqual(self.rows(), [(date(2025, 3, 12), 10, 1, 1500.0, 1)])
+
+    def test_rebuild_command_reproduces_incremental_rows(self):
+        rng = random.Random(0)
+        workouts = []
+        for _ in range(40):
+            if workouts and rng.random() < 0.3:
+                workouts.pop(rng.randrange(len(workouts))).delete()
+                continue
+            workout = WorkoutSession.objects.create(user=self.user, date=self.at(rng.randrange(1, 20), rng.randrange(24)),
+                                                    duration_minutes=rng.choice([None, 20, 45]))
+            for _ in range(rng.randrange(3)):
+                ExerciseSet.objects.create(workout=workout, exercise=self.squat, sets=3, reps=5,
+                                           weight_kg=rng.randrange(40, 120), duration_seconds=rng.randrange(30, 300))
+            workouts.append(workout)
+        incremental = self.rows()
+        self.assertTrue(incremental)
+
+        version = data_version(self.user.id)
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn(f'Rebuilt {len(incremental)} daily rollup rows.', out.getvalue())
+        self.assertEqual(self.rows(), incremental)
+        self.assertGreater(data_version(self.user.id), version)
+
+
+class CSVImportTests(TestCase):
+    HEADER = 'date,exercise,sets,reps,weight_kg,duration_minutes,duration_seconds,distance_km,notes,exercise_notes\n'
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.client.force_login(self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, FITTRACK_JOBS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, body):
+        csv_file = SimpleUploadedFile('workouts.csv', (self.HEADER + body).encode('utf-8'))
+        return self.client.post(reverse('import_csv'), {'csv_file': csv_file})
+
+    def test_rows_share_sessions_and_report_errors_per_row(self):
+        WorkoutSession.objects.create(
+            user=self.user, date=timezone.make_aware(datetime(2025, 1, 1, 10, 0)), notes='existing',
+        )
+        response = self.upload(
+            '2025-01-01 10:00:00,Squat,3,5,100,,,,,\n'
+            '2025-01-01 10:00:00,Brand New Lift,2,8,40,,,,,\n'
+            '2025-01-02 09:00:00,Running,1,,,30,1800,5,,\n'
+            'yesterday,Squat,1,,,,,,,\n'
+            '2025-01-03 09:00:00,Squat,lots,,,,,,,\n'
+        )
+
+        job = ImportJob.objects.get(user=self.user)
+        self.assertRedirects(response, f"{reverse('import_csv')}?job={job.pk}")
+        self.assertEqual(WorkoutSession.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(ExerciseSet.objects.filter(workout__user=self.user).count(), 3)
+        self.assertTrue(Exercise.objects.filter(name='Brand New Lift', category='other').exists())
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(PersonalRecord.objects.get(user=self.user, exercise__name='Squat', kind='max_weight').value, 100)
+        existing = WorkoutSession.objects.get(notes='existing')
+        self.assertEqual((existing.set_count, existing.total_volume_kg), (2, 3 * 5 * 100 + 2 * 8 * 40))
+
+        status = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+        self.assertEqual(status['status'], 'done')
+        self.assertTrue(status['finished'])
+        self.assertEqual(status['processed_rows'], 5)
+        self.assertEqual(status['imported_count'], 3)
+        self.assertEqual(status['failed_rows'], 2)
+        self.assertTrue(status['errors'][0].startswith('Row 5:'))
+        self.assertTrue(status['errors'][1].startswith('Row 6:'))
+        self.assertFalse(job.csv_file)
+
+    def test_failed_job_syncs_the_batches_it_committed(self):
+        UserProfile.objects.create(user=self.user)
+        rows = ''.join(f"2025-01-{i % 28 + 1:02d} 08:00:00,Squat,3,5,100,,,,,{'x' * 100}\n" for i in range(1200))
+        # An invalid byte past the first batch, in a later chunk of the upload
+        csv_file = SimpleUploadedFile('workouts.csv', (self.HEADER + rows).encode('utf-8') + b'\xff\n')
+        self.client.post(reverse('import_csv'), {'csv_file': csv_file})
+
+        job = ImportJob.objects.get(user=self.user)
+        self.assertEqual(job.status, 'failed')
+        self.assertGreater(job.imported_count, 0)
+        workouts = WorkoutSession.objects.filter(user=self.user)
+        self.assertEqual(ExerciseSet.objects.filter(workout__user=self.user).count(), job.imported_count)
+        self.assertEqual(DailyActivity.objects.filter(user=self.user).count(), workouts.count())
+        self.assertEqual(UserProfile.objects.get(user=self.user).last_active_day,
+                         timezone.localtime(workouts.first().date).date())
+
+    def test_job_status_is_private(self):
+        other = User.objects.create_user('other', password='pw')
+        job = ImportJob.objects.create(user=other, csv_file=SimpleUploadedFile('x.csv', b'date\n'))
+        response = self.client.get(reverse('import_job_status', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_decode_lines_handles_bom_and_split_characters(self):
+        data = '\ufeffdate,notes\r\n2025-01-01 10:00:00,café\n'.encode('utf-8')
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        self.assertEqual(list(decode_lines(chunks)), ['date,notes\r\n', '2025-01-01 10:00:00,café\n'])
+
+    def test_large_file_is_imported_in_bounded_memory(self):
+        rows = 10000
+        with tempfile.TemporaryFile() as f:
+            f.write(self.HEADER.encode('utf-8'))
+            for i in range(rows):
+                f.write(f"2025-01-{i % 28 + 1:02d} 08:00:00,Squat,3,5,100,,,,,{'x' * 1000}\n".encode('utf-8'))
+            file_size = f.tell()
+            f.seek(0)
+
+            tracemalloc.start()
+            try:
+                result = import_file(self.user, File(f))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        self.assertEqual(result.imported_count, rows)
+        # Reading the whole upload would cost at least the file size twice (bytes and str)
+        self.assertLess(peak, file_size / 2)
+
+
+class CSVExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.client.force_login(self.user)
+        exercise = Exercise.objects.create(name='Squat', category='strength')
+        workout = WorkoutSession.objects.create(
+            user=self.user, date=datetime(2025, 1, 1, 10, 0, tzinfo=dt_timezone.utc), duration_minutes=45, notes='legs',
+        )
+        ExerciseSet.objects.create(workout=workout, exercise=exercise, sets=3, reps=5, weight_kg=100, notes='heavy, slow')
+        ExerciseSet.objects.create(workout=workout, exercise=exercise, sets=1, duration_seconds=60)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_export_streams_rows_in_import_format(self):
+        response = self.client.get(reverse('export_csv'))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="my_workout_data.csv"')
+        self.assertEqual(self.read(response).decode('utf-8').splitlines(), [
+            'date,exercise,sets,reps,weight_kg,duration_minutes,duration_seconds,distance_km,notes,exercise_notes',
+            '2025-01-01 10:00:00,Squat,3,5,100.0,45,,,legs,"heavy, slow"',
+            '2025-01-01 10:00:00,Squat,1,,,45,60,,legs,',
+        ])
+
+    def test_gzip_export_matches_plain_export(self):
+        plain = self.read(self.client.get(reverse('export_csv')))
+        response = self.client.get(reverse('export_csv'), {'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(self.read(response)), plain)
+
+
+class WorkoutSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.exercise = Exercise.objects.create(name='Row', category='cardio')
+        self.workout = WorkoutSession.objects.create(user=self.user)
+
+    def summary(self):
+        self.workout.refresh_from_db()
+        w = self.workout
+        return w.set_count, w.total_seconds, w.total_volume_kg, w.total_distance_km
+
+    def test_summary_follows_set_writes(self):
+        first = ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, sets=3, reps=10, weight_kg=20)
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, duration_seconds=90, distance_km=0.5)
+        self.assertEqual(self.summary(), (2, 90, 600.0, 0.5))
+        self.assertEqual(self.workout.calculated_duration, 1.5)
+
+        first.reps = 5
+        first.save()
+        self.assertEqual(self.summary(), (2, 90, 300.0, 0.5))
+
+        first.delete()
+        self.assertEqual(self.summary(), (1, 90, 0.0, 0.5))
+
+    def test_moving_a_set_refreshes_both_workouts_and_days(self):
+        UserProfile.objects.create(user=self.user, weight_kg=70)
+        self.workout.date = datetime(2025, 3, 10, 12, tzinfo=dt_timezone.utc)
+        self.workout.save()
+        other = WorkoutSession.objects.create(user=self.user, date=datetime(2025, 3, 11, 12, tzinfo=dt_timezone.utc))
+        moving = ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, duration_seconds=600)
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, duration_seconds=300)
+
+        moving.workout = other
+        moving.save()
+        self.assertEqual(self.summary()[:2], (1, 300))
+        other.refresh_from_db()
+        self.assertEqual((other.set_count, other.total_seconds), (1, 600))
+        self.assertLess(self.workout.kcal, other.kcal)
+        days = dict(DailyActivity.objects.filter(user=self.user).values_list('day', 'set_count'))
+        self.assertEqual(days, {date(2025, 3, 10): 1, date(2025, 3, 11): 1})
+
+    def test_saving_a_stale_workout_keeps_its_totals(self):
+        UserProfile.objects.create(user=self.user, timezone='UTC')
+        stale = WorkoutSession.objects.get(pk=self.workout.pk)
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, sets=3, reps=10, weight_kg=20,
+                                   duration_seconds=120)
+        stale.notes = 'edited'
+        stale.save()
+        self.assertEqual(self.summary(), (1, 120, 600.0, 0))
+        rollup = DailyActivity.objects.get(user=self.user)
+        self.assertEqual((rollup.minutes, rollup.set_count), (2, 1))
+
+    def test_deleting_an_exercise_refreshes_its_workouts(self):
+        UserProfile.objects.create(user=self.user, timezone='UTC', weight_kg=70)
+        squat = Exercise.objects.create(name='Squat', category='strength')
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, duration_seconds=600)
+        ExerciseSet.objects.create(workout=self.workout, exercise=squat, sets=3, reps=5, weight_kg=100,
+                                   duration_seconds=60)
+        self.workout.refresh_from_db()
+        kcal = self.workout.kcal
+        version = data_version(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercise.delete()
+        self.assertEqual(self.summary(), (1, 60, 1500.0, 0))
+        self.assertLess(self.workout.kcal, kcal)
+        rollup = DailyActivity.objects.get(user=self.user)
+        self.assertEqual((rollup.minutes, rollup.set_count), (1, 1))
+        self.assertGreater(data_version(self.user.id), version)
+
+    def test_detail_page_does_not_aggregate_sets(self):
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.exercise, duration_seconds=120)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(5):  # session, user, workout, sets with exercises, records
+            response = self.client.get(reverse('workout_detail', args=[self.workout.pk]))
+        self.assertContains(response, '~2.0 min')
+
+
+class PersonalRecordTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.bench = Exercise.objects.create(name='Bench Press', category='strength')
+        self.run = Exercise.objects.create(name='Run', category='cardio')
+        self.workout = WorkoutSession.objects.create(user=self.user)
+
+    def records(self):
+        return {
+            (r.exercise.name, r.kind): round(r.value, 2)
+            for r in PersonalRecord.objects.filter(user=self.user).select_related('exercise')
+        }
+
+    def test_estimated_1rm(self):
+        self.assertEqual(estimated_1rm(100, 1), 100)
+        self.assertAlmostEqual(estimated_1rm(100, 5), (100 * (1 + 5 / 30) + 100 * 36 / 32) / 2)
+        self.assertAlmostEqual(estimated_1rm(100, 12), 100 * (1 + 12 / 30))
+
+    def test_records_follow_set_writes(self):
+        heavy = ExerciseSet.objects.create(workout=self.workout, exercise=self.bench, sets=1, reps=3, weight_kg=100)
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.bench, sets=1, reps=12, weight_kg=60)
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.run, duration_seconds=1500, distance_km=5)
+        self.assertEqual(self.records(), {
+            ('Bench Press', 'max_weight'): 100,
+            ('Bench Press', 'est_1rm'): round(estimated_1rm(100, 3), 2),
+            ('Bench Press', 'max_reps'): 12,
+            ('Run', 'max_distance'): 5,
+            ('Run', 'best_pace'): 300,
+        })
+
+        # Lowering or deleting the record-holding set falls back to the next best set
+        heavy.weight_kg = 50
+        heavy.save()
+        self.assertEqual(self.records()[('Bench Press', 'max_weight')], 60)
+        ExerciseSet.objects.filter(exercise=self.bench, weight_kg=60).delete()
+        self.assertEqual(self.records()[('Bench Press', 'max_weight')], 50)
+
+        self.workout.delete()
+        self.assertEqual(self.records(), {})
+
+    def test_workout_page_flags_records(self):
+        ExerciseSet.objects.create(workout=self.workout, exercise=self.bench, sets=1, reps=1, weight_kg=120)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('workout_detail', args=[self.workout.pk]))
+        self.assertContains(response, 'PR: Heaviest weight')
+
+
+class StreakTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.profile = UserProfile.objects.create(user=self.user, timezone='UTC')
+        self.start = date(2025, 3, 1)
+
+    def log(self, *offsets):
+        return [
+            WorkoutSession.objects.create(user=self.user, date=datetime.combine(
+                self.start + timedelta(days=i), datetime.min.time(), dt_timezone.utc) + timedelta(hours=12))
+            for i in offsets
+        ]
+
+    def state(self):
+        self.profile.refresh_from_db()
+        return {name: getattr(self.profile, name) for name in streaks.FIELDS}
+
+    def day(self, offset):
+        return self.start + timedelta(days=offset)
+
+    def test_incremental_state(self):
+        workouts = dict(zip([0, 1, 2, 3, 6, 7], self.log(0, 1, 2, 3, 6, 7)))
+        self.assertEqual(self.state(), {
+            'first_active_day': self.day(0), 'streak_start': self.day(6),
+            'last_active_day': self.day(7), 'longest_streak': 4, 'past_longest_streak': 4,
+        })
+        # A day logged late closes the gap and joins both runs
+        workouts.update(zip([4, 5], self.log(4, 5)))
+        self.assertEqual(self.state()['streak_start'], self.day(0))
+        self.assertEqual(self.state()['longest_streak'], 8)
+        # Deleting inside the current streak splits it without re-reading the history
+        with unittest.mock.patch.object(streaks, 'rebuild_state') as rebuild:
+            workouts[5].delete()
+        rebuild.assert_not_called()
+        self.assertEqual(self.state(), {
+            'first_active_day': self.day(0), 'streak_start': self.day(6),
+            'last_active_day': self.day(7), 'longest_streak': 5, 'past_longest_streak': 5,
+        })
+
+    def test_matches_full_recompute(self):
+        rng = random.Random(0)
+        workouts = []
+        for _ in range(120):
+            if workouts and rng.random() < 0.4:
+                workouts.pop(rng.randrange(len(workouts))).delete()
+            else:
+                workouts += self.log(rng.randrange(30))
+            self.assertEqual(self.state(), streaks.rebuild_state(self.user.id))
+
+    def test_dashboard_cards(self):
+        self.log(0, 1, 2, 5, 6)
+        self.client.force_login(self.user)
+        with unittest.mock.patch('django.utils.timezone.now',
+                                 return_value=datetime(2025, 3, 8, 9, tzinfo=dt_timezone.utc)):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['current_streak'], 2)
+        self.assertEqual(response.context['longest_streak'], 3)
+        self.assertEqual(response.context['days_since_last_workout'], 1)
+        self.assertEqual(response.context['workouts_per_week'], 4.4)  # 5 workouts over 8 days
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.today = date(2025, 3, 14)  # a Friday
+        squat = Exercise.objects.create(name='Squat', category='strength')
+        self.users = []
+        # Minutes this week: 90, 60, 60, 30; the last athlete has not opted in
+        for name, minutes, opt_in in [('ana', 90, True), ('ben', 60, True), ('cy', 60, True), ('dee', 30, True),
+                                      ('eve', 120, False)]:
+            user = User.objects.create_user(name, password='pw')
+            UserProfile.objects.create(user=user, timezone='UTC', leaderboard_opt_in=opt_in)
+            workout = WorkoutSession.objects.create(
+                user=user, date=datetime(2025, 3, 12, 12, tzinfo=dt_timezone.utc), duration_minutes=minutes,
+            )
+            ExerciseSet.objects.create(workout=workout, exercise=squat, sets=1, reps=5, weight_kg=minutes)
+            self.users.append(user)
+
+    def board(self, **kwargs):
+        return Leaderboard.objects.get(**kwargs)
+
+    def test_refresh_ranks_opted_in_users(self):
+        leaderboards.refresh(self.today)
+        board = self.board(metric='weekly_minutes', week_start=date(2025, 3, 10))
+        self.assertEqual(
+            list(board.entries.values_list('user__username', 'position', 'rank', 'score')),
+            [('ana', 1, 1, 90), ('ben', 2, 2, 60), ('cy', 3, 2, 60), ('dee', 4, 4, 30)],
+        )
+        records = self.board(metric='record', record_kind='max_weight')
+        self.assertEqual(list(records.entries.values_list('user__username', flat=True)), ['ana', 'ben', 'cy', 'dee'])
+
+        # Keyset pages and the own-rank lookup read a bounded number of rows
+        self.assertEqual([e.user.username for e in leaderboards.page(board, after=2, size=1)], ['cy'])
+        with self.assertNumQueries(1):
+            self.assertEqual(leaderboards.own_entry(board, self.users[2]).rank, 2)
+
+    def test_opting_out_withdraws_at_once(self):
+        leaderboards.refresh(self.today)
+        profile = self.users[0].profile
+        profile.leaderboard_opt_in = False
+        profile.save()
+        self.assertFalse(LeaderboardEntry.objects.filter(user=self.users[0]).exists())
+
+    def test_page(self):
+        leaderboards.refresh(self.today)
+        self.client.force_login(self.users[1])
+        board = self.board(metric='weekly_minutes', week_start=date(2025, 3, 10))
+        response = self.client.get(reverse('leaderboard'), {'board': board.pk})
+        self.assertContains(response, 'your rank: #2 (60 min)')
+        self.assertNotContains(response, 'eve')
+
+
+class CalorieTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=self.user, weight_kg=90)
+        self.run = Exercise.objects.create(name='Run', category='cardio')
+        self.yoga = Exercise.objects.create(name='Yoga', category='flexibility', met=3.0)
+
+    def workout(self, day, **kwargs):
+        return WorkoutSession.objects.create(
+            user=self.user, date=timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=12)),
+            **kwargs,
+        )
+
+    def test_estimate_follows_sets_and_weights(self):
+        today = timezone.localdate()
+        workout = self.workout(today, duration_minutes=60)
+        # No sets: the default MET at the profile weight
+        workout.refresh_from_db()
+        self.assertEqual(workout.kcal, calories.DEFAULT_MET * 90)
+
+        # MET is weighted by set time: 20 min of running (category default) and 10 of yoga (its own MET)
+        ExerciseSet.objects.create(workout=workout, exercise=self.run, duration_seconds=1200)
+        ExerciseSet.objects.create(workout=workout, exercise=self.yoga, duration_seconds=600)
+        met = (calories.CATEGORY_METS['cardio'] * 1200 + 3.0 * 600) / 1800
+        workout.refresh_from_db()
+        self.assertEqual(workout.kcal, round(met * 90, 1))
+
+        # A weight entry replaces the profile weight for nearby workouts
+        WeightHistory.objects.create(user=self.user, weight_kg=80)
+        workout.refresh_from_db()
+        self.assertEqual(workout.kcal, round(met * 80, 1))
+
+    def test_nearest_weight_entry_and_backfill(self):
+        start = date(2025, 1, 1)
+        entries = [WeightHistory.objects.create(user=self.user, weight_kg=kg) for kg in (70, 80)]
+        for entry, day in zip(entries, (start, start + timedelta(days=10))):
+            WeightHistory.objects.filter(pk=entry.pk).update(recorded_date=day)
+        early = self.workout(start + timedelta(days=3), duration_minutes=30)
+        late = self.workout(start + timedelta(days=8), duration_minutes=30)
+        WorkoutSession.objects.update(kcal=None)
+        version = data_version(self.user.id)
+
+        call_command('backfill_calories', batch_size=1, stdout=io.StringIO())
+        self.assertGreater(data_version(self.user.id), version)
+        kcal = dict(WorkoutSession.objects.values_list('pk', 'kcal'))
+        self.assertEqual(kcal[early.pk], calories.DEFAULT_MET * 70 * 0.5)
+        self.assertEqual(kcal[late.pk], calories.DEFAULT_MET * 80 * 0.5)
+
+
+class HistorySummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=self.user, gender='male', age=30, height_cm=180, weight_kg=80)
+        self.squat = Exercise.objects.create(name='Squat', category='strength')
+        self.run = Exercise.objects.create(name='Run', category='cardio')
+        self.last_day = date(2025, 3, 14)
+
+    def profile(self):
+        return UserProfile.objects.get(user=self.user)
+
+    def log(self, days_ago, squat_kg):
+        day = self.last_day - timedelta(days=days_ago)
+        workout = WorkoutSession.objects.create(
+            user=self.user, date=timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=12)),
+            duration_minutes=40,
+        )
+        ExerciseSet.objects.create(workout=workout, exercise=self.squat, sets=3, reps=5, weight_kg=squat_kg)
+        ExerciseSet.objects.create(workout=workout, exercise=self.run, sets=1, duration_seconds=600)
+
+    def test_summary_from_aggregates(self):
+        self.assertEqual(history.training_summary(self.profile()), "")
+        for days_ago in range(0, 56, 7):
+            self.log(days_ago, squat_kg=100 if days_ago < 28 else 90)
+
+        summary = history.training_summary(self.profile())
+        self.assertIn('the 8 weeks up to 2025-03-14', summary)
+        self.assertIn('1.0 workouts per week (8 workouts on 8 days)', summary)
+        self.assertIn('40, 40, 40, 40, 40, 40, 40, 40; average 40', summary)
+        self.assertIn('strength 75%, cardio 25% of sets', summary)
+        self.assertIn('Squat (24 sets, best 100 kg, up from 90 kg)', summary)
+        self.assertIn('kcal per workout', summary)
+
+        # Memoized against the data version; a new workout is picked up
+        profile = self.profile()
+        with self.assertNumQueries(0):
+            self.assertEqual(history.training_summary(profile), summary)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(1, squat_kg=105)
+        self.assertIn('best 105 kg', history.training_summary(self.profile()))
+
+    def test_queries_and_size_are_bounded(self):
+        exercises = Exercise.objects.bulk_create([
+            Exercise(name=f'Very long exercise name number {i} with variations', category='strength') for i in range(40)
+        ])
+        for days_ago in range(56):
+            self.log(days_ago, squat_kg=100)
+            workout = WorkoutSession.objects.filter(user=self.user).first()
+            ExerciseSet.objects.bulk_create([
+                ExerciseSet(workout=workout, exercise=exercise, sets=2, weight_kg=50) for exercise in exercises
+            ])
+        profile = self.profile()
+        with self.assertNumQueries(6):
+            lines = history.build_summary(self.user.pk, profile.last_active_day, timezone.get_default_timezone())
+        self.assertLessEqual(len(history.training_summary(profile)), history.MAX_TOKENS * history.CHARS_PER_TOKEN)
+
+        cache.clear()
+        with unittest.mock.patch.object(history, 'MAX_TOKENS', 60):
+            summary = history.training_summary(profile)
+        self.assertLessEqual(len(summary), 240)
+        self.assertEqual(summary.splitlines(), lines[:len(summary.splitlines()) - 1] + [unittest.mock.ANY])
+        self.assertTrue(summary.endswith('...'))
+
+
+@override_settings(FITTRACK_JOBS_EAGER=True)
+class PlanStoreTests(TestCase):
+    PLAN = {'training_plan': {'summary': 'Stored plan', 'weeks': []}, 'diet_plan': {}}
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.profile = UserProfile.objects.create(user=self.user, gender='female', age=30, height_cm=170, weight_kg=65)
+        self.client.force_login(self.user)
+        self.generate = unittest.mock.Mock(return_value=self.PLAN)
+        # Jobs stream the model output; direct get_or_generate calls do not
+        for name in ('generate_fitness_plan_from_profile', 'stream_fitness_plan_from_profile'):
+            patcher = unittest.mock.patch(f'core.plans.{name}', self.generate)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unchanged_inputs_are_served_from_the_store(self):
+        url = reverse('ai_planner')
+        self.assertContains(self.client.post(url, follow=True), 'Stored plan')
+        self.assertContains(self.client.post(url), 'Stored plan')
+        self.assertContains(self.client.get(url), 'Stored plan')
+        self.assertEqual(self.generate.call_count, 1)
+
+        self.client.post(url, {'regenerate': '1'})
+        self.assertEqual(self.generate.call_count, 2)
+
+        # A changed profile changes the fingerprint
+        self.profile.weight_kg = 64
+        self.profile.save()
+        self.client.post(url)
+        self.assertEqual(self.generate.call_count, 3)
+
+    def test_generation_runs_as_a_polled_job(self):
+        response = self.client.post(reverse('ai_planner'))
+        job = PlanJob.objects.get(user=self.user)
+        self.assertRedirects(response, f"{reverse('ai_planner')}?job={job.pk}")
+        status = self.client.get(reverse('plan_job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['finished']), ('done', True))
+
+        # A failed generation falls back to a quick plan
+        self.generate.return_value = {'error': 'Quota exceeded', 'details': 'Try later.'}
+        self.client.post(reverse('ai_planner'), {'regenerate': '1'})
+        fallback = PlanJob.objects.filter(status='done').first()
+        self.assertEqual(fallback.plan.plan['source'], 'quick')
+        page = self.client.get(reverse('ai_planner'), {'job': fallback.pk})
+        self.assertContains(page, 'Quota exceeded')
+        self.assertContains(page, 'Quick plan')
+
+        with self.settings(FITTRACK_PLAN_FALLBACK=False):
+            self.client.post(reverse('ai_planner'), {'regenerate': '1'})
+        failed = PlanJob.objects.filter(status='failed').get()
+        self.assertContains(self.client.get(reverse('ai_planner'), {'job': failed.pk}), 'Quota exceeded')
+
+    @override_settings(FITTRACK_JOBS_EAGER=False, FITTRACK_JOBS_IN_PROCESS=False, FITTRACK_PLAN_QUEUE_LIMIT=1)
+    def test_full_queue_turns_requests_away(self):
+        other = User.objects.create_user('other', password='pw')
+        first = jobs.enqueue_plan(other)
+        self.assertEqual(jobs.enqueue_plan(other), first)  # one unfinished job per user
+        response = self.client.post(reverse('ai_planner'))
+        self.assertContains(response, 'The planner is busy', status_code=503)
+        self.assertEqual(self.generate.call_count, 0)
+
+    def test_expired_and_failed_plans(self):
+        plans.get_or_generate(self.profile)
+        GeneratedPlan.objects.update(expires_at=timezone.now())
+        plans.get_or_generate(self.profile)
+        self.assertEqual(self.generate.call_count, 2)
+        self.assertEqual(GeneratedPlan.objects.count(), 1)  # the expired plan was replaced
+
+        self.generate.return_value = {'error': 'Quota exceeded', 'details': 'Try later.'}
+        with self.settings(FITTRACK_PLAN_FALLBACK=False):
+            plan, stored = plans.get_or_generate(self.profile, regenerate=True)
+        self.assertIsNone(stored)
+        self.assertEqual(GeneratedPlan.objects.count(), 1)
+
+        # The quick plan stored in its place is not taken for an AI plan later
+        plan, stored = plans.get_or_generate(self.profile, regenerate=True)
+        self.assertEqual(plan['source'], 'quick')
+        self.generate.return_value = self.PLAN
+        self.assertEqual(plans.get_or_generate(self.profile)[0], self.PLAN)
+
+
+class PlanStreamTests(TestCase):
+    WEEKS = [
+        {'week_number': n, 'focus': f'Block {n} {{"brace"}} \\ end', 'schedule': [{'day': 'Day 1', 'type': 'Rest Day'}]}
+        for n in (1, 2)
+    ]
+    PLAN = {'training_plan': {'summary': 'Two weeks', 'weeks': WEEKS}, 'diet_plan': {'calories': '2000 kcal'}}
+
+    def chunks(self, size=7):
+        text = '```json\n' + json.dumps(self.PLAN, indent=2) + '\n```'
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def test_weeks_are_parsed_as_they_close(self):
+        parser = PlanStreamParser()
+        seen = []
+        for chunk in self.chunks():
+            weeks = parser.feed(chunk)
+            if weeks:
+                seen.append((weeks, parser.complete))
+        self.assertEqual(seen, [([self.WEEKS[0]], False), ([self.WEEKS[1]], False)])
+        self.assertEqual(parser.result(), self.PLAN)
+
+        truncated = PlanStreamParser()
+        truncated.feed('{"training_plan": {"weeks": [')
+        with self.assertRaises(ValueError):
+            truncated.result()
+
+    @override_settings(FITTRACK_JOBS_EAGER=True)
+    def test_job_streams_weeks_to_the_browser(self):
+        user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=user, gender='male', age=30, height_cm=180, weight_kg=80)
+        self.client.force_login(user)
+        backend = unittest.mock.Mock()
+        backend.stream.return_value = iter(self.chunks())
+        with unittest.mock.patch('core.ai_planner.get_client', return_value=backend):
+            self.client.post(reverse('ai_planner'))
+
+        job = PlanJob.objects.get(user=user)
+        self.assertEqual(job.weeks, self.WEEKS)
+        self.assertEqual(job.plan.plan, self.PLAN)
+        backend.generate.assert_not_called()
+
+        response = self.client.get(reverse('plan_job_stream', args=[job.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('event: week\n'), 2)
+        self.assertIn('Week 2: Block 2', body)
+        self.assertTrue(body.endswith('event: done\ndata: {"status": "done"}\n\n'))
+
+        # A browser reconnecting after the first week only gets the rest
+        first_id = body.split('event: week\nid: ')[1].split('\n')[0]
+        body = b''.join(self.client.get(reverse('plan_job_stream', args=[job.pk]),
+                                        HTTP_LAST_EVENT_ID=first_id).streaming_content).decode()
+        self.assertEqual(body.count('event: week\n'), 1)
+        self.assertIn('Week 2: Block 2', body)
+
+    @override_settings(FITTRACK_JOBS_EAGER=True)
+    def test_quick_plan_fallback_resets_streamed_weeks(self):
+        user = User.objects.create_user('athlete', password='pw')
+        UserProfile.objects.create(user=user, gender='male', age=30, height_cm=180, weight_kg=80)
+        self.client.force_login(user)
+        text = ''.join(self.chunks())
+        cut = text.index('"week_number": 2')
+
+        def stream(prompt, timeout=None):
+            yield text[:cut]
+            raise TimeoutError('The model stalled')
+
+        backend = unittest.mock.Mock()
+        backend.stream.side_effect = stream
+        with unittest.mock.patch('core.ai_planner.get_client', return_value=backend):
+            self.client.post(reverse('ai_planner'))
+        job = PlanJob.objects.get(user=user)
+        self.assertEqual(job.weeks, self.WEEKS[:1])
+        self.assertEqual(job.plan.plan['source'], 'quick')
+
+        # The browser had shown the AI plan's first week before the fallback
+        response = self.client.get(reverse('plan_job_stream', args=[job.pk]),
+                                   HTTP_LAST_EVENT_ID=views._weeks_id(self.WEEKS[:1]))
+        body = b''.join(response.streaming_content).decode()
+        self.assertLess(body.index('event: reset\n'), body.index('event: week\n'))
+        self.assertEqual(body.count('event: week\n'), 4)
+        self.assertNotIn('Block 1', body)
+
+    def test_stream_ends_before_the_job_does(self):
+        user = User.objects.create_user('athlete', password='pw')
+        self.client.force_login(user)
+        job = PlanJob.objects.create(user=user, status='running', weeks=self.WEEKS[:1])
+        with unittest.mock.patch.object(views, 'PLAN_STREAM_MAX_SECONDS', 0):
+            body = b''.join(self.client.get(reverse('plan_job_stream', args=[job.pk])).streaming_content).decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertEqual(body.count('event: week\n'), 1)
+        self.assertNotIn('event: done', body)
+
+
+@override_settings(FITTRACK_JOBS_EAGER=True)
+class PlanSectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.profile = UserProfile.objects.create(user=self.user, gender='female', age=30, height_cm=170, weight_kg=65)
+        self.client.force_login(self.user)
+        self.plan = llm.StubBackend().plan('prompt')
+        self.stored = plans.save_plan(self.user.pk, plans.fingerprint(self.profile), self.plan)
+        self.model = unittest.mock.Mock()
+        patcher = unittest.mock.patch('core.ai_planner.get_client', return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_week_is_rewritten_and_merged(self):
+        week = {'focus': 'Lighter week', 'schedule': [{'day': 'Day 1', 'type': 'Rest Day', 'exercises': [], 'cardio': None}]}
+        self.model.generate.return_value = '```json\n' + json.dumps({'week': week}) + '\n```'
+        response = self.client.post(reverse('ai_planner'), {'section': '2', 'instructions': 'less volume please'})
+        job = PlanJob.objects.get(user=self.user)
+        self.assertEqual((job.status, job.section, job.plan_id), ('done', '2', self.stored.pk))
+        self.assertRedirects(response, f"{reverse('ai_planner')}?job={job.pk}", fetch_redirect_response=False)
+
+        self.stored.refresh_from_db()
+        weeks = self.stored.plan['training_plan']['weeks']
+        self.assertEqual(weeks[1], {**week, 'week_number': 2})
+        self.assertEqual([weeks[0], weeks[2], weeks[3]], [self.plan['training_plan']['weeks'][i] for i in (0, 2, 3)])
+        self.assertEqual(self.stored.plan['diet_plan'], self.plan['diet_plan'])
+
+        # Only the requested week travels in full; the others are outlined
+        prompt = self.model.generate.call_args.args[0]
+        self.assertIn('less volume please', prompt)
+        self.assertIn('* Week 1 - Progression block 1: Upper Body Push (Bench Press', prompt)
+        self.assertNotIn('* Week 2 -', prompt)
+        self.assertIn(json.dumps(self.plan['training_plan']['weeks'][1], separators=(',', ':')), prompt)
+        self.assertNotIn(json.dumps(self.plan['training_plan']['weeks'][0], separators=(',', ':')), prompt)
+
+    def test_diet_and_failures(self):
+        diet = {'calories': '1900 kcal', 'macros': {'protein': '140 g', 'carbs': '180 g', 'fats': '65 g'},
+                'guidelines': [], 'meals': []}
+        self.model.generate.return_value = json.dumps(diet)
+        self.client.post(reverse('ai_planner'), {'section': 'diet'})
+        self.stored.refresh_from_db()
+        self.assertEqual(self.stored.plan['diet_plan'], diet)
+        self.assertEqual(self.stored.plan['training_plan'], self.plan['training_plan'])
+
+        # A failed or malformed answer leaves the stored plan alone
+        before = self.stored.plan
+        self.model.generate.return_value = '{"note": "no schedule here"}'
+        self.client.post(reverse('ai_planner'), {'section': '3'})
+        self.assertEqual(PlanJob.objects.filter(status='failed').count(), 1)
+        self.stored.refresh_from_db()
+        self.assertEqual(self.stored.plan, before)
+
+        response = self.client.post(reverse('ai_planner'), {'section': '9'})
+        self.assertContains(response, 'cannot be changed', status_code=400)
+
+
+class QuickPlanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.profile = UserProfile.objects.create(user=self.user, gender='male', age=30, height_cm=180, weight_kg=80,
+                                                  fitness_level='intermediate', primary_goal_choice='muscle_gain')
+        Exercise.objects.bulk_create([Exercise(name=name, category='strength') for name in (
+            'Bench Press', 'Overhead Press', 'Pull-up', 'Barbell Row', 'Squat', 'Deadlift', 'Plank',
+        )])
+
+    def test_targets_and_schedule(self):
+        # Mifflin-St Jeor: 10 * 80 + 6.25 * 180 - 5 * 30 + 5 = 1780 kcal, x 1.55 + 300
+        self.assertEqual(quick_plan.daily_targets(self.profile), {'kcal': 3050, 'protein': 160, 'carbs': 411, 'fats': 85})
+
+        with self.assertNumQueries(1):
+            plan = quick_plan.build_plan(self.profile)
+        weeks = plan['training_plan']['weeks']
+        self.assertEqual([week['week_number'] for week in weeks], [1, 2, 3, 4])
+        self.assertTrue(all(len(week['schedule']) == 7 for week in weeks))
+        lower = weeks[0]['schedule'][1]
+        self.assertEqual(lower['type'], 'Lower Body')
+        names = [e['name'] for e in lower['exercises']]
+        self.assertEqual(len(set(names)), len(names))
+        self.assertIn('Plank', names)
+        self.assertTrue(set(names) <= set(Exercise.objects.filter(category='strength').values_list('name', flat=True)))
+        self.assertFalse(any('Press' in name for name in names))
+        self.assertEqual(plan['diet_plan']['calories'], '3050 kcal')
+
+    def test_quick_mode_answers_in_the_request(self):
+        self.client.force_login(self.user)
+        with unittest.mock.patch('core.plans.generate_fitness_plan_from_profile') as generate:
+            response = self.client.post(reverse('ai_planner'), {'quick': '1'})
+        generate.assert_not_called()
+        self.assertContains(response, 'Quick plan')
+        self.assertContains(response, 'Week 4: Deload')
+        self.assertFalse(PlanJob.objects.exists())
+        # Stored, but never returned for an AI plan request
+        self.assertEqual(GeneratedPlan.objects.count(), 1)
+        self.assertIsNone(plans.find_plan(self.profile))
+
+
+class LLMBackendTests(TestCase):
+    def setUp(self):
+        self.profile = UserProfile(gender='male', age=30, height_cm=180, weight_kg=80)
+        llm.reset_clients()
+        self.addCleanup(llm.reset_clients)
+
+    @override_settings(FITTRACK_LLM_BACKEND='stub', FITTRACK_LLM_STUB_LATENCY=0.2, FITTRACK_LLM_STUB_FIRST_CHUNK=0.05)
+    def test_stub_backend(self):
+        weeks = []
+        start = time.perf_counter()
+        plan = stream_fitness_plan_from_profile(self.profile, on_week=weeks.append)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertEqual(len(weeks), 4)
+        self.assertEqual(plan['training_plan']['weeks'], weeks)
+        # Deterministic: the same prompt gives the same plan, streamed or not
+        self.assertEqual(generate_fitness_plan_from_profile(self.profile), plan)
+
+    @override_settings(FITTRACK_LLM_BACKEND='http', FITTRACK_LLM_URL='http://localhost:1/v1/chat/completions')
+    def test_http_backend_streams_chat_deltas(self):
+        text = json.dumps(llm.StubBackend().plan('prompt'))
+        events = [b'data: ' + json.dumps({'choices': [{'delta': {'content': text[i:i + 50]}}]}).encode() + b'\n'
+                  for i in range(0, len(text), 50)]
+        response = io.BytesIO(b': keep-alive\n' + b''.join(events) + b'data: [DONE]\n')
+        with unittest.mock.patch('urllib.request.urlopen', return_value=response) as urlopen:
+            plan = stream_fitness_plan_from_profile(self.profile)
+        self.assertEqual(plan, json.loads(text))
+        self.assertTrue(json.loads(urlopen.call_args.args[0].data)['stream'])
+
+    @override_settings(FITTRACK_LLM_BACKEND='unknown')
+    def test_misconfiguration_is_reported_as_an_error(self):
+        plan = generate_fitness_plan_from_profile(self.profile)
+        self.assertIn("Unknown FITTRACK_LLM_BACKEND", plan['error'])
+        self.assertIn('details', plan)
+
+
+class LLMClientTests(TestCase):
+    def client_for(self, backend, **options):
+        options = {'timeout': 5, 'retries': 2, 'backoff': 0, 'max_in_flight': 2,
+                   'breaker_failures': 3, 'breaker_reset': 60, **options}
+        return llm.LLMClient(backend, **options)
+
+    def test_transient_errors_are_retried(self):
+        backend = unittest.mock.Mock()
+        backend.generate.side_effect = [TimeoutError(), ConnectionResetError(), 'plan']
+        self.assertEqual(self.client_for(backend).generate('prompt'), 'plan')
+        self.assertEqual(backend.generate.call_count, 3)
+
+        backend.generate.side_effect = KeyError('choices')  # not transient
+        with self.assertRaises(KeyError):
+            self.client_for(backend).generate('prompt')
+        self.assertEqual(backend.generate.call_count, 4)
+
+    def test_circuit_breaker(self):
+        backend = unittest.mock.Mock()
+        backend.generate.side_effect = TimeoutError()
+        client = self.client_for(backend, retries=0, breaker_reset=0.05)
+        for _ in range(3):
+            with self.assertRaises(TimeoutError):
+                client.generate('prompt')
+        with self.assertRaises(llm.CircuitOpen):
+            client.generate('prompt')
+        self.assertEqual(backend.generate.call_count, 3)
+
+        # After the reset time one trial call goes through and closes the breaker
+        time.sleep(0.06)
+        backend.generate.side_effect = None
+        backend.generate.return_value = 'plan'
+        self.assertEqual(client.generate('prompt'), 'plan')
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_deadline_and_concurrency_cap(self):
+        client = self.client_for(llm.StubBackend(latency=1, first_chunk=0), timeout=0.2, retries=0, max_in_flight=1)
+        start = time.perf_counter()
+        with self.assertRaises(TimeoutError):
+            client.generate('prompt')
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        stream = client.stream('prompt')
+        next(stream)  # holds the only slot
+        with self.assertRaises(llm.TooManyCalls):
+            client.generate('prompt')
+        stream.close()
+        self.assertTrue(client.slots.acquire(blocking=False))
+
+    @override_settings(FITTRACK_LLM_BACKEND='stub', FITTRACK_LLM_STUB_LATENCY=1, FITTRACK_LLM_TIMEOUT=0.1,
+                       FITTRACK_LLM_RETRIES=0)
+    def test_clients_are_reused_and_errors_keep_their_shape(self):
+        llm.reset_clients()
+        self.addCleanup(llm.reset_clients)
+        self.assertIs(llm.get_client(), llm.get_client())
+        plan = generate_fitness_plan_from_profile(UserProfile(gender='male', age=30, height_cm=180, weight_kg=80))
+        self.assertEqual(set(plan), {'error', 'details'})
+        self.assertIn('took too long', plan['error'])
+
+
+class TrainingLoadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='pw')
+        self.today = date(2025, 3, 14)  # a Friday
+        squat = Exercise.objects.create(name='Squat', category='strength')
+        for i in range(28):
+            day = self.today - timedelta(days=i)
+            workout = WorkoutSession.objects.create(
+                user=self.user, date=datetime(day.year, day.month, day.day, 12, tzinfo=dt_timezone.utc),
+                duration_minutes=60 if i % 2 else 30,
+            )
+            ExerciseSet.objects.create(workout=workout, exercise=squat, sets=3, reps=10, weight_kg=50)
+
+    def test_metrics(self):
+        data = analytics.user_training_load(self.user, self.today, dt_timezone.utc)
+        current = data['current']
+        # Last 7 days: 4 x 30 + 3 x 60 minutes; the 28 days alternate evenly
+        self.assertEqual(current['acute_load'], 300)
+        self.assertEqual(current['chronic_load'], 14 * 30 + 14 * 60)
+        self.assertEqual(current['acwr'], round(300 / 7 / (1260 / 28), 2))
+        loads = [30, 60] * 3 + [30]
+        mean = sum(loads) / 7
+        std = (sum((x - mean) ** 2 for x in loads) / 7) ** 0.5
+        self.assertEqual(current['monotony'], round(mean / std, 2))
+        self.assertEqual(current['strain'], round(300 * mean / std, 1))
+        # Monday to Friday of the current week
+        self.assertEqual(current['week_volume'], 5 * 1500)
+        self.assertEqual(data['weeks'][-1], '2025-03-10')
+        self.assertEqual(list(data['volume_by_category']), ['strength'])
+
+    def test_endpoint_is_cached_until_data_changes(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        url = reverse('analytics_data')
+        first = self.client.get(url).json()
+        with self.assertNumQueries(2):  # session and user; the metrics come from the cache
+            self.assertEqual(self.client.get(url).json(), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkoutSession.objects.create(user=self.user, duration_minutes=45)
+        with self.assertNumQueries(4):  # session, user, workouts and sets
+            self.client.get(url)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Reads SQLite EXPLAIN QUERY PLAN output')
+class QueryPlanTests(TestCase):
+    """Hot per-user queries must be answered from an index, never a full table scan or sort."""
+
+    # SQLite reports full scans (also of an index) as SCAN, and unindexed sorts as a temp B-tree
+    REGRESSIONS = re.compile(r'\bSCAN\b|USE TEMP B-TREE FOR ORDER BY')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('athlete', password='pw')
+        create_history(cls.user, 3)
+        WeightHistory.objects.create(user=cls.user, weight_kg=80)
+
+    def hot_queries(self):
+        user = self.user
+        start = timezone.now() - timedelta(days=30)
+        dates = list(WorkoutSession.objects.values_list('date', flat=True))
+        return {
+            'recent workouts': WorkoutSession.objects.filter(user=user).order_by('-date')[:5],
+            'workouts in range': WorkoutSession.objects.filter(user=user, date__gte=start, date__lt=timezone.now()),
+            'import session lookup': WorkoutSession.objects.filter(user=user, date__in=dates),
+            'daily totals': daily_totals(WorkoutSession.objects.filter(user=user, date__gte=start), dt_timezone.utc),
+            'export sets': ExerciseSet.objects.filter(workout__user=user).order_by('workout__date', 'id')
+                .values_list(*exporter._COLUMNS),
+            'weight history': WeightHistory.objects.filter(user=user).order_by('recorded_date'),
+            'weight range': WeightHistory.objects.filter(user=user, recorded_date__gte=start.date()),
+            'exercise by name': Exercise.objects.filter(name__in=['Test Squat', 'Running']),
+            'rollup range': DailyActivity.objects.filter(user=user, day__range=(start.date(), timezone.now().date())),
+            'latest records': PersonalRecord.objects.filter(user=user)[:8],
+            'analytics workouts': WorkoutSession.objects.filter(user=user).order_by().values_list('pk', 'date'),
+            'analytics sets': ExerciseSet.objects.filter(workout__user=user).order_by()
+                .values_list('workout_id', 'exercise__category'),
+            'records by exercise': PersonalRecord.objects.filter(user=user, exercise_id__in=[1, 2]).order_by(),
+            'records of a workout': PersonalRecord.objects.filter(exercise_set__workout_id=1).order_by(),
+            'leaderboard page': LeaderboardEntry.objects.filter(leaderboard_id=1, position__gt=50)[:50],
+            'own leaderboard rank': LeaderboardEntry.objects.filter(leaderboard_id=1, user=user),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertIsNone(self.REGRESSIONS.search(plan), f"Unindexed plan for '{name}':\n{plan}")
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite connection pragmas')
+class SQLiteTuningTests(TestCase):
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
@@ -13,11 +13,18 @@ urlpatterns = [
     path('exercises/', views.exercises, name='exercises'),
     path('add/', views.add_data, name='add_data'),
     path('import/', views.import_csv, name='import_csv'),
+    path('import/jobs/<int:job_id>/', views.import_job_status, name='import_job_status'),
     path('export/', views.export_csv, name='export_csv'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/cache-stats/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
+    path('api/charts/<str:series>/', views.chart_data, name='chart_data'),
+    path('api/analytics/', views.analytics_data, name='analytics_data'),
+    path('leaderboards/', views.leaderboard, name='leaderboard'),
     path('workout/<int:workout_id>/', views.workout_detail, name='workout_detail'),
     path('workout/<int:workout_id>/delete/', views.workout_delete, name='workout_delete'),
     path('ai-planner/', views.ai_planner, name='ai_planner'),
+    path('ai-planner/jobs/<int:job_id>/', views.plan_job_status, name='plan_job_status'),
+    path('ai-planner/jobs/<int:job_id>/stream/', views.plan_job_stream, name='plan_job_stream'),
     path('log-weight/', views.log_weight, name='log_weight'),
 ]
 
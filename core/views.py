@@ -1,9 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from .models import UserProfile, WorkoutSession, ExerciseSet, Exercise, PasswordResetCode
+from .models import (
+    UserProfile, WorkoutSession, Exercise, PasswordResetCode, DailyActivity, ImportJob, PersonalRecord,
+    Leaderboard, PlanJob,
+)
 from .forms import (
     UserProfileForm,
     WorkoutSessionForm,
@@ -14,17 +19,26 @@ from .forms import (
     WeightHistoryForm,
 )
 from django.views.decorators.cache import never_cache
-from .ai_planner import generate_fitness_plan_from_profile
+from . import analytics, charts, exporter, history, leaderboards, plans, streaks
+from .caching import cache_stats, get_or_compute
+from .ai_planner import DIET_SECTION, MAX_INSTRUCTIONS
+from .jobs import PLAN_JOB_STALE_AFTER, QueueFull, enqueue_import, enqueue_plan
+from .middleware import TIMEZONE_SESSION_KEY
+from .rollups import minutes_by_day, zone
 from django.forms import formset_factory
-from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 import json
-import csv
-import io
-from datetime import datetime
 from django.utils import timezone
 from django.conf import settings
 from django.core.mail import send_mail
-import hashlib, secrets, datetime as dt
+import hashlib, secrets, time, datetime as dt
+
+# How often the plan event stream checks its job for new weeks
+PLAN_STREAM_POLL_SECONDS = 0.5
+# One plan stream holds a worker at most this long; the browser then reconnects with Last-Event-ID
+PLAN_STREAM_MAX_SECONDS = 20
+PLAN_STREAM_RETRY_MS = 1000
 
 
 @never_cache
@@ -95,208 +109,79 @@ def import_csv(request):
                 messages.error(request, 'Please upload a valid CSV file.')
                 return render(request, 'import_csv.html', {'form': form})
             
-            try:
-                # Read CSV file
-                decoded_file = csv_file.read().decode('utf-8')
-                io_string = io.StringIO(decoded_file)
-                reader = csv.DictReader(io_string)
-                
-                imported_count = 0
-                error_rows = []
-                
-                for row_num, row in enumerate(reader, start=2):  # Start from 2 (after header)
-                    try:
-                        # Parse the CSV row and create workout session
-                        workout_date = datetime.strptime(row.get('date', ''), '%Y-%m-%d %H:%M:%S')
-                        
-                        # Create or get workout session
-                        workout, created = WorkoutSession.objects.get_or_create(
-                            user=request.user,
-                            date=workout_date,
-                            defaults={
-                                'duration_minutes': int(row.get('duration_minutes', 0)) if row.get('duration_minutes') else None,
-                                'notes': row.get('notes', '')
-                            }
-                        )
-                        
-                        # Get or create exercise
-                        exercise_name = row.get('exercise', '').strip()
-                        if exercise_name:
-                            exercise, _ = Exercise.objects.get_or_create(
-                                name=exercise_name,
-                                defaults={'category': 'other', 'description': f'Imported from CSV: {exercise_name}'}
-                            )
-                            
-                            # Create exercise set
-                            ExerciseSet.objects.create(
-                                workout=workout,
-                                exercise=exercise,
-                                sets=int(row.get('sets', 1)),
-                                reps=int(row.get('reps', 0)) if row.get('reps') else None,
-                                weight_kg=float(row.get('weight_kg', 0)) if row.get('weight_kg') else None,
-                                duration_seconds=int(row.get('duration_seconds', 0)) if row.get('duration_seconds') else None,
-                                distance_km=float(row.get('distance_km', 0)) if row.get('distance_km') else None,
-                                notes=row.get('exercise_notes', '')
-                            )
-                            
-                            imported_count += 1
-                        
-                    except Exception as e:
-                        error_rows.append(f"Row {row_num}: {str(e)}")
-                
-                if imported_count > 0:
-                    messages.success(request, f'Successfully imported {imported_count} exercise records.')
-                
-                if error_rows:
-                    error_msg = "Some rows had errors:\n" + "\n".join(error_rows[:5])  # Show first 5 errors
-                    if len(error_rows) > 5:
-                        error_msg += f"\n... and {len(error_rows) - 5} more errors."
-                    messages.warning(request, error_msg)
-                
-                if imported_count > 0:
-                    return redirect('dashboard')
-                    
-            except Exception as e:
-                messages.error(request, f'Error processing CSV file: {str(e)}')
+            # The import runs in the background; the page polls the job for progress
+            job = ImportJob.objects.create(user=request.user, csv_file=csv_file)
+            enqueue_import(job)
+            return redirect(f"{reverse('import_csv')}?job={job.pk}")
     else:
         form = CSVImportForm()
     
-    return render(request, 'import_csv.html', {'form': form})
+    job = None
+    if request.GET.get('job', '').isdigit():
+        job = ImportJob.objects.filter(pk=request.GET['job'], user=request.user).first()
+    return render(request, 'import_csv.html', {'form': form, 'job': job})
+
+
+@login_required
+def import_job_status(request, job_id):
+    """JSON progress of a background CSV import."""
+    job = get_object_or_404(ImportJob, pk=job_id, user=request.user)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'finished': job.is_finished,
+        'processed_rows': job.processed_rows,
+        'failed_rows': job.failed_rows,
+        'imported_count': job.imported_count,
+        'errors': job.errors[:5],
+    })
 
 
 @login_required
 def export_csv(request):
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="my_workout_data.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['date', 'exercise', 'sets', 'reps', 'weight_kg', 'duration_minutes', 'duration_seconds', 'distance_km', 'notes', 'exercise_notes'])
-    
-    # Get all user's exercise sets with workout info
-    exercise_sets = ExerciseSet.objects.filter(workout__user=request.user).select_related('workout', 'exercise').order_by('workout__date')
-    
-    for exercise_set in exercise_sets:
-        writer.writerow([
-            exercise_set.workout.date.strftime('%Y-%m-%d %H:%M:%S'),
-            exercise_set.exercise.name,
-            exercise_set.sets,
-            exercise_set.reps or '',
-            exercise_set.weight_kg or '',
-            exercise_set.workout.duration_minutes or '',
-            exercise_set.duration_seconds or '',
-            exercise_set.distance_km or '',
-            exercise_set.workout.notes or '',
-            exercise_set.notes or ''
-        ])
-    
+    """Stream the user's workout history as CSV; ?compress=gzip sends it gzipped."""
+    compress = request.GET.get('compress') == 'gzip'
+    # The body is produced after the view returns, so pin the request's timezone now
+    rows = exporter.export_rows(request.user, timezone.get_current_timezone())
+
+    filename = 'my_workout_data.csv.gz' if compress else 'my_workout_data.csv'
+    response = StreamingHttpResponse(
+        exporter.encode(rows, compress=compress),
+        content_type='application/gzip' if compress else 'text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
-@login_required
-def dashboard(request):
-    from django.db.models import Sum
-    import json
-    
-    # Get user's recent workouts
-    recent_workouts = WorkoutSession.objects.filter(user=request.user).order_by('-date')[:10]
-    
-    # Calculate total exercise duration for workouts without duration_minutes
-    for workout in recent_workouts:
-        if not workout.duration_minutes:
-            # Sum all exercise durations in seconds
-            total_seconds = workout.exercise_sets.aggregate(
-                total=Sum('duration_seconds')
-            )['total']
-            if total_seconds:
-                # Convert to minutes and store as attribute
-                workout.calculated_duration = round(total_seconds / 60, 1)
-            else:
-                workout.calculated_duration = None
-    
-    # Get some basic stats
-    total_workouts = WorkoutSession.objects.filter(user=request.user).count()
-    total_exercises = ExerciseSet.objects.filter(workout__user=request.user).count()
+def _dashboard_stats(user, profile, today):
+    """Totals, chart arrays and weight series shown on the dashboard."""
+    from django.db.models import Max, Sum
+    from datetime import timedelta as py_timedelta
+    from .models import WeightHistory
     
-    # Build 7-day, 30-day window anchored to the latest workout date (fallback: today)
-    from datetime import datetime as py_dt, time as py_time, timedelta as py_timedelta
-    latest_dt = WorkoutSession.objects.filter(user=request.user).order_by('-date').values_list('date', flat=True).first()
-    anchor_date = timezone.localtime(latest_dt).date() if latest_dt else timezone.localtime().date()
+    # Totals and the latest workout day in one query over the daily rollups
+    totals = DailyActivity.objects.filter(user=user).aggregate(
+        total_workouts=Sum('workout_count'),
+        total_exercises=Sum('set_count'),
+        latest_day=Max('day'),
+    )
     
-    # 7-day chart data
-    last_7_days = [anchor_date - py_timedelta(days=i) for i in range(6, -1, -1)]
-    daily_totals_7 = {d: 0 for d in last_7_days}
-    start_dt_7 = timezone.make_aware(py_dt.combine(last_7_days[0], py_time.min))
-    end_dt_7 = timezone.make_aware(py_dt.combine(last_7_days[-1], py_time.max))
-    recent_range_workouts_7 = WorkoutSession.objects.filter(
-        user=request.user,
-        date__range=(start_dt_7, end_dt_7),
-    ).order_by('date').prefetch_related('exercise_sets')
-    for w in recent_range_workouts_7:
-        day = timezone.localtime(w.date).date()
-        minutes = 0
-        if w.duration_minutes:
-            minutes = int(w.duration_minutes)
-        else:
-            sec_total = 0
-            for es in w.exercise_sets.all():
-                if es.duration_seconds:
-                    sec_total += es.duration_seconds
-            if sec_total:
-                minutes = round(sec_total / 60)
-        daily_totals_7[day] = daily_totals_7.get(day, 0) + minutes
+    # Build 7-day, 30-day window anchored to the latest workout day (fallback: today)
+    anchor_date = totals['latest_day'] or today
     
-    chart_labels_7 = [d.strftime('%m-%d') for d in last_7_days]
-    chart_values_7 = [daily_totals_7.get(d, 0) for d in last_7_days]
-    
-    # 30-day chart data
+    # Both charts are read from the daily rollups with one range query
     last_30_days = [anchor_date - py_timedelta(days=i) for i in range(29, -1, -1)]
-    daily_totals_30 = {d: 0 for d in last_30_days}
-    start_dt_30 = timezone.make_aware(py_dt.combine(last_30_days[0], py_time.min))
-    end_dt_30 = timezone.make_aware(py_dt.combine(last_30_days[-1], py_time.max))
-    recent_range_workouts_30 = WorkoutSession.objects.filter(
-        user=request.user,
-        date__range=(start_dt_30, end_dt_30),
-    ).order_by('date').prefetch_related('exercise_sets')
-    for w in recent_range_workouts_30:
-        day = timezone.localtime(w.date).date()
-        minutes = 0
-        if w.duration_minutes:
-            minutes = int(w.duration_minutes)
-        else:
-            sec_total = 0
-            for es in w.exercise_sets.all():
-                if es.duration_seconds:
-                    sec_total += es.duration_seconds
-            if sec_total:
-                minutes = round(sec_total / 60)
-        daily_totals_30[day] = daily_totals_30.get(day, 0) + minutes
+    last_7_days = last_30_days[-7:]
+    daily_totals = minutes_by_day(user, last_30_days[0], anchor_date)
     
-    chart_labels_30 = [d.strftime('%m-%d') for d in last_30_days]
-    chart_values_30 = [daily_totals_30.get(d, 0) for d in last_30_days]
+    # Weight history data (from weight entries, falling back to the profile weight)
+    weight_records = list(
+        WeightHistory.objects.filter(user=user).order_by('recorded_date').values_list('recorded_date', 'weight_kg')
+    )
     
-    # Weight history data (with timestamps from profile history or from weight entries)
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-    weight_history = []
-    weight_labels = []
-    
-    # Get all workouts with dates for weight tracking
-    all_workouts = WorkoutSession.objects.filter(user=request.user).order_by('date')
-    if profile.weight_kg and all_workouts.exists():
-        # For now, use current weight as the reference
-        # In future, you can create a WeightHistory model to track weight changes
-        current_weight = profile.weight_kg
-        weight_history = [current_weight]
-        weight_labels = ['Current']
-    
-    # Get weight history from WeightHistory model
-    from .models import WeightHistory
-    weight_records = WeightHistory.objects.filter(user=request.user).order_by('recorded_date')
-    
-    if weight_records.exists():
-        weight_history = [round(w.weight_kg, 1) for w in weight_records]
-        weight_labels = [w.recorded_date.strftime('%m-%d') for w in weight_records]
+    if weight_records:
+        weight_history = [round(weight, 1) for _, weight in weight_records]
+        weight_labels = [recorded.strftime('%m-%d') for recorded, _ in weight_records]
     elif profile.weight_kg:
         # If no history, create initial data point
         weight_history = [profile.weight_kg]
@@ -305,68 +190,167 @@ def dashboard(request):
         weight_history = []
         weight_labels = []
     
-    context = {
-        'recent_workouts': recent_workouts,
-        'total_workouts': total_workouts,
-        'total_exercises': total_exercises,
-        'weekly_chart_labels': chart_labels_7,
-        'weekly_chart_values': chart_values_7,
-        'monthly_chart_labels': chart_labels_30,
-        'monthly_chart_values': chart_values_30,
+    # Latest personal records; ones from the past week are flagged as new
+    tz = zone(profile.timezone)
+    personal_records = []
+    for record in PersonalRecord.objects.filter(user=user).select_related('exercise')[:8]:
+        achieved_on = timezone.localtime(record.achieved_at, tz).date()
+        personal_records.append({
+            'exercise': record.exercise.name,
+            'kind': record.get_kind_display(),
+            'value': record.display_value,
+            'achieved_on': achieved_on,
+            'is_new': achieved_on > today - py_timedelta(days=7),
+        })
+    
+    return {
+        'total_workouts': totals['total_workouts'] or 0,
+        'total_exercises': totals['total_exercises'] or 0,
+        'weekly_chart_labels': [d.strftime('%m-%d') for d in last_7_days],
+        'weekly_chart_values': [daily_totals.get(d, 0) for d in last_7_days],
+        'monthly_chart_labels': [d.strftime('%m-%d') for d in last_30_days],
+        'monthly_chart_values': [daily_totals.get(d, 0) for d in last_30_days],
         'weight_labels': json.dumps(weight_labels),
         'weight_values': json.dumps(weight_history),
-        'profile': profile,
+        'personal_records': personal_records,
     }
-    return render(request, 'dashboard.html', context)
 
 
 @login_required
-def export_csv(request):
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="my_workout_data.csv"'
+def dashboard(request):
+    # Set counts and calculated durations are stored on the workouts
+    recent_workouts = list(WorkoutSession.objects.filter(user=request.user).order_by('-date')[:10])
     
-    writer = csv.writer(response)
-    writer.writerow(['date', 'exercise', 'sets', 'reps', 'weight_kg', 'duration_minutes', 'duration_seconds', 'distance_km', 'notes', 'exercise_notes'])
+    profile, _ = UserProfile.objects.get_or_create(user=request.user)
     
-    # Get all user's exercise sets with workout info
-    exercise_sets = ExerciseSet.objects.filter(workout__user=request.user).select_related('workout', 'exercise').order_by('workout__date')
+    # Served from cache until one of the user's workouts, sets, weights or profile changes.
+    # The day is part of the key because an empty history anchors the charts on today.
+    today = timezone.localtime(timezone=zone(profile.timezone)).date()
+    stats = get_or_compute(request.user.id, f'dashboard:{today}', lambda: _dashboard_stats(request.user, profile, today))
     
-    for exercise_set in exercise_sets:
-        writer.writerow([
-            exercise_set.workout.date.strftime('%Y-%m-%d %H:%M:%S'),
-            exercise_set.exercise.name,
-            exercise_set.sets,
-            exercise_set.reps or '',
-            exercise_set.weight_kg or '',
-            exercise_set.workout.duration_minutes or '',
-            exercise_set.duration_seconds or '',
-            exercise_set.distance_km or '',
-            exercise_set.workout.notes or '',
-            exercise_set.notes or ''
-        ])
+    context = {
+        'recent_workouts': recent_workouts,
+        'profile': profile,
+        **stats,
+        # Streaks are stored on the profile, so these need no query of their own
+        **streaks.summary(profile, today, stats['total_workouts']),
+    }
+    return render(request, 'dashboard.html', context)
+
+
+@login_required
+def chart_data(request, series):
+    """
+    JSON chart series for arbitrary ranges.
+
+    Query parameters: range (week, month, year, all, custom), start/end for
+    custom ranges, bucket (day, week, month; picked from the range length when
+    omitted, coarsened for ranges too long for it) and points, the point budget
+    for downsampled weight series.
+    """
+    if series not in charts.SERIES:
+        raise Http404('Unknown chart series')
+    range_name = request.GET.get('range', 'month')
+    bucket = request.GET.get('bucket') or None
+    today = timezone.localtime().date()
+    try:
+        start, end = charts.resolve_range(range_name, today, request.GET.get('start'), request.GET.get('end'))
+        if bucket is not None and bucket not in charts.BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}'. Use one of: {', '.join(charts.BUCKETS)}.")
+        points = min(max(int(request.GET.get('points', charts.DEFAULT_POINTS)), 3), charts.MAX_POINTS)
+        if series == 'activity':
+            compute = lambda: charts.activity_series(request.user, start, end, bucket)
+        else:
+            compute = lambda: charts.weight_series(request.user, start, end, bucket, points)
+        data = get_or_compute(request.user.id, f'chart:{series}:{range_name}:{start}:{end}:{bucket}:{points}', compute)
+    except (ValueError, OverflowError) as e:
+        # Bucket arithmetic past date.max overflows, e.g. monthly buckets ending in 9999-12
+        return JsonResponse({'error': str(e)}, status=400)
     
-    return response
+    return JsonResponse({'series': series, 'range': range_name, **data})
+
+
+@login_required
+def analytics_data(request):
+    """Training-load analytics (weekly volume per category, ACWR, monotony, strain) as JSON."""
+    today = timezone.localtime().date()
+    tz = timezone.get_current_timezone()
+    data = get_or_compute(
+        request.user.id, f'analytics:{today}', lambda: analytics.user_training_load(request.user, today, tz),
+    )
+    return JsonResponse(data)
+
+
+@staff_member_required
+def dashboard_cache_stats(request):
+    """Hit/miss counters of the per-user dashboard cache, for load testing."""
+    return JsonResponse(cache_stats())
+
+
+@login_required
+def leaderboard(request):
+    """
+    Leaderboard snapshots of opted-in users.
+
+    Query parameters: board (a Leaderboard id, default this week's minutes)
+    and after, the position the page starts after.
+    """
+    boards = list(Leaderboard.objects.select_related('exercise'))
+    this_week = leaderboards.week_start(timezone.localdate())
+    weekly = [b for b in boards if b.metric != 'record']
+    records = sorted((b for b in boards if b.metric == 'record'), key=lambda b: (b.exercise.name, b.record_kind))
+
+    board = None
+    if request.GET.get('board'):
+        board = next((b for b in boards if str(b.pk) == request.GET['board']), None)
+        if board is None:
+            raise Http404('Unknown leaderboard')
+    else:
+        board = next((b for b in weekly if b.week_start == this_week and b.metric == 'weekly_minutes'), None)
+
+    entries, own, next_after = [], None, None
+    if board is not None:
+        try:
+            after = max(int(request.GET.get('after', 0)), 0)
+        except ValueError:
+            after = 0
+        entries = leaderboards.page(board, after)
+        for entry in entries:
+            entry.display_score = leaderboards.format_score(board, entry.score)
+        if len(entries) == leaderboards.PAGE_SIZE:
+            next_after = entries[-1].position
+        own = leaderboards.own_entry(board, request.user)
+        if own is not None:
+            own.display_score = leaderboards.format_score(board, own.score)
+
+    opted_in = UserProfile.objects.filter(user=request.user, leaderboard_opt_in=True).exists()
+    return render(request, 'leaderboard.html', {
+        'board': board,
+        'weekly_boards': weekly,
+        'record_boards': records,
+        'entries': entries,
+        'own_entry': own,
+        'next_after': next_after,
+        'opted_in': opted_in,
+    })
 
 
 @login_required
 def workout_detail(request, workout_id):
-    from django.db.models import Sum
     workout = get_object_or_404(WorkoutSession, id=workout_id, user=request.user)
-    exercise_sets = workout.exercise_sets.all().select_related('exercise')
+    exercise_sets = list(workout.exercise_sets.all().select_related('exercise'))
     
-    # Calculate total duration from exercises if not set
-    calculated_duration = None
-    if not workout.duration_minutes:
-        total_seconds = exercise_sets.aggregate(total=Sum('duration_seconds'))['total']
-        if total_seconds:
-            calculated_duration = round(total_seconds / 60, 1)
+    # Records currently held by this workout's sets, flagged next to each set
+    records = list(
+        PersonalRecord.objects.filter(exercise_set__workout=workout).select_related('exercise').order_by()
+    )
+    for exercise_set in exercise_sets:
+        exercise_set.records = [record for record in records if record.exercise_set_id == exercise_set.id]
     
     return render(request, 'workout_detail.html', {
         'workout': workout,
         'exercise_sets': exercise_sets,
-        'calculated_duration': calculated_duration
+        'personal_records': records,
     })
 
 
@@ -400,7 +384,8 @@ def profile_edit(request):
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
-            form.save()
+            profile = form.save()
+            request.session[TIMEZONE_SESSION_KEY] = profile.timezone
             messages.success(request, 'Profile updated successfully!')
             # Use reverse to get the URL, or direct path
             return redirect('profile')
@@ -452,10 +437,20 @@ def exercises(request):
 def ai_planner(request):
     """
     AI Planner view - generates personalized fitness plan based on user profile.
+
+    Plans are stored (core.plans): a GET shows the latest one, and a POST with
+    unchanged inputs is answered from the store. Otherwise the POST queues a
+    PlanJob and redirects to ?job=<id>, where the page follows the job over
+    server-sent events (plan_job_stream), showing each week as it is written.
+    A POST with "quick" builds a rule-based plan on the spot (core.quick_plan),
+    and one with a "section" (week number or "diet") queues a job rewriting
+    only that part of the latest plan.
     """
     profile, _ = UserProfile.objects.get_or_create(user=request.user)
     result_text = None
     error_text = None
+    stored_plan = plans.latest_plan(request.user)
+    job = None
     
     # Check if user has filled in their profile
     if not profile.gender or not profile.age or not profile.height_cm or not profile.weight_kg:
@@ -466,20 +461,134 @@ def ai_planner(request):
             'error': error_text
         })
     
-    if request.method == 'POST':
-        try:
-            # Generate the fitness plan using the AI planner
-            result_text = generate_fitness_plan_from_profile(profile)
-        except Exception as e:
-            error_text = f"An error occurred while generating the plan: {str(e)}"
+    status = 200
+    if request.method == 'POST' and request.POST.get('section'):
+        # Rewrite one week or the diet of the latest plan in the background
+        section = request.POST['section']
+        sections = [str(week.get('week_number')) for week in
+                    (stored_plan.plan.get('training_plan', {}).get('weeks', []) if stored_plan else [])]
+        if stored_plan is None or section not in sections + [DIET_SECTION]:
+            error_text, status = "That part of the plan cannot be changed.", 400
+        else:
+            try:
+                job = enqueue_plan(request.user, section=section,
+                                   instructions=request.POST.get('instructions', '')[:MAX_INSTRUCTIONS])
+            except QueueFull as e:
+                error_text, status = str(e), 503
+            else:
+                return redirect(f"{reverse('ai_planner')}?job={job.pk}")
+    elif request.method == 'POST' and 'quick' in request.POST:
+        # Rule-based, answered within the request
+        result_text, stored_plan = plans.quick(profile, history.training_summary(profile))
+    elif request.method == 'POST':
+        regenerate = 'regenerate' in request.POST
+        current = None if regenerate else plans.find_plan(profile, history.training_summary(profile))
+        if current is not None:
+            result_text, stored_plan = current.plan, current
+        else:
+            # The model call runs on the plan worker pool; the page polls the job
+            try:
+                job = enqueue_plan(request.user, regenerate=regenerate)
+            except QueueFull as e:
+                error_text, status = str(e), 503
+            else:
+                return redirect(f"{reverse('ai_planner')}?job={job.pk}")
+    elif request.GET.get('job', '').isdigit():
+        job = PlanJob.objects.filter(pk=request.GET['job'], user=request.user).select_related('plan').first()
+        if job is not None and job.status == 'failed':
+            result_text = job.error
+        elif job is not None and job.plan is not None:
+            result_text, stored_plan = job.plan.plan, job.plan
+    if result_text is None and job is None and stored_plan is not None:
+        result_text = stored_plan.plan
     
     return render(request, 'ai_planner.html', {
         'profile': profile,
         'result': result_text,
-        'error': error_text
+        'error': error_text,
+        'stored_plan': stored_plan,
+        'job': job,
+    }, status=status)
+
+
+@login_required
+def plan_job_status(request, job_id):
+    """JSON state of a background AI plan generation."""
+    job = get_object_or_404(PlanJob, pk=job_id, user=request.user)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'finished': job.is_finished,
+        'error': (job.error or {}).get('error'),
     })
 
 
+def _sse(event, data, event_id=None):
+    """One server-sent event; every line of `data` gets its own data: field."""
+    lines = ''.join(f"data: {line}\n" for line in data.splitlines() or [''])
+    id_line = f"id: {event_id}\n" if event_id is not None else ''
+    return f"event: {event}\n{id_line}{lines}\n"
+
+
+def _weeks_id(weeks):
+    """Event id for the weeks a browser shows: their count and a digest of their content."""
+    digest = hashlib.sha256(json.dumps(weeks, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return f"{len(weeks)}-{digest}"
+
+
+@login_required
+def plan_job_stream(request, job_id):
+    """
+    Server-sent events following a background AI plan generation.
+
+    Sends each training week, rendered, as soon as the worker has parsed it
+    from the model output, then a done event once the job finished.
+
+    A stream ends after PLAN_STREAM_MAX_SECONDS so it never ties up a worker
+    for the whole generation; the browser reconnects and its Last-Event-ID
+    (the weeks it shows) says where to resume. When the weeks shown are no
+    longer a prefix of the job's, e.g. a quick plan replaced a partly
+    streamed AI plan, a reset event clears them before the weeks are resent.
+    """
+    job = get_object_or_404(PlanJob, pk=job_id, user=request.user)
+    jobs_query = PlanJob.objects.filter(pk=job.pk)
+    shown_id = request.headers.get('Last-Event-ID') or _weeks_id([])
+    count = shown_id.partition('-')[0]
+    shown = int(count) if count.isdigit() else 0
+
+    def events():
+        nonlocal shown, shown_id
+        yield f"retry: {PLAN_STREAM_RETRY_MS}\n\n"
+        deadline = time.monotonic() + PLAN_STREAM_MAX_SECONDS
+        while True:
+            status, weeks, created_at = jobs_query.values_list('status', 'weeks', 'created_at').get()
+            finished = status in ('done', 'failed')
+            if finished and status == 'done':
+                # A plan answered from the store never passed through the stream
+                plan = jobs_query.values_list('plan__plan', flat=True).get() or {}
+                weeks = plan.get('training_plan', {}).get('weeks', weeks)
+            if _weeks_id(weeks[:shown]) != shown_id:
+                shown, shown_id = 0, _weeks_id([])
+                yield _sse('reset', '', shown_id)
+            for index, week in enumerate(weeks[shown:], start=shown):
+                yield _sse('week', render_to_string('ai_planner_week.html', {'week': week, 'first': index == 0}),
+                           _weeks_id(weeks[:index + 1]))
+            if len(weeks) > shown:
+                shown, shown_id = len(weeks), _weeks_id(weeks)
+            if finished or created_at < timezone.now() - PLAN_JOB_STALE_AFTER:
+                yield _sse('done', json.dumps({'status': status}))
+                return
+            if time.monotonic() > deadline:
+                return
+            time.sleep(PLAN_STREAM_POLL_SECONDS)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def register(request):
     if request.user.is_authenticated:
         return redirect('profile')
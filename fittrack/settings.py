@@ -13,9 +13,14 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Environment overrides (cache backend etc.) may live in the project's .env file
+load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -47,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.UserTimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,13 +80,125 @@ WSGI_APPLICATION = 'fittrack.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# SQLite runs every new connection through these pragmas: WAL lets readers
+# proceed while one writer commits, busy_timeout makes writers wait for the
+# lock instead of failing with "database is locked", and synchronous=NORMAL
+# is durable across application crashes in WAL mode. mmap_size and a negative
+# cache_size (KiB) keep hot pages in memory.
+FITTRACK_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,
+}
+
+# FITTRACK_DB_ENGINE picks the database: 'sqlite' (default) or a server
+# database ('postgresql', 'mysql') configured by the other FITTRACK_DB_*
+# variables. Server connections are kept open for FITTRACK_DB_CONN_MAX_AGE
+# seconds and checked before reuse.
+DATABASE_BACKENDS = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('FITTRACK_DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in FITTRACK_SQLITE_PRAGMAS.items()),
+            # Take the write lock when a transaction starts, so a reader
+            # upgrading to a writer cannot fail without waiting
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+    },
+    'mysql': {
+        'ENGINE': 'django.db.backends.mysql',
+        'OPTIONS': {'charset': 'utf8mb4'},
+    },
+}
+
+_DB_ENGINE = os.getenv('FITTRACK_DB_ENGINE', 'sqlite')
+if _DB_ENGINE == 'sqlite':
+    _database = DATABASE_BACKENDS['sqlite']
+else:
+    _database = {
+        **DATABASE_BACKENDS[_DB_ENGINE],
+        'NAME': os.getenv('FITTRACK_DB_NAME', 'fittrack'),
+        'USER': os.getenv('FITTRACK_DB_USER', ''),
+        'PASSWORD': os.getenv('FITTRACK_DB_PASSWORD', ''),
+        'HOST': os.getenv('FITTRACK_DB_HOST', 'localhost'),
+        'PORT': os.getenv('FITTRACK_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv('FITTRACK_DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
+DATABASES = {'default': _database}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# FITTRACK_CACHE picks the backend: 'locmem' (default, per process, for development),
+# 'file' or 'db' (shared by every worker; run `python manage.py createcachetable` for 'db').
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fittrack',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('FITTRACK_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'fittrack_cache',
+    },
 }
 
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[os.getenv('FITTRACK_CACHE', 'locmem')],
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Per-user cached values (dashboard stats etc.) expire after this many seconds
+FITTRACK_USER_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Background jobs (CSV imports, AI plans). By default they run on small thread pools in
+# the web process; set FITTRACK_JOBS_IN_PROCESS=0 to leave them queued for
+# `python manage.py run_jobs` instead.
+FITTRACK_JOB_WORKERS = int(os.getenv('FITTRACK_JOB_WORKERS', '2'))
+FITTRACK_JOBS_IN_PROCESS = os.getenv('FITTRACK_JOBS_IN_PROCESS', '1') == '1'
+# Run jobs inline in the request (tests)
+FITTRACK_JOBS_EAGER = False
+# AI plan generations run on their own pool; past the queue limit new requests are turned away
+FITTRACK_PLAN_WORKERS = int(os.getenv('FITTRACK_PLAN_WORKERS', '4'))
+FITTRACK_PLAN_QUEUE_LIMIT = int(os.getenv('FITTRACK_PLAN_QUEUE_LIMIT', '20'))
+
+# Seconds a generated AI plan is reused for unchanged profile and history inputs
+FITTRACK_PLAN_TTL = int(os.getenv('FITTRACK_PLAN_TTL', str(7 * 24 * 60 * 60)))
+# Replace failed or timed-out AI plans with a rule-based quick plan
+FITTRACK_PLAN_FALLBACK = os.getenv('FITTRACK_PLAN_FALLBACK', '1') == '1'
+
+# Model backend of the AI planner (core.llm): 'gemini' (default), 'http' for a local
+# chat completions server, or 'stub' for a canned plan with simulated latency.
+FITTRACK_LLM_BACKEND = os.getenv('FITTRACK_LLM_BACKEND', 'gemini')
+FITTRACK_LLM_URL = os.getenv('FITTRACK_LLM_URL', 'http://localhost:11434/v1/chat/completions')
+FITTRACK_LLM_MODEL = os.getenv('FITTRACK_LLM_MODEL', 'llama3.1')
+FITTRACK_LLM_STUB_LATENCY = float(os.getenv('FITTRACK_LLM_STUB_LATENCY', '0'))
+FITTRACK_LLM_STUB_FIRST_CHUNK = float(os.getenv('FITTRACK_LLM_STUB_FIRST_CHUNK', '0'))
+# Calls to the backend: deadline in seconds, retries of transient errors with jittered
+# backoff from FITTRACK_LLM_BACKOFF seconds, a circuit breaker opening for
+# FITTRACK_LLM_BREAKER_RESET seconds after FITTRACK_LLM_BREAKER_FAILURES failures in a row,
+# and at most FITTRACK_LLM_MAX_IN_FLIGHT calls at once per process.
+FITTRACK_LLM_TIMEOUT = float(os.getenv('FITTRACK_LLM_TIMEOUT', '90'))
+FITTRACK_LLM_RETRIES = int(os.getenv('FITTRACK_LLM_RETRIES', '2'))
+FITTRACK_LLM_BACKOFF = float(os.getenv('FITTRACK_LLM_BACKOFF', '1'))
+FITTRACK_LLM_BREAKER_FAILURES = int(os.getenv('FITTRACK_LLM_BREAKER_FAILURES', '5'))
+FITTRACK_LLM_BREAKER_RESET = float(os.getenv('FITTRACK_LLM_BREAKER_RESET', '30'))
+FITTRACK_LLM_MAX_IN_FLIGHT = int(os.getenv('FITTRACK_LLM_MAX_IN_FLIGHT', '4'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators